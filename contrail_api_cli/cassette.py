@@ -0,0 +1,201 @@
+from __future__ import unicode_literals
+
+import io
+import json
+import time
+import base64
+import logging
+from collections import deque
+
+import gevent
+import requests
+from requests.packages.urllib3.response import HTTPResponse
+from six import text_type, binary_type
+from six.moves.urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+logger = logging.getLogger(__name__)
+
+# headers that don't apply to the decoded body stored in the cassette
+SKIPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+# headers holding credentials, never stored in the cassette
+SECRET_HEADERS = ('x-auth-token', 'x-subject-token', 'authorization', 'set-cookie')
+# keys of JSON bodies holding credentials
+SECRET_KEYS = ('password', 'token', 'secret', 'passcode')
+REDACTED = '<redacted>'
+
+
+def redact(data):
+    """Return data where values of credentials keys
+    are replaced
+
+    :param data: decoded JSON document
+    """
+    if isinstance(data, dict):
+        return dict((k, REDACTED if k.lower() in SECRET_KEYS else redact(v))
+                    for k, v in data.items())
+    if isinstance(data, list):
+        return [redact(v) for v in data]
+    return data
+
+
+def request_key(method, url, body=None):
+    """Return the key used to match a request with
+    a recorded interaction
+
+    Query parameters are sorted and JSON bodies are
+    normalized so that the key doesn't depend on the
+    ordering of dicts.
+
+    :param method: HTTP method
+    :type method: str
+    :param url: request url
+    :type url: str
+    :param body: request body
+    :type body: bytes | str | None
+
+    :rtype: (str, str, str)
+    """
+    scheme, netloc, path, query, _ = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    url = urlunsplit((scheme, netloc, path, query, ''))
+    if isinstance(body, binary_type):
+        body = body.decode('utf-8')
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True)
+        except ValueError:
+            pass
+    return (method.upper(), url, body or '')
+
+
+class Cassette(object):
+    """HTTP interactions stored in a file
+
+    The file contains one JSON interaction per line::
+
+        {"method": "GET", "url": "...", "body": "",
+         "status": 200, "reason": "OK", "headers": {...},
+         "response": "...", "latency": 0.012}
+
+    :param path: cassette file path
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return recorded interactions by request key
+
+        :rtype: {(str, str, str): deque of dict}
+        """
+        interactions = {}
+        with io.open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                key = request_key(interaction['method'],
+                                  interaction['url'],
+                                  interaction['body'])
+                interactions.setdefault(key, deque()).append(interaction)
+        return interactions
+
+    def truncate(self):
+        io.open(self.path, 'w', encoding='utf-8').close()
+
+    def append(self, interaction):
+        with io.open(self.path, 'a', encoding='utf-8') as f:
+            f.write(text_type(json.dumps(interaction)) + '\n')
+
+
+class RecordAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter that sends requests to the network
+    and records them with their responses in a cassette
+
+    Credentials found in request bodies and response headers
+    are not recorded. The session only mounts this adapter on
+    the API servers urls so that authentication requests are
+    not recorded at all.
+
+    :param path: cassette file path, any previous content
+                 is removed
+    :type path: str
+    """
+
+    def __init__(self, path, **kwargs):
+        self.cassette = Cassette(path)
+        self.cassette.truncate()
+        super(RecordAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        start = time.time()
+        response = super(RecordAdapter, self).send(request, **kwargs)
+        # read the body to record it, streamed
+        # responses are served from memory
+        content = response.content
+        body = request_key(request.method, request.url, request.body)[2]
+        if body:
+            try:
+                body = json.dumps(redact(json.loads(body)), sort_keys=True)
+            except ValueError:
+                pass
+        interaction = {
+            'method': request.method,
+            'url': request.url,
+            'body': body,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict((k, v) for k, v in response.headers.items()
+                            if k.lower() not in SKIPPED_HEADERS + SECRET_HEADERS),
+            'latency': time.time() - start,
+        }
+        try:
+            interaction['response'] = content.decode('utf-8')
+        except UnicodeDecodeError:
+            interaction['response_base64'] = base64.b64encode(content).decode('ascii')
+        self.cassette.append(interaction)
+        return response
+
+
+class ReplayAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter that serves responses recorded
+    in a cassette without any network access
+
+    Identical requests get the recorded responses in the
+    order they were recorded, the last one is served again
+    when they are exhausted.
+
+    :param path: cassette file path
+    :type path: str
+    :param latency_scale: factor applied to recorded latencies,
+                          0 serves responses immediately
+    :type latency_scale: float
+    """
+
+    def __init__(self, path, latency_scale=1.0, **kwargs):
+        self.interactions = Cassette(path).load()
+        self.latency_scale = latency_scale
+        super(ReplayAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        recorded = self.interactions.get(key)
+        if not recorded:
+            raise requests.exceptions.ConnectionError(
+                'No recorded response for %s %s' % (request.method, request.url),
+                request=request)
+        interaction = recorded.popleft() if len(recorded) > 1 else recorded[0]
+        if interaction['latency'] and self.latency_scale > 0:
+            gevent.sleep(interaction['latency'] * self.latency_scale)
+        if 'response_base64' in interaction:
+            content = base64.b64decode(interaction['response_base64'])
+        else:
+            content = interaction['response'].encode('utf-8')
+        raw = HTTPResponse(body=io.BytesIO(content),
+                           headers=interaction['headers'],
+                           status=interaction['status'],
+                           reason=interaction['reason'],
+                           preload_content=False)
+        return self.build_response(request, raw)
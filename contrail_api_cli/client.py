@@ -1,16 +1,40 @@
 from __future__ import unicode_literals
 
-from .utils import FQName, to_json
+from .utils import FQName, Path, CONFIG_DIR, JSONStreamDecoder, to_compact_json, from_json, \
+    parallel_map, format_table
 
 import os
+import io
+import copy
+import json
+import time
+import random
+import atexit
+import logging
 import platform
 from argparse import Namespace
+from collections import OrderedDict, Counter, deque
 from functools import wraps
 import requests
+from requests.packages.urllib3.response import HTTPResponse
+import gevent
+from six import text_type, string_types
+from gevent.event import AsyncResult, Event
 
 from keystoneauth1 import loading
 from keystoneauth1.session import Session
+from keystoneauth1.exceptions.base import ClientException
 from keystoneauth1.exceptions.http import HttpError
+from keystoneauth1.exceptions.connection import ConnectionError as KeystoneConnectionError, SSLError
+
+from .context import SessionNotInitialized
+from .resource import Resource
+from .cassette import RecordAdapter, ReplayAdapter
+from .fakeserver import FakeAPIServer, FakeAPIAdapter
+from . import topology
+
+
+logger = logging.getLogger(__name__)
 
 
 def contrail_error_handler(f):
@@ -30,31 +54,112 @@ def contrail_error_handler(f):
     return wrapper
 
 
+def copy_error(e):
+    """Return a copy of exception e
+
+    Errors of coalesced requests are raised in several greenlets,
+    each of them needs its own copy since contrail_error_handler
+    modifies errors in place.
+    """
+    error = copy.copy(e)
+    # copy.copy calls __init__ with args which formats
+    # the message of keystoneauth errors again
+    error.args = e.args
+    return error
+
+
 class SessionLoader(loading.session.Session):
 
     @property
     def plugin_class(self):
         return ContrailAPISession
 
-    def make(self, host="localhost", port=8082, protocol="http", base_uri="", os_auth_type="http", **kwargs):
+    def make(self, host="localhost", port=8082, protocol="http", base_uri="", os_auth_type="http",
+             resolve_cache_size=10000, resolve_cache_ttl=300, resolve_cache_persist=False,
+             resource_cache=False, resource_cache_max_age=2, max_concurrency=50,
+             retries=3, retry_backoff=0.5, retry_posts=False, compression=True,
+             record=None, replay=None, replay_latency_scale=1.0,
+             fake_server=None, fake_server_latency=0, ejection_time=30, token_cache=False,
+             **kwargs):
         """Initialize a session to Contrail API server
 
+        :param host: API server host or comma separated list
+                     of API servers hosts
+        :type host: str
         :param os_auth_type: auth plugin to use:
             - http: basic HTTP authentification
             - v2password: keystone v2 auth
             - v3password: keystone v3 auth
         :type os_auth_type: str
+        :param resolve_cache_size: max number of cached fq_name/uuid resolutions
+        :type resolve_cache_size: int
+        :param resolve_cache_ttl: lifetime of cached resolutions in seconds,
+                                  0 disables the cache
+        :type resolve_cache_ttl: int
+        :param resolve_cache_persist: store cached resolutions in CONFIG_DIR
+        :type resolve_cache_persist: bool
+        :param resource_cache: cache fetched resources during the session
+        :type resource_cache: bool
+        :param resource_cache_max_age: delay in seconds before a cached
+                                       resource is revalidated
+        :type resource_cache_max_age: int
+        :param max_concurrency: max number of concurrent API requests
+        :type max_concurrency: int
+        :param retries: max number of retries of failed requests
+        :type retries: int
+        :param retry_backoff: base delay in seconds between retries
+        :type retry_backoff: float
+        :param retry_posts: retry non idempotent POST requests
+        :type retry_posts: bool
+        :param compression: request compressed responses
+        :type compression: bool
+        :param record: cassette file where HTTP requests are recorded
+        :type record: str
+        :param replay: cassette file to serve HTTP requests from,
+                       requests are not authenticated
+        :type replay: str
+        :param replay_latency_scale: factor applied to recorded latencies
+        :type replay_latency_scale: float
+        :param fake_server: file of resources served by a fake API server
+        :type fake_server: str
+        :param fake_server_latency: fake API server latency in seconds
+        :type fake_server_latency: float
+        :param ejection_time: seconds during which a failing API
+                              server doesn't get requests
+        :type ejection_time: float
+        :param token_cache: reuse keystone tokens between invocations
+        :type token_cache: bool
         """
         loader = loading.base.get_plugin_loader(os_auth_type)
         plugin_options = {opt.dest: kwargs.pop("os_%s" % opt.dest)
                           for opt in loader.get_options()
                           if 'os_%s' % opt.dest in kwargs}
         plugin = loader.load_from_options(**plugin_options)
+        if token_cache:
+            cache = TokenCache(plugin, os.path.join(CONFIG_DIR, 'tokens'))
+            cache.load()
+            atexit.register(cache.save)
         return self.load_from_argparse_arguments(Namespace(**kwargs),
                                                  host=host,
                                                  port=port,
                                                  protocol=protocol,
                                                  base_uri=base_uri,
+                                                 resolve_cache_size=resolve_cache_size,
+                                                 resolve_cache_ttl=resolve_cache_ttl,
+                                                 resolve_cache_persist=resolve_cache_persist,
+                                                 resource_cache=resource_cache,
+                                                 resource_cache_max_age=resource_cache_max_age,
+                                                 max_concurrency=max_concurrency,
+                                                 retries=retries,
+                                                 retry_backoff=retry_backoff,
+                                                 retry_posts=retry_posts,
+                                                 compression=compression,
+                                                 record=record,
+                                                 replay=replay,
+                                                 replay_latency_scale=replay_latency_scale,
+                                                 fake_server=fake_server,
+                                                 fake_server_latency=fake_server_latency,
+                                                 ejection_time=ejection_time,
                                                  auth=plugin)
 
     def register_argparse_arguments(self, parser):
@@ -65,7 +170,8 @@ class SessionLoader(loading.session.Session):
         contrail_group.add_argument('--host', '-H',
                                     default=os.environ.get('CONTRAIL_API_HOST', 'localhost'),
                                     type=str,
-                                    help="host to connect to (default='%(default)s')")
+                                    help="host to connect to, requests are balanced between "
+                                         "hosts of a comma separated list (default='%(default)s')")
         contrail_group.add_argument('--port', '-p',
                                     default=os.environ.get('CONTRAIL_API_PORT', 8082),
                                     type=int,
@@ -78,6 +184,88 @@ class SessionLoader(loading.session.Session):
                                     type=str,
                                     default=os.environ.get('CONTRAIL_API_BASE_URI', ''),
                                     help="base URI component added after hostname:port (default=%(default)s)")
+        contrail_group.add_argument('--resolve-cache-size',
+                                    type=int,
+                                    default=os.environ.get('CONTRAIL_API_RESOLVE_CACHE_SIZE', 10000),
+                                    help="max number of cached fq_name/uuid resolutions (default=%(default)s)")
+        contrail_group.add_argument('--resolve-cache-ttl',
+                                    type=int,
+                                    default=os.environ.get('CONTRAIL_API_RESOLVE_CACHE_TTL', 300),
+                                    help="lifetime in seconds of cached fq_name/uuid resolutions, "
+                                         "0 to disable the cache (default=%(default)s)")
+        contrail_group.add_argument('--resolve-cache-persist',
+                                    action="store_true",
+                                    default='CONTRAIL_API_RESOLVE_CACHE_PERSIST' in os.environ,
+                                    help="keep fq_name/uuid resolutions on disk between invocations")
+        contrail_group.add_argument('--resource-cache',
+                                    action="store_true",
+                                    default='CONTRAIL_API_RESOURCE_CACHE' in os.environ,
+                                    help="cache resources fetched without back_refs and "
+                                         "children and revalidate them with "
+                                         "id_perms.last_modified before reuse")
+        contrail_group.add_argument('--resource-cache-max-age',
+                                    type=int,
+                                    default=os.environ.get('CONTRAIL_API_RESOURCE_CACHE_MAX_AGE', 2),
+                                    help="delay in seconds before a cached resource "
+                                         "is revalidated (default=%(default)s)")
+        contrail_group.add_argument('--max-concurrency',
+                                    type=int,
+                                    default=os.environ.get('CONTRAIL_API_MAX_CONCURRENCY', 50),
+                                    help="max number of concurrent API requests, the actual "
+                                         "number adapts to the API server load (default=%(default)s)")
+        contrail_group.add_argument('--retries',
+                                    type=int,
+                                    default=os.environ.get('CONTRAIL_API_RETRIES', 3),
+                                    help="max number of retries of requests failing with "
+                                         "transient errors (default=%(default)s)")
+        contrail_group.add_argument('--retry-backoff',
+                                    type=float,
+                                    default=os.environ.get('CONTRAIL_API_RETRY_BACKOFF', 0.5),
+                                    help="base delay in seconds between retries, doubled "
+                                         "at each retry (default=%(default)s)")
+        contrail_group.add_argument('--retry-posts',
+                                    action="store_true",
+                                    default='CONTRAIL_API_RETRY_POSTS' in os.environ,
+                                    help="also retry non idempotent POST requests")
+        contrail_group.add_argument('--no-compression',
+                                    action="store_false",
+                                    dest="compression",
+                                    default='CONTRAIL_API_NO_COMPRESSION' not in os.environ,
+                                    help="don't request gzip/deflate compressed responses")
+        contrail_group.add_argument('--record',
+                                    metavar='CASSETTE',
+                                    default=os.environ.get('CONTRAIL_API_RECORD'),
+                                    help="record HTTP requests and responses in a cassette file")
+        contrail_group.add_argument('--replay',
+                                    metavar='CASSETTE',
+                                    default=os.environ.get('CONTRAIL_API_REPLAY'),
+                                    help="serve HTTP requests from a cassette file "
+                                         "instead of the network, without authentication")
+        contrail_group.add_argument('--replay-latency-scale',
+                                    type=float,
+                                    default=os.environ.get('CONTRAIL_API_REPLAY_LATENCY_SCALE', 1.0),
+                                    help="factor applied to the recorded latencies, 0 replays "
+                                         "without delay (default=%(default)s)")
+        contrail_group.add_argument('--fake-server',
+                                    metavar='RESOURCES',
+                                    default=os.environ.get('CONTRAIL_API_FAKE_SERVER'),
+                                    help="serve requests with an in-process fake API server "
+                                         "loaded with a file generated by the topology command")
+        contrail_group.add_argument('--fake-server-latency',
+                                    type=float,
+                                    default=os.environ.get('CONTRAIL_API_FAKE_SERVER_LATENCY', 0),
+                                    help="latency of the fake API server in seconds "
+                                         "(default=%(default)s)")
+        contrail_group.add_argument('--token-cache',
+                                    action="store_true",
+                                    default='CONTRAIL_API_TOKEN_CACHE' in os.environ,
+                                    help="reuse keystone tokens between invocations, tokens "
+                                         "are stored in the configuration directory")
+        contrail_group.add_argument('--ejection-time',
+                                    type=float,
+                                    default=os.environ.get('CONTRAIL_API_EJECTION_TIME', 30),
+                                    help="seconds during which a failing host doesn't get "
+                                         "requests when several hosts are used (default=%(default)s)")
         super(SessionLoader, self).register_argparse_arguments(parser)
 
 
@@ -89,28 +277,742 @@ def register_argparse_arguments(parser):
     return SessionLoader().register_argparse_arguments(parser)
 
 
+class TokenCache(object):
+    """Store the keystone token of an auth plugin so that
+    it can be reused by the next invocations
+
+    Tokens are stored in `directory` in a file named with the
+    plugin cache id, a hash of the auth url, user and project.
+    Only the user can read the files. keystoneauth takes care of
+    getting a new token shortly before expiry or when the API
+    server returns a 401.
+
+    Plugins without cache id like the HTTP basic auth plugin
+    are not cached.
+
+    :param plugin: keystoneauth plugin
+    :param directory: tokens directory
+    :type directory: str
+    """
+
+    def __init__(self, plugin, directory):
+        self.plugin = plugin
+        self.path = None
+        self._state = None
+        get_cache_id = getattr(plugin, 'get_cache_id', None)
+        cache_id = get_cache_id() if get_cache_id is not None else None
+        if cache_id is not None:
+            self.path = os.path.join(directory, '%s.json' % cache_id)
+
+    def load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                self._state = f.read()
+        except IOError as e:
+            logger.debug('Cannot load token %s: %s' % (self.path, e))
+            return
+        try:
+            self.plugin.set_auth_state(self._state)
+        except (ValueError, KeyError) as e:
+            logger.debug('Cannot load token %s: %s' % (self.path, e))
+
+    def save(self):
+        if self.path is None:
+            return
+        state = self.plugin.get_auth_state()
+        if state is None or state == self._state:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if not os.path.exists(directory):
+                os.makedirs(directory, 0o700)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(state)
+            self._state = state
+        except (IOError, OSError) as e:
+            logger.debug('Cannot save token %s: %s' % (self.path, e))
+
+
+class ResolveCache(object):
+    """LRU cache of fq_name <-> uuid resolutions
+
+    Entries expire after `ttl` seconds. If `path` is provided the
+    cache is loaded from this file and saved back at exit so that
+    resolutions are shared between invocations.
+
+    :param size: max number of entries
+    :type size: int
+    :param ttl: lifetime of entries in seconds, 0 disables the cache
+    :type ttl: int
+    :param path: file used to persist the cache
+    :type path: str
+    """
+
+    def __init__(self, size=10000, ttl=300, path=None):
+        self.size = size
+        self.ttl = ttl
+        self.path = path
+        # (type, fq_name) -> uuid
+        self._uuids = OrderedDict()
+        # uuid -> (type, fq_name, expire)
+        self._fq_names = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.path is not None and self.ttl > 0:
+            self.load()
+            atexit.register(self.save)
+
+    def __len__(self):
+        return len(self._fq_names)
+
+    def _fq_name_key(self, type, fq_name):
+        return (type.replace('_', '-'), text_type(FQName(fq_name)))
+
+    def get_uuid(self, type, fq_name):
+        """Return cached uuid of resource type/fq_name or None
+
+        :rtype: UUIDv4 str
+        """
+        uuid = self._uuids.get(self._fq_name_key(type, fq_name))
+        if uuid is not None and self._get(uuid) is not None:
+            self.hits += 1
+            return uuid
+        self.misses += 1
+        return None
+
+    def get_fq_name(self, uuid):
+        """Return cached type and fq_name of uuid or None
+
+        :rtype: (str, FQName)
+        """
+        cached = self._get(uuid)
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def _get(self, uuid):
+        try:
+            type, fq_name, expire = self._fq_names.pop(uuid)
+        except KeyError:
+            return None
+        if expire < time.time():
+            self._uuids.pop(self._fq_name_key(type, fq_name), None)
+            return None
+        self._fq_names[uuid] = (type, fq_name, expire)
+        return (type, FQName(fq_name))
+
+    def add(self, type, fq_name, uuid, expire=None):
+        """Add a resolution to the cache
+
+        :param type: resource type
+        :type type: str
+        :param fq_name: resource fq_name
+        :type fq_name: FQName
+        :param uuid: resource uuid
+        :type uuid: UUIDv4 str
+        """
+        if self.ttl <= 0:
+            return
+        if expire is None:
+            expire = time.time() + self.ttl
+        self.invalidate(uuid)
+        self._fq_names[uuid] = (type, list(fq_name), expire)
+        self._uuids[self._fq_name_key(type, fq_name)] = uuid
+        while len(self._fq_names) > self.size:
+            self.invalidate(next(iter(self._fq_names)))
+
+    def invalidate(self, uuid):
+        """Remove uuid from the cache
+
+        :param uuid: resource uuid
+        :type uuid: UUIDv4 str
+        """
+        try:
+            type, fq_name, _ = self._fq_names.pop(uuid)
+        except KeyError:
+            return
+        self._uuids.pop(self._fq_name_key(type, fq_name), None)
+
+    def clear(self):
+        self._uuids.clear()
+        self._fq_names.clear()
+
+    @property
+    def stats(self):
+        """Return cache statistics
+
+        :rtype: dict
+        """
+        return {'size': len(self),
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (IOError, ValueError) as e:
+            logger.debug('Cannot load resolve cache %s: %s' % (self.path, e))
+            return
+        now = time.time()
+        for type, fq_name, uuid, expire in entries:
+            if expire > now:
+                self.add(type, fq_name, uuid, expire=expire)
+
+    def save(self):
+        now = time.time()
+        entries = [[type, fq_name, uuid, expire]
+                   for uuid, (type, fq_name, expire) in self._fq_names.items()
+                   if expire > now]
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(entries, f)
+        except IOError as e:
+            logger.debug('Cannot save resolve cache %s: %s' % (self.path, e))
+
+
+class ResourceBodyCache(object):
+    """Cache of resources bodies fetched during the session
+
+    Bodies are kept with the resource id_perms.last_modified
+    value. An entry is served without checking the API server
+    for `max_age` seconds after it was stored or validated.
+    After that the session must revalidate it by comparing
+    last_modified values.
+
+    .. note::
+
+        Adding back_refs or children to a resource doesn't change
+        its last_modified value, only bodies fetched without
+        back_refs and children are cached by the session.
+        Modifications done through the session invalidate the
+        involved resources.
+
+    :param enabled: enable the cache
+    :type enabled: bool
+    :param max_age: delay in seconds before revalidation
+    :type max_age: int
+    """
+
+    def __init__(self, enabled=False, max_age=2):
+        self.enabled = enabled
+        self.max_age = max_age
+        # uuid -> {key: body}
+        self._bodies = {}
+        # uuid -> (last_modified, validation time)
+        self._validated = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.revalidations = 0
+
+    def __contains__(self, uuid):
+        return uuid in self._bodies
+
+    def __len__(self):
+        return len(self._bodies)
+
+    def is_fresh(self, uuid):
+        try:
+            _, validated = self._validated[uuid]
+        except KeyError:
+            return False
+        return time.time() - validated < self.max_age
+
+    def get(self, uuid, key):
+        """Return cached body or None
+
+        :rtype: bytes
+        """
+        body = self._bodies.get(uuid, {}).get(key)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def add(self, uuid, key, body, last_modified):
+        if not self.enabled or last_modified is None:
+            return
+        if self._validated.get(uuid, (last_modified,))[0] != last_modified:
+            self.invalidate(uuid)
+        self._bodies.setdefault(uuid, {})[key] = body
+        self._validated[uuid] = (last_modified, time.time())
+
+    def validate(self, uuid, last_modified):
+        """Check that the cached resource is up to date
+
+        Outdated resources are removed from the cache.
+
+        :rtype: bool
+        """
+        self.revalidations += 1
+        try:
+            cached_last_modified, _ = self._validated[uuid]
+        except KeyError:
+            return False
+        if last_modified is None or last_modified != cached_last_modified:
+            self.stale += 1
+            self.invalidate(uuid)
+            return False
+        self._validated[uuid] = (last_modified, time.time())
+        return True
+
+    def invalidate(self, uuid):
+        self._bodies.pop(uuid, None)
+        self._validated.pop(uuid, None)
+
+    def clear(self):
+        self._bodies.clear()
+        self._validated.clear()
+
+    @property
+    def stats(self):
+        """Return cache statistics
+
+        :rtype: dict
+        """
+        return {'size': len(self),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'revalidations': self.revalidations}
+
+
+class ConcurrencyGovernor(object):
+    """Limit the number of concurrent requests to the API server
+
+    The limit is adjusted with an AIMD algorithm. It grows by one
+    every `limit` successful requests and it is halved when the
+    API server returns errors or when the smoothed latency of an
+    endpoint stays above `latency_tolerance` times its baseline
+    for `slow_samples` consecutive requests.
+
+    The baseline of an endpoint follows the lowest smoothed latency
+    and slowly decays towards the current latency so that a few
+    fast requests don't make all the following ones look slow.
+
+    :param initial: initial limit, defaults to maximum
+    :type initial: int
+    :param minimum: lowest limit
+    :type minimum: int
+    :param maximum: highest limit
+    :type maximum: int
+    :param latency_tolerance: latency increase factor that
+                              triggers a limit decrease
+    :type latency_tolerance: float
+    """
+    latency_smoothing = 0.2
+    baseline_decay = 0.01
+    slow_samples = 5
+
+    def __init__(self, initial=None, minimum=1, maximum=50, latency_tolerance=3.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        if initial is None:
+            initial = self.maximum
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_tolerance = latency_tolerance
+        self.active = 0
+        self.throttled = 0
+        self.latency = None
+        # endpoint -> [smoothed latency, baseline latency]
+        self.latencies = {}
+        self._slow = 0
+        self._last_decrease = 0
+        self._waiters = deque()
+
+    def acquire(self):
+        while self.active >= int(self.limit):
+            waiter = Event()
+            self._waiters.append(waiter)
+            waiter.wait()
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def _wake(self):
+        free = int(self.limit) - self.active
+        while free > 0 and self._waiters:
+            self._waiters.popleft().set()
+            free -= 1
+
+    def success(self, latency, endpoint=None):
+        """Record a successful request
+
+        :param latency: request duration in seconds
+        :type latency: float
+        :param endpoint: request endpoint (eg: GET /foos)
+        :type endpoint: str
+        """
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.latency_smoothing * (latency - self.latency)
+        stats = self.latencies.get(endpoint)
+        if stats is None:
+            stats = self.latencies[endpoint] = [latency, latency]
+        else:
+            stats[0] += self.latency_smoothing * (latency - stats[0])
+            if stats[0] < stats[1]:
+                stats[1] = stats[0]
+            else:
+                stats[1] += self.baseline_decay * (stats[0] - stats[1])
+        if stats[0] > self.latency_tolerance * stats[1]:
+            # decrease only when requests are slow for a while
+            self._slow += 1
+            if self._slow >= self.slow_samples:
+                self._slow = 0
+                self._decrease('latency %.3fs for %s' % (stats[0], endpoint))
+            return
+        self._slow = 0
+        previous = int(self.limit)
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        if int(self.limit) > previous:
+            logger.debug('API requests concurrency limit raised to %d' % self.limit)
+            self._wake()
+
+    def failure(self, reason):
+        """Record a request failure due to the API server load
+
+        :param reason: failure description
+        :type reason: str
+        """
+        self._decrease(reason)
+
+    def _decrease(self, reason):
+        now = time.time()
+        # decrease once per latency period since requests
+        # started before the decrease can still fail
+        if now - self._last_decrease < (self.latency or 0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit / 2)
+        self.throttled += 1
+        logger.debug('Throttling API requests (%s), concurrency limit lowered to %d' %
+                     (reason, self.limit))
+
+
+def percentile(values, percent):
+    """Return the percentile of sorted values
+    with the nearest rank method
+
+    :param values: sorted values
+    :type values: [float]
+    :param percent: percentile between 0 and 100
+    :type percent: float
+    """
+    if not values:
+        return None
+    rank = int(len(values) * percent / 100.0 + 0.5)
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class EndpointStats(object):
+    """Statistics of requests made to one API endpoint
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.status = Counter()
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+    @property
+    def errors(self):
+        return sum(count for status, count in self.status.items()
+                   if not isinstance(status, int) or status >= 400)
+
+    def percentiles(self, *percents):
+        latencies = sorted(self.latencies)
+        return [percentile(latencies, p) for p in percents]
+
+
+class RequestStats(object):
+    """Statistics of API requests by endpoint
+
+    Endpoints are identified by the request method and
+    path where resource uuids are replaced by `{uuid}`, eg:
+    `GET /virtual-network/{uuid}`.
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+
+    def __getitem__(self, endpoint):
+        return self.endpoints[endpoint]
+
+    def _endpoint(self, endpoint):
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = EndpointStats()
+        return self.endpoints[endpoint]
+
+    def record(self, endpoint, status, latency):
+        """Record a request
+
+        :param endpoint: request endpoint
+        :type endpoint: str
+        :param status: HTTP status code or error name
+        :type status: int | str
+        :param latency: request duration in seconds
+        :type latency: float
+        """
+        stats = self._endpoint(endpoint)
+        stats.latencies.append(latency)
+        stats.status[status] += 1
+
+    def record_bytes(self, endpoint, received, decoded):
+        """Record the size of a response body
+
+        :param endpoint: request endpoint
+        :type endpoint: str
+        :param received: body size on the wire
+        :type received: int
+        :param decoded: body size once decompressed
+        :type decoded: int
+        """
+        stats = self._endpoint(endpoint)
+        stats.bytes_received += received
+        stats.bytes_decoded += decoded
+
+    @property
+    def count(self):
+        return sum(s.count for s in self.endpoints.values())
+
+    @property
+    def bytes_received(self):
+        return sum(s.bytes_received for s in self.endpoints.values())
+
+    @property
+    def bytes_decoded(self):
+        return sum(s.bytes_decoded for s in self.endpoints.values())
+
+    def reset(self):
+        self.endpoints.clear()
+
+    def format(self):
+        """Return a table of endpoints statistics
+
+        Latencies are in milliseconds.
+
+        :rtype: str
+        """
+        rows = [['endpoint', 'count', 'errors', 'p50', 'p95', 'p99',
+                 'received', 'decoded', 'status']]
+        for endpoint, stats in sorted(self.endpoints.items(),
+                                      key=lambda e: sum(e[1].latencies),
+                                      reverse=True):
+            status = sorted(stats.status.items(), key=lambda s: text_type(s[0]))
+            rows.append([endpoint, stats.count, stats.errors] +
+                        ['%.1f' % (p * 1000) for p in stats.percentiles(50, 95, 99)] +
+                        [stats.bytes_received, stats.bytes_decoded,
+                         ' '.join('%s:%d' % s for s in status)])
+        return format_table(rows)
+
+
+class APIServer(object):
+    """API server used by the session
+
+    :param base_url: API server url
+    :type base_url: str
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        # consecutive failures
+        self.failures = 0
+        self.ejected_until = 0
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.base_url)
+
+
+class APIServerPool(object):
+    """Balance requests between API servers
+
+    Requests are sent to the healthy server with the least
+    outstanding requests. A server is ejected from the pool for
+    `ejection_time` seconds after `max_failures` consecutive
+    failures. When all servers are ejected the one that will
+    come back first is used.
+
+    :param base_urls: API servers urls
+    :type base_urls: [str]
+    :param ejection_time: ejection duration in seconds
+    :type ejection_time: float
+    """
+    max_failures = 2
+
+    def __init__(self, base_urls, ejection_time=30):
+        self.servers = [APIServer(url) for url in base_urls]
+        self.ejection_time = ejection_time
+
+    def __iter__(self):
+        return iter(self.servers)
+
+    def __len__(self):
+        return len(self.servers)
+
+    def path(self, url):
+        """Return the path of url on the API servers or None
+
+        :rtype: str
+        """
+        for server in self.servers:
+            if url.startswith(server.base_url):
+                return url[len(server.base_url):]
+        return None
+
+    def acquire(self):
+        """Return the server to use for the next request
+
+        :rtype: APIServer
+        """
+        now = time.time()
+        healthy = [s for s in self.servers if s.ejected_until <= now]
+        if not healthy:
+            healthy = [min(self.servers, key=lambda s: s.ejected_until)]
+        # the least used server is selected when all
+        # servers have the same number of outstanding requests
+        server = min(healthy, key=lambda s: (s.outstanding, s.requests))
+        server.outstanding += 1
+        server.requests += 1
+        return server
+
+    def release(self, server, failed=False):
+        """Release a server after a request
+
+        :param failed: the server failed to handle the request
+        :type failed: bool
+        """
+        server.outstanding -= 1
+        if not failed:
+            server.failures = 0
+            return
+        server.errors += 1
+        server.failures += 1
+        if server.failures >= self.max_failures and len(self.servers) > 1:
+            server.failures = 0
+            server.ejections += 1
+            server.ejected_until = time.time() + self.ejection_time
+            logger.debug('Ejecting API server %s for %ds' %
+                         (server.base_url, self.ejection_time))
+
+
 class ContrailAPISession(Session):
     user_agent = "contrail-api-cli"
     protocol = None
     host = None
     port = None
     base_uri = None
+    stream_chunk_size = 64 * 1024
+    overload_status_codes = (429, 502, 503, 504)
+    idempotent_methods = ('GET', 'HEAD', 'OPTIONS', 'PUT')
+    # POST requests that don't modify anything
+    read_only_uris = ('/fqname-to-id', '/id-to-fqname')
+    retry_max_delay = 30
     default_headers = {
         'X-Contrail-Useragent': '%s:%s' % (platform.node(), 'contrail-api-cli'),
         "Content-Type": "application/json"
     }
 
-    def __init__(self, host="localhost", port=8082, protocol="http", base_uri='', **kwargs):
-        self.host = host
+    def __init__(self, host="localhost", port=8082, protocol="http", base_uri='',
+                 resolve_cache_size=10000, resolve_cache_ttl=300, resolve_cache_persist=False,
+                 resource_cache=False, resource_cache_max_age=2, max_concurrency=50,
+                 retries=3, retry_backoff=0.5, retry_posts=False, compression=True,
+                 record=None, replay=None, replay_latency_scale=1.0, adapter=None,
+                 fake_server=None, fake_server_latency=0, ejection_time=30,
+                 **kwargs):
+        if isinstance(host, string_types):
+            host = host.split(',')
+        self.hosts = [h.strip() for h in host]
+        self.host = host = self.hosts[0]
         self.port = port
         self.protocol = protocol
         self.base_uri = base_uri
+        self.servers = APIServerPool(['%s://%s:%s%s' % (protocol, h, port, base_uri)
+                                      for h in self.hosts],
+                                     ejection_time=ejection_time)
+        resolve_cache_path = None
+        if resolve_cache_persist:
+            resolve_cache_path = os.path.join(CONFIG_DIR, 'resolve-cache-%s-%s.json' % (host, port))
+        self.resolve_cache = ResolveCache(size=resolve_cache_size,
+                                          ttl=resolve_cache_ttl,
+                                          path=resolve_cache_path)
+        self.resource_cache = ResourceBodyCache(enabled=resource_cache,
+                                                max_age=resource_cache_max_age)
+        self.governor = ConcurrencyGovernor(maximum=max_concurrency)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_posts = retry_posts
+        # total number of retried requests
+        self.retried = 0
+        # GET requests in progress
+        self._inflight = {}
+        # number of GET requests saved by sharing
+        # in progress requests
+        self.coalesced = 0
+        # type -> ([uuids], AsyncResult) of the pending
+        # revalidation of stale cached resources
+        self._revalidations = {}
+        self.stats = RequestStats()
         session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=100)
+        # cassettes only store requests made to the API servers,
+        # authentication requests are not recorded
+        api_adapter = None
+        self.replaying = False
+        # adapter can be a custom transport like FakeAPIAdapter
+        if adapter is None and fake_server is not None:
+            server = FakeAPIServer(base_uri=base_uri)
+            with io.open(fake_server, encoding='utf-8') as f:
+                topology.load(server, topology.read_ndjson(f))
+            adapter = FakeAPIAdapter(server, latency=fake_server_latency)
+        elif adapter is None and replay is not None:
+            api_adapter = ReplayAdapter(replay, latency_scale=replay_latency_scale,
+                                        pool_connections=100, pool_maxsize=100)
+            # no auth response can be replayed, requests
+            # are replayed without authentication
+            self.replaying = True
+        elif adapter is None and record is not None:
+            api_adapter = RecordAdapter(record, pool_connections=100, pool_maxsize=100)
+        if adapter is None:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=100)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
+        if api_adapter is not None:
+            for server in self.servers:
+                session.mount(server.base_url, api_adapter)
+        # bodies are decoded transparently by urllib3
+        session.headers['Accept-Encoding'] = 'gzip, deflate' if compression else 'identity'
         super(ContrailAPISession, self).__init__(session=session, **kwargs)
 
+    def _resource_url(self, url):
+        """Return (type, uuid) if url is the location
+        of a resource or None
+        """
+        path = self.servers.path(url)
+        if path is None:
+            return None
+        path = Path(path or '/')
+        if not path.is_absolute() or path.is_collection or not path.is_uuid:
+            return None
+        return (path.base, path.name)
+
     @property
     def user(self):
         if hasattr(self.auth, 'username'):
@@ -125,13 +1027,306 @@ class ContrailAPISession(Session):
     def make_url(self, uri):
         return self.base_url + uri
 
+    def format_stats(self):
+        """Return a summary of the API requests made
+        during the session
+
+        :rtype: str
+        """
+        lines = [
+            self.stats.format(),
+            '',
+            'requests: %d, retried: %d, coalesced: %d' %
+            (self.stats.count, self.retried, self.coalesced),
+            'bytes received: %d, decoded: %d' %
+            (self.stats.bytes_received, self.stats.bytes_decoded),
+            'resolve cache: %(hits)d hits, %(misses)d misses' % self.resolve_cache.stats,
+        ]
+        if self.resource_cache.enabled:
+            lines.append('resource cache: %(hits)d hits, %(misses)d misses, '
+                         '%(revalidations)d revalidations, %(stale)d stale' %
+                         self.resource_cache.stats)
+        lines.append('concurrency limit: %d, throttled %d times' %
+                     (self.governor.limit, self.governor.throttled))
+        if len(self.servers) > 1:
+            for server in self.servers:
+                lines.append('%s: %d requests, %d errors, ejected %d times' %
+                             (server.base_url, server.requests, server.errors,
+                              server.ejections))
+        return '\n'.join(lines)
+
+    def reset_stats(self):
+        self.stats.reset()
+        self.retried = 0
+        self.coalesced = 0
+        self.resolve_cache.hits = self.resolve_cache.misses = 0
+        cache = self.resource_cache
+        cache.hits = cache.misses = cache.stale = cache.revalidations = 0
+        self.governor.throttled = 0
+        for server in self.servers:
+            server.requests = server.errors = server.ejections = 0
+
+    def _endpoint(self, url, method):
+        resource = self._resource_url(url)
+        if resource is not None:
+            path = '/%s/{uuid}' % resource[0]
+        else:
+            path = self.servers.path(url) or '/'
+        return '%s %s' % (method.upper(), path)
+
+    def request(self, url, method, **kwargs):
+        """Send a request to the API server
+
+        Requests failing with transient errors are retried with
+        an exponential backoff when they are idempotent. The number
+        of retries is available in the `retries` attribute of the
+        response or of the raised exception.
+        """
+        if self.replaying:
+            kwargs.setdefault('authenticated', False)
+        path = self.servers.path(url)
+        # auth requests to keystone are not handled
+        if path is None:
+            return super(ContrailAPISession, self).request(url, method, **kwargs)
+        endpoint = self._endpoint(url, method)
+        attempt = 0
+        while True:
+            try:
+                response = self._governed_request(endpoint, path, method, **kwargs)
+            except (HttpError, KeystoneConnectionError) as e:
+                if attempt >= self.retries or not self._is_retriable(path, method, e):
+                    e.retries = attempt
+                    raise
+                attempt += 1
+                self.retried += 1
+                delay = self._retry_delay(attempt)
+                logger.debug('Retrying %s %s in %.2fs after %s (%d/%d)' %
+                             (method, url, delay, e, attempt, self.retries))
+                gevent.sleep(delay)
+            else:
+                response.retries = attempt
+                return response
+
+    def _is_retriable(self, path, method, error):
+        if isinstance(error, HttpError):
+            if error.http_status not in self.overload_status_codes:
+                return False
+        elif isinstance(error, SSLError):
+            return False
+        method = method.upper()
+        if method in self.idempotent_methods:
+            return True
+        if method == 'POST':
+            return self.retry_posts or path in self.read_only_uris
+        return False
+
+    def _retry_delay(self, attempt):
+        # full jitter exponential backoff
+        return random.uniform(0, min(self.retry_max_delay,
+                                     self.retry_backoff * 2 ** (attempt - 1)))
+
+    def _governed_request(self, endpoint, path, method, **kwargs):
+        self.governor.acquire()
+        server = self.servers.acquire()
+        failed = False
+        start = time.time()
+        try:
+            response = super(ContrailAPISession, self).request(server.base_url + path,
+                                                               method, **kwargs)
+        except HttpError as e:
+            latency = time.time() - start
+            self.stats.record(endpoint, e.http_status, latency)
+            if e.http_status in self.overload_status_codes:
+                failed = True
+                self.governor.failure('HTTP %s' % e.http_status)
+            else:
+                self.governor.success(latency, endpoint)
+            raise
+        except KeystoneConnectionError as e:
+            failed = True
+            self.stats.record(endpoint, e.__class__.__name__, time.time() - start)
+            self.governor.failure(e.__class__.__name__)
+            raise
+        else:
+            latency = time.time() - start
+            self.stats.record(endpoint, response.status_code, latency)
+            self.governor.success(latency, endpoint)
+            if not kwargs.get('stream'):
+                self._count_bytes(endpoint, response, len(response.content))
+            return response
+        finally:
+            self.servers.release(server, failed=failed)
+            self.governor.release()
+
+    def _count_bytes(self, endpoint, response, decoded):
+        if isinstance(response.raw, HTTPResponse):
+            received = response.raw.tell()
+        else:
+            received = decoded
+        self.stats.record_bytes(endpoint, received, decoded)
+
+    def _iter_content(self, endpoint, response):
+        decoded = 0
+        try:
+            for chunk in response.iter_content(chunk_size=self.stream_chunk_size):
+                decoded += len(chunk)
+                yield chunk
+            self._count_bytes(endpoint, response, decoded)
+        finally:
+            response.close()
+
+    def _get_content(self, url, params):
+        """GET url and return the response body
+
+        Identical concurrent requests share the same HTTP
+        request. The body is decoded by each caller since
+        results are modified in place by resources.
+
+        :rtype: bytes
+        """
+        key = (url, tuple(sorted((k, text_type(v)) for k, v in params.items())))
+        if key in self._inflight:
+            self.coalesced += 1
+            try:
+                return self._inflight[key].get()
+            except Exception as e:
+                raise copy_error(e)
+        result = AsyncResult()
+        self._inflight[key] = result
+        try:
+            content = self.get(url, params=params).content
+        except Exception as e:
+            # keep the error before it is modified by the caller
+            result.set_exception(copy_error(e))
+            raise
+        else:
+            result.set(content)
+            return content
+        finally:
+            del self._inflight[key]
+
     @contrail_error_handler
     def get_json(self, url, **kwargs):
-        return self.get(url, params=kwargs).json()
+        resource = None
+        # back_refs and children can change without modifying
+        # the last_modified value of the resource
+        if self.resource_cache.enabled and \
+                kwargs.get('exclude_back_refs') and kwargs.get('exclude_children'):
+            resource = self._resource_url(url)
+        if resource is None:
+            return from_json(self._get_content(url, kwargs))
+
+        type, uuid = resource
+        key = tuple(sorted(kwargs.items()))
+        if uuid in self.resource_cache and not self.resource_cache.is_fresh(uuid):
+            self._revalidate_batch(type, uuid)
+        body = self.resource_cache.get(uuid, key)
+        if body is not None:
+            return from_json(body)
+        body = self._get_content(url, kwargs)
+        data = from_json(body)
+        try:
+            last_modified = data[type]['id_perms']['last_modified']
+        except (KeyError, TypeError):
+            last_modified = None
+        self.resource_cache.add(uuid, key, body, last_modified)
+        return data
+
+    def _revalidate_batch(self, type, uuid):
+        """Revalidate a stale cached resource together with the
+        resources of the same type revalidated concurrently, so that
+        a single list request checks all of them
+        """
+        batch = self._revalidations.get(type)
+        if batch is not None:
+            batch[0].append(uuid)
+            try:
+                batch[1].get()
+            except Exception:
+                self.resource_cache.invalidate(uuid)
+            return
+        batch = self._revalidations[type] = ([uuid], AsyncResult())
+        # let other greenlets add their resources to the batch
+        gevent.sleep(0)
+        del self._revalidations[type]
+        try:
+            batch[1].set(self.revalidate(type, batch[0]))
+        except Exception as e:
+            # resources will be fetched again
+            for u in batch[0]:
+                self.resource_cache.invalidate(u)
+            batch[1].set_exception(e)
+
+    def revalidate(self, type, uuids, workers=50, chunk_size=100):
+        """
+        Check cached resources against the API server
+
+        The id_perms of the resources are retrieved with list
+        requests on the type collection filtered by uuids.
+        Resources that were modified or deleted are removed
+        from the resource cache.
+
+        :param type: resources type
+        :type type: str
+        :param uuids: resources uuids
+        :type uuids: [UUIDv4 str]
+        :param workers: max number of concurrent requests
+        :type workers: int
+        :param chunk_size: max number of uuids per request
+        :type chunk_size: int
+
+        :rtype: [UUIDv4 str] uuids still valid in the cache
+        """
+        uuids = [u for u in OrderedDict.fromkeys(uuids) if u in self.resource_cache]
+        chunks = [uuids[i:i + chunk_size]
+                  for i in range(0, len(uuids), chunk_size)]
+        url = self.make_url('/%ss' % type)
+
+        def get_id_perms(uuids):
+            params = {'obj_uuids': ','.join(uuids),
+                      'fields': 'id_perms'}
+            return from_json(self._get_content(url, params))
+
+        valid = []
+        for data in parallel_map(get_id_perms, chunks, workers=workers):
+            for res in data.get('%ss' % type, []):
+                if res['uuid'] not in self.resource_cache:
+                    continue
+                last_modified = res.get('id_perms', {}).get('last_modified')
+                if self.resource_cache.validate(res['uuid'], last_modified):
+                    valid.append(res['uuid'])
+        # deleted resources
+        for uuid in set(uuids) - set(valid):
+            self.resource_cache.invalidate(uuid)
+        logger.debug('Resource cache: %s' % self.resource_cache.stats)
+        return valid
 
     @contrail_error_handler
-    def delete(self, *args, **kwargs):
-        return super(ContrailAPISession, self).delete(*args, **kwargs)
+    def get_json_stream(self, url, **kwargs):
+        """
+        GET a JSON document made of lists and decode it
+        while the response body is received
+
+        :param url: resource location (eg: "/types")
+        :type url: str
+
+        The response is closed when the returned generator
+        is exhausted or closed.
+
+        :rtype: generator of (key, element)
+        """
+        response = self.get(url, params=kwargs, stream=True)
+        return iter(JSONStreamDecoder(self._iter_content(self._endpoint(url, 'GET'), response)))
+
+    def _invalidate_url(self, url):
+        resource = self._resource_url(url)
+        if resource is not None:
+            self.resource_cache.invalidate(resource[1])
+
+    @contrail_error_handler
+    def delete(self, url, *args, **kwargs):
+        self._invalidate_url(url)
+        return super(ContrailAPISession, self).delete(url, *args, **kwargs)
 
     @contrail_error_handler
     def post_json(self, url, data, cls=None, **kwargs):
@@ -143,9 +1338,9 @@ class ContrailAPISession(Session):
         :param cls: JSONEncoder class
         :type cls: JSONEncoder
         """
-        kwargs['data'] = to_json(data, cls=cls)
+        kwargs['data'] = to_compact_json(data, cls=cls)
         kwargs['headers'] = self.default_headers
-        return self.post(url, **kwargs).json()
+        return from_json(self.post(url, **kwargs).content)
 
     @contrail_error_handler
     def put_json(self, url, data, cls=None, **kwargs):
@@ -157,11 +1352,12 @@ class ContrailAPISession(Session):
         :param cls: JSONEncoder class
         :type cls: JSONEncoder
         """
-        kwargs['data'] = to_json(data, cls=cls)
+        self._invalidate_url(url)
+        kwargs['data'] = to_compact_json(data, cls=cls)
         kwargs['headers'] = self.default_headers
-        return self.put(url, **kwargs).json()
+        return from_json(self.put(url, **kwargs).content)
 
-    def fqname_to_id(self, fq_name, type):
+    def fqname_to_id(self, fq_name, type, cache=True):
         """
         Return uuid for fq_name
 
@@ -169,17 +1365,30 @@ class ContrailAPISession(Session):
         :type fq_name: FQName
         :param type: resource type
         :type type: str
+        :param cache: use the resolve cache, when False
+                      the API server is always requested
+        :type cache: bool
 
         :rtype: UUIDv4 str
         :raises HttpError: fq_name not found
         """
+        uuid = self.resolve_cache.get_uuid(type, fq_name)
+        if uuid is not None and cache:
+            return uuid
         data = {
             "type": type,
             "fq_name": list(fq_name)
         }
-        return self.post_json(self.make_url("/fqname-to-id"), data)["uuid"]
+        try:
+            new_uuid = self.post_json(self.make_url("/fqname-to-id"), data)["uuid"]
+        except HttpError as e:
+            if e.http_status == 404 and uuid is not None:
+                self.resolve_cache.invalidate(uuid)
+            raise
+        self.resolve_cache.add(type, fq_name, new_uuid)
+        return new_uuid
 
-    def id_to_fqname(self, uuid, type=None):
+    def id_to_fqname(self, uuid, type=None, cache=True):
         """
         Return fq_name and type for uuid
 
@@ -191,26 +1400,151 @@ class ContrailAPISession(Session):
         :type uuid: UUIDv4 str
         :param type: resource type
         :type type: str
+        :param cache: use the resolve cache, when False
+                      the API server is always requested
+        :type cache: bool
 
         :rtype: dict {'type': str, 'fq_name': FQName}
         :raises HttpError: uuid not found
         """
-        data = {
-            "uuid": uuid
-        }
-        result = self.post_json(self.make_url("/id-to-fqname"), data)
-        result['fq_name'] = FQName(result['fq_name'])
+        cached = self.resolve_cache.get_fq_name(uuid) if cache else None
+        if cached is not None:
+            result = {'type': cached[0], 'fq_name': cached[1]}
+        else:
+            data = {
+                "uuid": uuid
+            }
+            try:
+                result = self.post_json(self.make_url("/id-to-fqname"), data)
+            except HttpError as e:
+                if e.http_status == 404:
+                    self.resolve_cache.invalidate(uuid)
+                raise
+            result['fq_name'] = FQName(result['fq_name'])
+            self.resolve_cache.add(result['type'], result['fq_name'], uuid)
         if type is not None and not result['type'].replace('_', '-') == type:
             raise HttpError('uuid %s not found for type %s' % (uuid, type), http_status=404)
         return result
 
+    def fqnames_to_ids(self, fq_names, type, workers=50):
+        """
+        Return uuids for a list of fq_names of the same type
+
+        Cached resolutions are used first and the remaining
+        fq_names are resolved concurrently. fq_names that are
+        not found are not present in the result.
+
+        :param fq_names: resources fq names
+        :type fq_names: [FQName]
+        :param type: resource type
+        :type type: str
+        :param workers: max number of concurrent requests
+        :type workers: int
+
+        :rtype: {str: UUIDv4 str}
+        """
+        result = {}
+        missing = []
+        for fq_name in fq_names:
+            fq_name = FQName(fq_name)
+            uuid = self.resolve_cache.get_uuid(type, fq_name)
+            if uuid is None:
+                missing.append(fq_name)
+            else:
+                result[text_type(fq_name)] = uuid
+
+        def resolve(fq_name):
+            try:
+                return (fq_name, self.fqname_to_id(fq_name, type))
+            except HttpError as e:
+                if e.http_status == 404:
+                    return (fq_name, None)
+                raise
+
+        for fq_name, uuid in parallel_map(resolve, missing, workers=workers):
+            if uuid is not None:
+                result[text_type(fq_name)] = uuid
+        return result
+
+    def ids_to_fqnames(self, uuids, type, workers=50, chunk_size=100):
+        """
+        Return fq_names for a list of uuids of the same type
+
+        Cached resolutions are used first and the remaining
+        uuids are resolved with list requests on the type collection
+        filtered by uuids. uuids that are not found or that are
+        not of type `type` are not present in the result.
+
+        :param uuids: resources uuids
+        :type uuids: [UUIDv4 str]
+        :param type: resource type
+        :type type: str
+        :param workers: max number of concurrent requests
+        :type workers: int
+        :param chunk_size: max number of uuids per request
+        :type chunk_size: int
+
+        :rtype: {UUIDv4 str: FQName}
+        """
+        result = {}
+        missing = []
+        for uuid in uuids:
+            cached = self.resolve_cache.get_fq_name(uuid)
+            if cached is not None and cached[0].replace('_', '-') == type:
+                result[uuid] = cached[1]
+            else:
+                missing.append(uuid)
+        missing = list(OrderedDict.fromkeys(missing))
+        wanted = set(missing)
+        chunks = [missing[i:i + chunk_size]
+                  for i in range(0, len(missing), chunk_size)]
+        url = self.make_url('/%ss' % type)
+        for data in parallel_map(lambda c: self.get_json(url, obj_uuids=','.join(c)),
+                                 chunks, workers=workers):
+            for res in data.get('%ss' % type, []):
+                # old API servers may ignore the obj_uuids filter
+                if res['uuid'] not in wanted:
+                    continue
+                result[res['uuid']] = FQName(res['fq_name'])
+                self.resolve_cache.add(type, res['fq_name'], res['uuid'])
+        return result
+
     def add_ref(self, r1, r2, attr=None):
         self._ref_update(r1, r2, 'ADD', attr)
 
     def remove_ref(self, r1, r2):
         self._ref_update(r1, r2, 'DELETE')
 
+    def ref_updates(self, operations, workers=50):
+        """Run several ref-update operations concurrently
+
+        >>> errors = session.ref_updates([(vmi, sg, 'ADD', None) for vmi in vmis])
+
+        :param operations: list of (resource, ref, operation, attr),
+                           operation is ADD or DELETE
+        :type operations: [(Resource, Resource, str, dict)]
+        :param workers: max number of concurrent requests
+        :type workers: int
+
+        :rtype: [ClientException | None]
+        :returns: error of each operation, None when it succeeded
+        """
+        operations = list(operations)
+        errors = [None] * len(operations)
+
+        def update(item):
+            idx, (r1, r2, action, attr) = item
+            try:
+                self._ref_update(r1, r2, action, attr)
+            except ClientException as e:
+                errors[idx] = e
+
+        parallel_map(update, list(enumerate(operations)), workers=workers)
+        return errors
+
     def _ref_update(self, r1, r2, action, attr=None):
+        self.resource_cache.invalidate(r1.uuid)
+        self.resource_cache.invalidate(r2.uuid)
         data = {
             'type': r1.type,
             'uuid': r1.uuid,
@@ -220,7 +1554,11 @@ class ContrailAPISession(Session):
             'operation': action,
             'attr': attr
         }
-        return self.post_json(self.make_url("/ref-update"), data)
+        try:
+            return self.post_json(self.make_url("/ref-update"), data)
+        finally:
+            # the ref may have been updated even if the request failed
+            Resource.emit('ref_updated', (r1, r2))
 
     def search_kv_store(self, key):
         """Search for a key in the key-value store.
@@ -255,7 +1593,7 @@ class ContrailAPISession(Session):
             'key': key,
             'value': value
         }
-        return self.post(self.make_url("/useragent-kv"), data=to_json(data),
+        return self.post(self.make_url("/useragent-kv"), data=to_compact_json(data),
                          headers=self.default_headers).text
 
     def remove_kv_store(self, key):
@@ -267,5 +1605,27 @@ class ContrailAPISession(Session):
             'operation': 'DELETE',
             'key': key
         }
-        return self.post(self.make_url("/useragent-kv"), data=to_json(data),
+        return self.post(self.make_url("/useragent-kv"), data=to_compact_json(data),
                          headers=self.default_headers).text
+
+
+def invalidate_resource(resource):
+    """Drop resource from the caches of its session
+
+    The observer is registered once for the module instead of
+    once per session so that sessions are not kept alive by
+    the Resource observers.
+
+    :param resource: deleted resource
+    :type resource: Resource
+    """
+    try:
+        session = resource.session
+    except SessionNotInitialized:
+        return
+    if resource.uuid and isinstance(session, ContrailAPISession):
+        session.resolve_cache.invalidate(resource.uuid)
+        session.resource_cache.invalidate(resource.uuid)
+
+
+Resource.register('deleted', invalidate_resource)
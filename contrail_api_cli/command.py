@@ -12,7 +12,7 @@ from .resource import Resource
 from .resource import Collection, RootCollection
 from .schema import ResourceNotDefined
 from .utils import Path, classproperty, parallel_map
-from .exceptions import CommandError, NotFound
+from .exceptions import CommandError, NotFound, ResourceNotFound
 from .context import Context
 
 
@@ -92,8 +92,12 @@ def experimental(cls):
     return cls
 
 
+def _has_wildcard(path):
+    return any([c in text_type(path) for c in ('*', '?')])
+
+
 def _path_to_resources(path, predicate=None, filters=None, parent_uuid=None):
-    if any([c in text_type(path) for c in ('*', '?')]):
+    if _has_wildcard(path):
         if any([c in path.base for c in ('*', '?')]):
             col = RootCollection(fetch=True,
                                  filters=filters,
@@ -116,11 +120,11 @@ def _path_to_resources(path, predicate=None, filters=None, parent_uuid=None):
         else:
             kwargs = {'fq_name': path.name}
         try:
-            r = Resource(path.base,
-                         check=True,
-                         **kwargs)
+            r = Resource(path.base, **kwargs)
         except ResourceNotDefined as e:
             raise CommandError(text_type(e))
+        # paths are resolved with the session cache
+        r.check(cache=True)
         if predicate and not predicate(r):
             raise StopIteration
         yield r
@@ -133,6 +137,39 @@ def _path_to_resources(path, predicate=None, filters=None, parent_uuid=None):
         yield c
 
 
+def _paths_to_resources(type, paths, predicate=None):
+    """Resolve resource paths of the same type with bulk requests
+
+    :rtype: {Path: [Resource]}
+    """
+    try:
+        Context().schema.resource(type)
+    except ResourceNotDefined as e:
+        raise CommandError(text_type(e))
+    session = Context().session
+    fq_names = [p.name for p in paths if not p.is_uuid]
+    uuids = [p.name for p in paths if p.is_uuid]
+    uuids_by_fq_name = session.fqnames_to_ids(fq_names, type) if fq_names else {}
+    fq_names_by_uuid = session.ids_to_fqnames(uuids, type) if uuids else {}
+    result = {}
+    for path in paths:
+        if path.is_uuid:
+            r = Resource(type, uuid=path.name)
+            if path.name not in fq_names_by_uuid:
+                raise ResourceNotFound(resource=r)
+            r['fq_name'] = fq_names_by_uuid[path.name]
+        else:
+            r = Resource(type, fq_name=path.name)
+            if text_type(r.fq_name) not in uuids_by_fq_name:
+                raise ResourceNotFound(resource=r)
+            r['uuid'] = uuids_by_fq_name[text_type(r.fq_name)]
+        if predicate and not predicate(r):
+            result[path] = []
+        else:
+            result[path] = [r]
+    return result
+
+
 def expand_paths(paths=None, predicate=None, filters=None, parent_uuid=None):
     """Return an unique list of resources or collections from a list of paths.
     Supports fq_name and wilcards resolution.
@@ -157,15 +194,31 @@ def expand_paths(paths=None, predicate=None, filters=None, parent_uuid=None):
     else:
         paths = [Context().shell.current_path / res for res in paths]
 
+    # resource paths of the same type are resolved
+    # together to avoid one request per path
+    paths_by_type = OrderedDict()
+    for path in paths:
+        if path.is_resource and not _has_wildcard(path):
+            paths_by_type.setdefault(path.base, []).append(path)
+    resolved = {}
+    for type, type_paths in paths_by_type.items():
+        if len(type_paths) > 1:
+            resolved.update(_paths_to_resources(type, type_paths,
+                                                predicate=predicate))
+    unresolved = [p for p in paths if p not in resolved]
+    for path, res in zip(unresolved,
+                         parallel_map(_path_to_resources, unresolved,
+                                      kwargs={'predicate': predicate,
+                                              'filters': filters,
+                                              'parent_uuid': parent_uuid},
+                                      workers=50)):
+        resolved[path] = res
+
     # use a dict to have unique paths
     # but keep them ordered
     result = OrderedDict()
-    for res in parallel_map(_path_to_resources, paths,
-                            kwargs={'predicate': predicate,
-                                    'filters': filters,
-                                    'parent_uuid': parent_uuid},
-                            workers=50):
-        for r in res:
+    for path in paths:
+        for r in resolved[path]:
             result[r.path] = r
 
     resources = list(result.values())
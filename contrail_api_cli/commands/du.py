@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
+from collections import Counter
 
-from ..command import Command, Arg, expand_paths
-from ..resource import Collection
+from six import text_type
+
+from ..command import Command, Arg, Option, expand_paths
+from ..resource import Collection, RootCollection
 from ..exceptions import NotFound, CommandError
+from ..utils import parallel_map, format_table
 
 
 class Du(Command):
@@ -13,18 +17,132 @@ class Du(Command):
 
         admin@localhost:/> du virtual-network
         6
+
+    When several collections are counted, the count of each
+    collection is followed by its path. Collections are counted
+    concurrently, ``du /`` counts all the collections of the
+    API server:
+
+    .. code-block:: bash
+
+        admin@localhost:/> du /
+        1 access-control-list
+        6 virtual-network
+        [...]
+
+    Counts are cached for the session, ``--refresh`` counts
+    collections again on the API server.
+
+    With ``--group-by`` resources are counted by parent or by
+    values of a field. The field path may go through lists
+    and dicts (eg: ``virtual_network_refs.to``). Only the
+    needed field is fetched and resources are counted as they
+    are received. Groups are sorted by count, ``--top`` shows
+    the biggest groups only:
+
+    .. code-block:: bash
+
+        admin@localhost:/> du -g virtual_network_refs.to --top 2 instance-ip
+        120  default-domain:admin:net1
+        86   default-domain:admin:net2
+        admin@localhost:/> du -g parent virtual-machine-interface
+        250  default-domain:admin
+        12   default-domain:demo
+
+    Resources without value for the field are counted in the
+    ``_`` group.
+
+    Counting a large collection can time out on the API server.
+    With ``--page-size`` the collection is listed by pages instead
+    (contrail >= 4.0) and ``--limit`` stops counting at limit.
     """
     description = "Count number of resources"
     paths = Arg(nargs="*", help="Collections path(s)", complete='collections::path')
+    page_size = Option(type=int,
+                       help="count by listing collections by pages of page_size resources")
+    limit = Option(type=int,
+                   help="stop counting at limit")
+    refresh = Option(action="store_true", default=False,
+                     help="don't use counts cached during the session")
+    workers = Option('-w', type=int, default=50,
+                     help="number of collections counted concurrently (default: %(default)s)")
+    group_by = Option('-g', metavar='parent|field_path',
+                      help="count resources by parent or by values of a field "
+                           "(eg: virtual_network_refs.to)")
+    top = Option('-t', type=int,
+                 help="show the top N groups")
     aliases = ['count = du']
 
-    def __call__(self, paths=None):
+    def _count(self, collection, page_size=None, limit=None, refresh=False):
+        if limit is None and not (page_size and collection.paging_supported):
+            return collection.count(refresh=refresh)
+        return sum(1 for _ in collection.iter_fetch_data(page_size=page_size, limit=limit))
+
+    def _field_values(self, value, keys, key=None):
+        # fq_names are lists, other lists are
+        # flattened to count each value
+        if key in ('fq_name', 'to') and not keys:
+            yield ':'.join(value)
+        elif isinstance(value, list):
+            for item in value:
+                for v in self._field_values(item, keys, key=key):
+                    yield v
+        elif not keys:
+            yield text_type(value)
+        elif isinstance(value, dict) and keys[0] in value:
+            for v in self._field_values(value[keys[0]], keys[1:], key=keys[0]):
+                yield v
+
+    def _group_count(self, collection, group_by, page_size=None, limit=None):
+        if group_by == 'parent':
+            fields = []
+            keys = ['fq_name']
+        else:
+            keys = group_by.split('.')
+            fields = [keys[0]]
+        groups = Counter()
+        for data in collection.iter_fetch_data(fields=fields, page_size=page_size,
+                                               limit=limit):
+            if group_by == 'parent':
+                values = [':'.join(data['fq_name'][:-1])]
+            else:
+                values = set(self._field_values(data, keys))
+            for value in values or ['_']:
+                groups[value or '_'] += 1
+        return groups
+
+    def _format_groups(self, collections, groups, top=None):
+        rows = []
+        for c, counts in zip(collections, groups):
+            path = [self.current_path(c)] if len(collections) > 1 else []
+            counts = sorted(counts.items(), key=lambda g: (-g[1], g[0]))[:top]
+            rows += [[count] + path + [value] for value, count in counts]
+        return format_table(rows)
+
+    def __call__(self, paths=None, page_size=None, limit=None, refresh=False, workers=50,
+                 group_by=None, top=None):
         try:
             collections = expand_paths(paths,
                                        predicate=lambda r: isinstance(r, Collection))
         except NotFound:
             raise CommandError("No collection to count")
-        result = []
-        for c in collections:
-            result.append(str(len(c)))
-        return "\n".join(result)
+        # count all collections of the root
+        collections = [col
+                       for c in collections
+                       for col in (RootCollection(fetch=True) if not c.type else [c])]
+        if group_by is not None:
+            groups = parallel_map(self._group_count, collections,
+                                  kwargs={'group_by': group_by,
+                                          'page_size': page_size,
+                                          'limit': limit},
+                                  workers=workers)
+            return self._format_groups(collections, groups, top=top)
+        counts = parallel_map(self._count, collections,
+                              kwargs={'page_size': page_size,
+                                      'limit': limit,
+                                      'refresh': refresh},
+                              workers=workers)
+        if len(collections) == 1:
+            return str(counts[0])
+        return "\n".join("%d %s" % (count, self.current_path(c))
+                         for c, count in zip(collections, counts))
@@ -10,6 +10,10 @@ from ..schema import require_schema
 class Ln(Command):
     """Add or remove a reference link between two resources.
 
+    The first path can match several resources (wildcards or fq_name).
+    In this case all of them are linked with the second resource,
+    links are updated concurrently (see ``-w``).
+
     .. code-block:: bash
 
         admin@localhost:/> tree -r /virtual-machine/8cfbddcf-6b55-4cdf-abcb-14eed68e4da7
@@ -37,25 +41,32 @@ class Ln(Command):
                     complete='resources::path')
     remove = Option('-r', help='remove link',
                     action='store_true', default=False)
+    workers = Option('-w', help='number of concurrent link updates (default: %(default)s)',
+                     type=int, default=50)
 
     @require_schema()
-    def __call__(self, resources=None, remove=None, schema_version=None):
-        for idx, r in enumerate(resources):
-            resources[idx] = expand_paths([r],
-                                          predicate=lambda r: isinstance(r, Resource))[0]
-
-        res1, res2 = resources
+    def __call__(self, resources=None, remove=None, workers=None, schema_version=None):
+        # the first path may match several resources (wildcards),
+        # all of them are linked with the second resource
+        sources = expand_paths([resources[0]],
+                               predicate=lambda r: isinstance(r, Resource))
+        target = expand_paths([resources[1]],
+                              predicate=lambda r: isinstance(r, Resource))[0]
+        action = 'DELETE' if remove else 'ADD'
 
-        if res2.type in res1.schema.refs:
-            if remove:
-                res1.remove_ref(res2)
+        operations = []
+        for res in sources:
+            if target.type in res.schema.refs:
+                operations.append((res, target, action, None))
+            elif target.type in res.schema.back_refs:
+                operations.append((target, res, action, None))
             else:
-                res1.add_ref(res2)
-        elif res2.type in res1.schema.back_refs:
-            if remove:
-                res1.remove_back_ref(res2)
-            else:
-                res1.add_back_ref(res2)
-        else:
-            raise CommandError("Can't link %s with %s" % (self.current_path(res1),
-                                                          self.current_path(res2)))
+                raise CommandError("Can't link %s with %s" % (self.current_path(res),
+                                                              self.current_path(target)))
+
+        errors = target.session.ref_updates(operations, workers=workers)
+        failed = ["%s -> %s: %s" % (self.current_path(r1), self.current_path(r2), e)
+                  for (r1, r2, _, _), e in zip(operations, errors) if e is not None]
+        if failed:
+            raise CommandError("Failed to update %d links:\n%s" %
+                               (len(failed), "\n".join(failed)))
@@ -54,6 +54,10 @@ class Ls(Command):
         # filter by attribute
         admin@localhost:/> ls -l -f instance_ip_address=192.168.20.1 instance-ip
         instance-ip/f9d25887-2765-4ba0-bf45-54b9dbc5874a  f9d25887-2765-4ba0-bf45-54b9dbc5874a
+
+        # fetch by pages of 500 resources (contrail >= 4.0)
+        # and stop after 1000 resources
+        admin@localhost:/> ls --page-size 500 --limit 1000 virtual-machine-interface
     """
     description = "List resource objects"
     paths = Arg(nargs="*", help="Resource path(s)",
@@ -72,6 +76,10 @@ class Ls(Command):
                     metavar='field_name=field_value')
     parent_uuid = Option('-P', help="filter by parent uuid",
                          complete="resources::uuid")
+    page_size = Option(type=int,
+                       help="fetch collections by pages of page_size resources")
+    limit = Option(type=int,
+                   help="list at most limit resources")
     # fields to show in -l mode when no
     # column is specified
     default_fields = [u'fq_name']
@@ -118,7 +126,7 @@ class Ls(Command):
         return (name, value)
 
     def __call__(self, paths=None, long=False, fields=None,
-                 filters=None, parent_uuid=None):
+                 filters=None, parent_uuid=None, page_size=None, limit=None):
         if not long:
             fields = []
         elif not fields:
@@ -129,8 +137,11 @@ class Ls(Command):
                                  parent_uuid=parent_uuid)
         result = []
         for r in resources:
+            if limit is not None and len(result) >= limit:
+                break
             if isinstance(r, Collection):
-                r.fetch(fields=fields)
+                r.fetch(fields=fields, page_size=page_size,
+                        limit=None if limit is None else limit - len(result))
                 result += r.data
             elif isinstance(r, Resource):
                 # need to fetch the resource to get needed fields
@@ -15,7 +15,8 @@ from prompt_toolkit import prompt
 from prompt_toolkit.history import FileHistory
 from prompt_toolkit.key_binding.manager import KeyBindingManager
 
-from ..resource import RootCollection
+from ..resource import RootCollection, ResourceCache
+from ..index import CompletionIndex
 from ..completer import ShellCompleter
 from ..exceptions import CommandError, CommandNotFound, \
     NotFound, Exists
@@ -100,6 +101,12 @@ class Shell(Command):
         def _ra(event):
             _(event, res_aliases, '/')
 
+        # resources seen in previous sessions are completed
+        # from the index of the API server
+        index = CompletionIndex(os.path.join(CONFIG_DIR, 'completion-%s-%s.db' %
+                                             (Context().session.host, Context().session.port)))
+        ResourceCache().index = index
+
         while True:
             try:
                 action = prompt(get_prompt_tokens=get_prompt_tokens,
@@ -150,6 +157,9 @@ class Shell(Command):
                 else:
                     printo(result)
 
+        ResourceCache().index = None
+        index.close()
+
 
 class Cd(Command):
     """Change current context.
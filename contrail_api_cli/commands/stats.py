@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from ..command import Command, Option
+from ..context import Context
+from ..resource import ResourceCache, CountCache
+
+
+class Stats(Command):
+    """Show statistics of the API requests made since the
+    beginning of the session.
+
+    .. code-block:: bash
+
+        admin@localhost:/> du virtual-network
+        12
+        admin@localhost:/> stats
+        endpoint                 count  errors  p50   p95   p99   received  decoded  status
+        GET /virtual-networks    1      0       25.4  25.4  25.4  1087      1087     200:1
+        GET /                    1      0       12.8  12.8  12.8  8803      8803     200:1
+
+        requests: 2, retried: 0, coalesced: 0
+        bytes received: 9890, decoded: 9890
+        resolve cache: 0 hits, 0 misses
+        concurrency limit: 10, throttled 0 times
+        completion cache: 3 items, 6 keys, 0 hits, 0 misses, 0 evictions
+        count cache: 1 counts, 0 hits, 1 misses
+
+    Latencies are in milliseconds. The same summary (without
+    the completion and count cache lines) is printed on stderr after any
+    command when the ``--stats`` option is given to
+    ``contrail-api-cli``.
+    """
+    description = "Show API requests statistics"
+    reset = Option('-r', action="store_true", default=False,
+                   help="reset statistics")
+
+    def __call__(self, reset=False):
+        session = Context().session
+        cache = ResourceCache()
+        counts = CountCache()
+        if reset:
+            session.reset_stats()
+            cache.reset_stats()
+            counts.reset_stats()
+            return
+        return '\n'.join([
+            session.format_stats(),
+            'completion cache: %(size)d items, %(keys)d keys, %(hits)d hits, '
+            '%(misses)d misses, %(evictions)d evictions' % cache.stats,
+            'count cache: %(size)d counts, %(hits)d hits, %(misses)d misses' % counts.stats
+        ])
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import sys
+
+from ..command import Command, Option
+from ..context import Context
+from ..schema import require_schema
+from ..topology import generate, default_topology, write_ndjson
+
+
+class Topology(Command):
+    """Generate a synthetic configuration for scale tests.
+
+    The generated resources are consistent with the schema: each
+    project gets a network-ipam, security-groups and virtual-networks,
+    each virtual-network gets virtual-machine-interfaces with an
+    instance-ip. With the default options the number of generated
+    resources is::
+
+        1 + projects * (2 + security_groups + networks * (1 + 2 * interfaces))
+
+    Resources are written with one JSON document per line and can
+    be served by a local fake API server:
+
+    .. code-block:: bash
+
+        $ contrail-api-cli --schema-version 3.2 topology --projects 1000 -o topology.json
+        109001 resources generated
+        $ contrail-api-cli --schema-version 3.2 --fake-server topology.json ls project | wc -l
+        1000
+    """
+    description = "Generate a synthetic configuration"
+    projects = Option(type=int, default=10,
+                      help="number of projects (default: %(default)s)")
+    networks = Option(type=int, default=5,
+                      help="number of virtual-networks per project (default: %(default)s)")
+    interfaces = Option(type=int, default=10,
+                        help="number of virtual-machine-interfaces per "
+                             "virtual-network (default: %(default)s)")
+    security_groups = Option(type=int, default=2,
+                             help="number of security-groups per project (default: %(default)s)")
+    seed = Option(type=int, default=0,
+                  help="random generator seed (default: %(default)s)")
+    output = Option('-o', help="output file (default: stdout)")
+
+    @require_schema()
+    def __call__(self, projects=10, networks=5, interfaces=10, security_groups=2,
+                 seed=0, output=None):
+        levels = default_topology(projects=projects, networks=networks,
+                                  interfaces=interfaces, security_groups=security_groups)
+        resources = generate(Context().schema, levels, seed=seed)
+        if output is None:
+            write_ndjson(resources, sys.stdout)
+            return
+        with io.open(output, 'w', encoding='utf-8') as f:
+            count = write_ndjson(resources, f)
+        return '%d resources generated' % count
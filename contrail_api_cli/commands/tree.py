@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from collections import OrderedDict
+
 from ..command import Command, Arg, Option, expand_paths
 from ..resource import Resource
-from ..utils import format_tree, parallel_map, Path
-from ..exceptions import ResourceMissing
+from ..context import Context
+from ..utils import format_tree, parallel_map
 
 
 class Tree(Command):
@@ -37,6 +39,15 @@ class Tree(Command):
             │       └── domain/ff62f8f7-cccd-4a30-ba32-2ee3764fac79  default-domain
             └── project/0ed483e0-83ef-4f70-8250-1fcfa5d98c0e         default-domain:project
                 └── domain/ff62f8f7-cccd-4a30-ba32-2ee3764fac79      default-domain
+
+    The tree is walked level by level. Links of all the resources
+    of a level are found with list requests per resource type:
+    back_refs and children are listed with the ``back_ref_id``
+    and ``parent_id`` filters, refs and parents by listing the
+    resources of the level with their refs. Links of each resource
+    are requested once but a resource linked several times is
+    expanded under each resource linking to it. ``--depth`` limits
+    the number of levels of the tree.
     """
     description = "Tree of resource references"
     paths = Arg(nargs="*", help="Resource path(s)",
@@ -44,47 +55,153 @@ class Tree(Command):
     reverse = Option('-r',
                      help="Show tree of refs / parents",
                      action="store_true", default=False)
+    depth = Option('-d', type=int,
+                   help="max depth of the tree")
+    workers = Option('-w', type=int, default=50,
+                     help="number of concurrent requests (default: %(default)s)")
+    # max number of uuids in a list request
+    chunk_size = 100
+
+    def _chunks(self, uuids):
+        return [uuids[i:i + self.chunk_size]
+                for i in range(0, len(uuids), self.chunk_size)]
+
+    def _list(self, request):
+        type, _, params, _ = request
+        session = Context().session
+        data = session.get_json(session.make_url('/%ss' % type), **params)
+        return data.get('%ss' % type, [])
+
+    def _requests(self, level):
+        """Return list requests finding links of the resources
+        of a level
+
+        :param level: resources by type
+        :type level: {str: [Resource]}
+
+        :rtype: [(type, link type, params, types of the level)]
+        """
+        schema = Context().schema
+        requests = []
+        if self.reverse:
+            for type, resources in level.items():
+                fields = ['%s_refs' % t.replace('-', '_') for t in schema.resource(type).refs]
+                fields += ['parent_type', 'parent_uuid']
+                requests += [(type, 'refs', {'obj_uuids': ','.join(uuids),
+                                             'fields': ','.join(fields)}, [type])
+                             for uuids in self._chunks([r.uuid for r in resources])]
+            return requests
+        # linked type -> types of the level
+        back_refs = OrderedDict()
+        children = OrderedDict()
+        for type in level:
+            for t in schema.resource(type).back_refs:
+                back_refs.setdefault(t, []).append(type)
+            for t in schema.resource(type).children:
+                children.setdefault(t, []).append(type)
+        for t, types in back_refs.items():
+            # refs are needed to find which resources are referenced
+            fields = ','.join('%s_refs' % type.replace('-', '_') for type in types)
+            uuids = [r.uuid for type in types for r in level[type]]
+            requests += [(t, 'back_refs', {'back_ref_id': ','.join(chunk),
+                                           'fields': fields}, types)
+                         for chunk in self._chunks(uuids)]
+        for t, types in children.items():
+            uuids = [r.uuid for type in types for r in level[type]]
+            requests += [(t, 'children', {'parent_id': ','.join(chunk),
+                                          'fields': 'parent_uuid'}, types)
+                         for chunk in self._chunks(uuids)]
+        return requests
+
+    def _links(self, level):
+        """Return links of the resources of a level
+
+        :param level: resources by type
+        :type level: {str: [Resource]}
+
+        :rtype: {UUIDv4 str: [(type, uuid, fq_name)]}
+        """
+        schema = Context().schema
+        links = OrderedDict((r.uuid, []) for resources in level.values() for r in resources)
+        requests = self._requests(level)
+        results = parallel_map(self._list, requests, workers=self.workers)
+        for (type, link_type, params, types), result in zip(requests, results):
+            for data in result:
+                if link_type == 'refs':
+                    if data['uuid'] not in links:
+                        continue
+                    for t in schema.resource(type).refs:
+                        links[data['uuid']] += [(t, ref['uuid'], ref['to'])
+                                                for ref in data.get('%s_refs' % t.replace('-', '_'), [])]
+                    if data.get('parent_type', 'config-root') != 'config-root':
+                        links[data['uuid']].append((data['parent_type'], data['parent_uuid'],
+                                                    data['fq_name'][:-1]))
+                    continue
+                if link_type == 'back_refs':
+                    uuids = [ref['uuid']
+                             for t in types
+                             for ref in data.get('%s_refs' % t.replace('-', '_'), [])]
+                else:
+                    uuids = [data.get('parent_uuid')]
+                for uuid in uuids:
+                    if uuid in links:
+                        links[uuid].append((type, data['uuid'], data['fq_name']))
+        return links
+
+    def _walk(self, roots):
+        """Find links of resources level by level from roots
+
+        :rtype: {UUIDv4 str: [Resource]}
+        """
+        # uuid -> Resource of all found resources
+        found = OrderedDict((r.uuid, r) for r in roots)
+        # uuid -> minimum depth at which the resource was found,
+        # a resource is expanded if it is above the depth limit
+        # in the tree of any root
+        depths = dict((r.uuid, 0) for r in roots)
+        links = {}
+        level = list(found.values())
+        depth = 0
+        while level and (self.depth is None or depth < self.depth):
+            by_type = OrderedDict()
+            for r in level:
+                by_type.setdefault(r.type, []).append(r)
+            level = []
+            for uuid, linked in self._links(by_type).items():
+                links[uuid] = OrderedDict()
+                for type, u, fq_name in linked:
+                    if u not in found:
+                        found[u] = Resource(type, uuid=u, fq_name=fq_name)
+                    if depths.get(u, depth + 2) > depth + 1:
+                        depths[u] = depth + 1
+                        level.append(found[u])
+                    links[uuid][u] = found[u]
+                links[uuid] = list(links[uuid].values())
+            depth += 1
+        return links
 
-    def _create_tree(self, resource, parent_path):
-        if resource.uuid not in self._cache:
-            self._cache[resource.uuid] = resource.fetch()
-        else:
-            resource = self._cache[resource.uuid]
+    def _create_tree(self, resource, links, ancestors=(), depth=0):
         tree = {
             'node': [str(self.current_path(resource)),
                      str(resource.fq_name)],
             'childs': []
         }
-        if not self.reverse:
-            childs = list(resource.back_refs) + list(resource.children)
-        else:
-            try:
-                parents = [resource.parent]
-            except ResourceMissing:
-                parents = []
-            childs = list(resource.refs) + parents
-        # avoid parent -> child -> parent and parent -> parent loops
-        for idx, child in enumerate(childs[:]):
-            if (child.path == parent_path or
-                    child.path == resource.path):
-                node = {
-                    'node': [str(self.current_path(child)),
-                             str(child.fq_name)]
-                }
-                tree['childs'].append(node)
-                del childs[idx]
-        if childs:
-            tree['childs'] += parallel_map(self._create_tree, childs,
-                                           args=(resource.path,))
+        # avoid loops
+        if resource.uuid in ancestors:
+            return tree
+        if self.depth is not None and depth >= self.depth:
+            return tree
+        ancestors += (resource.uuid,)
+        tree['childs'] = [self._create_tree(child, links, ancestors, depth + 1)
+                          for child in links.get(resource.uuid, [])]
         return tree
 
-    def __call__(self, paths=None, reverse=False):
+    def __call__(self, paths=None, reverse=False, depth=None, workers=50):
         resources = expand_paths(paths,
                                  predicate=lambda r: isinstance(r, Resource))
-        self._cache = {}
         self.reverse = reverse
-        trees = parallel_map(self._create_tree,
-                             resources,
-                             args=(Path('/'),),
-                             workers=50)
-        return '\n'.join([format_tree(tree) for tree in trees])
+        self.depth = depth
+        self.workers = workers
+        links = self._walk(resources)
+        return '\n'.join([format_tree(self._create_tree(r, links))
+                          for r in resources])
@@ -87,3 +87,20 @@ class IsSystemResource(Exists):
 
     def __str__(self):
         return "System resources %s cannot be changed" % self._paths
+
+
+class RefUpdateError(Exception):
+    """Some operations of a bulk ref-update failed
+
+    :param errors: failed operations
+    :type errors: [(Resource, Resource, ClientException)]
+    """
+
+    def __init__(self, errors):
+        super(RefUpdateError, self).__init__()
+        self.errors = errors
+
+    def __str__(self):
+        return "%d ref updates failed:\n%s" % (
+            len(self.errors),
+            "\n".join(["%s -> %s: %s" % (r1.path, r2.path, e) for r1, r2, e in self.errors]))
@@ -0,0 +1,490 @@
+from __future__ import unicode_literals
+
+import io
+import re
+import uuid as uuid_lib
+from datetime import datetime
+from collections import OrderedDict, Counter
+
+import gevent
+import requests
+from requests.packages.urllib3.response import HTTPResponse
+from six import text_type, binary_type
+from six.moves import http_client
+from six.moves.urllib.parse import urlsplit, parse_qsl
+
+from .utils import to_compact_json, from_json
+
+
+FILTER_RE = re.compile(r',(?=[\w-]+==)')
+
+
+def type_to_attr(type):
+    return type.replace('-', '_')
+
+
+def attr_to_type(attr):
+    return attr.replace('_', '-')
+
+
+def is_refs_attr(attr):
+    return attr.endswith('_refs') and not attr.endswith('_back_refs')
+
+
+def is_true(value):
+    return text_type(value).lower() in ('true', '1')
+
+
+class FakeAPIError(Exception):
+
+    def __init__(self, status, message):
+        super(FakeAPIError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+class FakeAPIServer(object):
+    """In-memory implementation of the API server endpoints
+    used by the cli
+
+    Supported endpoints:
+
+    * ``GET /``
+    * ``GET /<type>s`` with ``detail``, ``fields``, ``filters``,
+      ``parent_id``, ``back_ref_id``, ``obj_uuids``, ``count``,
+      ``page_limit`` and ``page_marker``
+    * ``POST /<type>s``
+    * ``GET``, ``PUT`` and ``DELETE /<type>/<uuid>``
+    * ``POST /fqname-to-id``, ``/id-to-fqname``, ``/ref-update``
+      and ``/useragent-kv``
+
+    Resources are stored with their refs. back_refs and children
+    are computed from indexes when resources are returned.
+
+    >>> server = FakeAPIServer(types=['project', 'virtual-network'])
+    >>> project = server.create('project', {'fq_name': ['default-domain', 'admin']})
+    >>> session = ContrailAPISession(adapter=FakeAPIAdapter(server))
+
+    :param types: resource types listed by ``GET /`` in addition
+                  to the types of stored resources
+    :type types: [str]
+    :param base_uri: API server base uri
+    :type base_uri: str
+    """
+
+    def __init__(self, types=None, base_uri=''):
+        self.base_uri = base_uri
+        # updated with the url of each request
+        self.base_url = 'http://localhost:8082' + base_uri
+        # type -> {uuid: resource}
+        self.resources = OrderedDict((t, OrderedDict()) for t in types or [])
+        # uuid -> type
+        self.types = {}
+        # (type, fq_name) -> uuid
+        self.fq_names = {}
+        # fq_name -> uuid, to find parents
+        self.paths = {}
+        # parent uuid -> {child uuid: None}
+        self.children = {}
+        # ref uuid -> {uuid: None}
+        self.back_refs = {}
+        self.kv_store = OrderedDict()
+        self.requests = Counter()
+
+    def __len__(self):
+        return len(self.types)
+
+    def _now(self):
+        return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+    def _get(self, uuid, type=None):
+        if uuid not in self.types or (type is not None and self.types[uuid] != type):
+            raise FakeAPIError(404, 'UUID %s not found' % uuid)
+        return self.resources[self.types[uuid]][uuid]
+
+    def _resolve(self, type, fq_name):
+        try:
+            return self.fq_names[(type, tuple(fq_name))]
+        except KeyError:
+            raise FakeAPIError(404, 'Name %s not found' % ':'.join(fq_name))
+
+    def _set_refs(self, uuid, attr, refs):
+        ref_type = attr_to_type(attr[:-len('_refs')])
+        resource = self._get(uuid)
+        for ref in resource.get(attr, []):
+            self.back_refs.get(ref['uuid'], {}).pop(uuid, None)
+        links = []
+        for ref in refs or []:
+            if ref.get('uuid'):
+                self._get(ref['uuid'], ref_type)
+                ref_uuid = ref['uuid']
+            else:
+                ref_uuid = self._resolve(ref_type, ref['to'])
+            link = {'to': list(self._get(ref_uuid)['fq_name']), 'uuid': ref_uuid}
+            if ref.get('attr') is not None:
+                link['attr'] = ref['attr']
+            links.append(link)
+            self.back_refs.setdefault(ref_uuid, OrderedDict())[uuid] = None
+        if links:
+            resource[attr] = links
+        else:
+            resource.pop(attr, None)
+
+    def _is_link(self, key, value):
+        if key.endswith('_refs'):
+            return True
+        # children lists sent back by clients
+        return isinstance(value, list) and len(value) > 0 and \
+            all(isinstance(v, dict) and 'to' in v and 'uuid' in v for v in value)
+
+    def create(self, type, data):
+        """Store a new resource
+
+        The parent is found with the fq_name if ``parent_uuid``
+        is not provided. Refs can be given by uuid or fq_name.
+
+        :param type: resource type
+        :type type: str
+        :param data: resource properties and refs, ``fq_name``
+                     is required
+        :type data: dict
+
+        :rtype: dict
+        :raises FakeAPIError: bad data or fq_name already used
+        """
+        if 'fq_name' not in data:
+            raise FakeAPIError(400, 'fq_name is required to create a %s' % type)
+        fq_name = list(data['fq_name'])
+        if (type, tuple(fq_name)) in self.fq_names:
+            raise FakeAPIError(409, 'Fq_name %s already exists with uuid %s' %
+                               (fq_name, self.fq_names[(type, tuple(fq_name))]))
+        uuid = data.get('uuid') or text_type(uuid_lib.uuid4())
+        if uuid in self.types:
+            raise FakeAPIError(409, 'UUID %s already exists' % uuid)
+        parent_uuid = data.get('parent_uuid')
+        if parent_uuid is not None:
+            parent = self._get(parent_uuid)
+            if parent['fq_name'] != fq_name[:-1]:
+                raise FakeAPIError(400, 'Bad parent %s for %s' % (parent_uuid, fq_name))
+        elif len(fq_name) > 1:
+            try:
+                parent_uuid = self.paths[tuple(fq_name[:-1])]
+            except KeyError:
+                raise FakeAPIError(404, 'Parent %s not found' % ':'.join(fq_name[:-1]))
+        now = self._now()
+        resource = dict((k, v) for k, v in data.items()
+                        if not self._is_link(k, v) and k not in ('href', 'parent_href'))
+        resource.update({
+            'uuid': uuid,
+            'fq_name': fq_name,
+            'name': fq_name[-1],
+            'display_name': data.get('display_name', fq_name[-1]),
+            'id_perms': dict(data.get('id_perms') or {}, created=now, last_modified=now,
+                             enable=True, user_visible=True),
+        })
+        if parent_uuid is not None:
+            resource['parent_uuid'] = parent_uuid
+            resource['parent_type'] = self.types[parent_uuid]
+            self.children.setdefault(parent_uuid, OrderedDict())[uuid] = None
+        self.resources.setdefault(type, OrderedDict())[uuid] = resource
+        self.types[uuid] = type
+        self.fq_names[(type, tuple(fq_name))] = uuid
+        self.paths.setdefault(tuple(fq_name), uuid)
+        try:
+            for attr, refs in data.items():
+                if is_refs_attr(attr):
+                    self._set_refs(uuid, attr, refs)
+        except FakeAPIError:
+            self.delete(uuid)
+            raise
+        return resource
+
+    def update(self, uuid, data):
+        """Update properties and refs of a resource
+
+        :param uuid: resource uuid
+        :type uuid: str
+        :param data: properties to update
+        :type data: dict
+
+        :rtype: dict
+        """
+        resource = self._get(uuid)
+        for key, value in data.items():
+            if key in ('uuid', 'fq_name', 'name', 'parent_uuid', 'parent_type',
+                       'id_perms', 'href', 'parent_href'):
+                continue
+            if is_refs_attr(key):
+                self._set_refs(uuid, key, value)
+            elif not self._is_link(key, value):
+                resource[key] = value
+        resource['id_perms'] = dict(resource['id_perms'], last_modified=self._now())
+        return resource
+
+    def delete(self, uuid):
+        """Delete a resource
+
+        :raises FakeAPIError: the resource has children or back_refs
+        """
+        resource = self._get(uuid)
+        if self.children.get(uuid):
+            raise FakeAPIError(409, 'Delete when children still present: %s' %
+                               self._hrefs(self.children[uuid]))
+        if self.back_refs.get(uuid):
+            raise FakeAPIError(409, 'Delete when resource still referred: %s' %
+                               self._hrefs(self.back_refs[uuid]))
+        for key in list(resource.keys()):
+            if is_refs_attr(key):
+                self._set_refs(uuid, key, [])
+        type = self.types.pop(uuid)
+        del self.resources[type][uuid]
+        del self.fq_names[(type, tuple(resource['fq_name']))]
+        if self.paths.get(tuple(resource['fq_name'])) == uuid:
+            del self.paths[tuple(resource['fq_name'])]
+        self.children.pop(uuid, None)
+        self.back_refs.pop(uuid, None)
+        if 'parent_uuid' in resource:
+            self.children[resource['parent_uuid']].pop(uuid, None)
+
+    def _href(self, type, uuid):
+        return '%s/%s/%s' % (self.base_url, type, uuid)
+
+    def _hrefs(self, uuids):
+        return '[%s]' % ', '.join("'%s'" % self._href(self.types[u], u) for u in uuids)
+
+    def _links(self, uuids, attr_format, resource_uuid=None):
+        links = OrderedDict()
+        for uuid in uuids:
+            type = self.types[uuid]
+            resource = self.resources[type][uuid]
+            link = {'to': resource['fq_name'], 'uuid': uuid, 'href': self._href(type, uuid)}
+            if resource_uuid is not None:
+                for ref in resource.get('%s_refs' % type_to_attr(self.types[resource_uuid]), []):
+                    if ref['uuid'] == resource_uuid and 'attr' in ref:
+                        link['attr'] = ref['attr']
+            links.setdefault(attr_format % type_to_attr(type), []).append(link)
+        return links
+
+    def view(self, uuid, children=True, back_refs=True):
+        """Return the representation of a resource
+        as returned by the API
+
+        :rtype: dict
+        """
+        resource = self._get(uuid)
+        data = dict(resource)
+        data['href'] = self._href(self.types[uuid], uuid)
+        if 'parent_uuid' in data:
+            data['parent_href'] = self._href(data['parent_type'], data['parent_uuid'])
+        for key, refs in resource.items():
+            if is_refs_attr(key):
+                type = attr_to_type(key[:-len('_refs')])
+                data[key] = [dict(ref, href=self._href(type, ref['uuid'])) for ref in refs]
+        if children:
+            data.update(self._links(self.children.get(uuid, []), '%ss'))
+        if back_refs:
+            data.update(self._links(self.back_refs.get(uuid, []), '%s_back_refs',
+                                    resource_uuid=uuid))
+        return data
+
+    def _uuids_param(self, params, name):
+        if name not in params:
+            return None
+        return [u for u in params[name].split(',') if u]
+
+    def _list(self, type, params):
+        if type not in self.resources:
+            raise FakeAPIError(404, 'Collection %ss not found' % type)
+        resources = self.resources[type]
+        candidates = None
+        for name, index in (('obj_uuids', None),
+                            ('parent_id', self.children),
+                            ('back_ref_id', self.back_refs)):
+            uuids = self._uuids_param(params, name)
+            if uuids is None:
+                continue
+            if index is not None:
+                uuids = [u for uuid in uuids for u in index.get(uuid, [])]
+            uuids = OrderedDict((u, None) for u in uuids if u in resources)
+            if candidates is not None:
+                uuids = OrderedDict((u, None) for u in candidates if u in uuids)
+            candidates = uuids
+        if candidates is None:
+            candidates = resources
+        filters = {}
+        for f in FILTER_RE.split(params.get('filters', '')):
+            if f:
+                name, value = f.split('==', 1)
+                filters.setdefault(name, []).append(from_json(value))
+        uuids = [u for u in candidates
+                 if all(resources[u].get(n) in values for n, values in filters.items())]
+        collection = '%ss' % type
+        if is_true(params.get('count', False)):
+            return {collection: {'count': len(uuids)}}
+        page = None
+        if 'page_limit' in params:
+            # the marker is the uuid of the last resource
+            # of the previous page
+            marker = params.get('page_marker')
+            start = uuids.index(marker) + 1 if marker in uuids else 0
+            end = start + int(params['page_limit'])
+            page = {'marker': uuids[end - 1] if end < len(uuids) else None}
+            uuids = uuids[start:end]
+        if is_true(params.get('detail', False)):
+            result = [{type: self.view(u, children=False, back_refs=False)}
+                      for u in uuids]
+            return dict(page or {}, **{collection: result})
+        fields = [f for f in params.get('fields', '').split(',') if f]
+        result = []
+        for uuid in uuids:
+            resource = resources[uuid]
+            data = {'uuid': uuid,
+                    'fq_name': resource['fq_name'],
+                    'href': self._href(type, uuid)}
+            if fields:
+                view = self.view(uuid,
+                                 children=any(not is_refs_attr(f) for f in fields),
+                                 back_refs=any(f.endswith('_back_refs') for f in fields))
+                data.update((f, view[f]) for f in fields if f in view)
+            result.append(data)
+        return dict(page or {}, **{collection: result})
+
+    def _root(self):
+        return {'href': self.base_url,
+                'links': [{'link': {'href': '%s/%ss' % (self.base_url, type),
+                                    'name': type,
+                                    'rel': 'collection'}}
+                          for type in self.resources]}
+
+    def _ref_update(self, data):
+        uuid = data['uuid']
+        resource = self._get(uuid, data['type'])
+        ref_type = data['ref-type']
+        ref_uuid = data.get('ref-uuid') or self._resolve(ref_type, data['ref-fq-name'])
+        self._get(ref_uuid, ref_type)
+        attr = '%s_refs' % type_to_attr(ref_type)
+        refs = [r for r in resource.get(attr, []) if r['uuid'] != ref_uuid]
+        if data['operation'] == 'ADD':
+            refs.append({'uuid': ref_uuid, 'attr': data.get('attr')})
+        elif data['operation'] != 'DELETE':
+            raise FakeAPIError(400, 'Bad operation %s' % data['operation'])
+        self._set_refs(uuid, attr, refs)
+        resource['id_perms'] = dict(resource['id_perms'], last_modified=self._now())
+        return {'uuid': uuid}
+
+    def _kv(self, data):
+        key = data.get('key')
+        if data['operation'] == 'STORE':
+            self.kv_store[key] = data['value']
+        elif data['operation'] == 'DELETE':
+            self.kv_store.pop(key, None)
+        elif data['operation'] == 'RETRIEVE':
+            if key is None:
+                return {'value': [{'key': k, 'value': v} for k, v in self.kv_store.items()]}
+            if key not in self.kv_store:
+                raise FakeAPIError(404, 'Unknown User-Agent key %s' % key)
+            return {'value': self.kv_store[key]}
+        else:
+            raise FakeAPIError(404, 'Invalid Operation %s' % data['operation'])
+
+    def handle(self, method, url, body=None):
+        """Handle an API request
+
+        :param method: HTTP method
+        :type method: str
+        :param url: request url
+        :type url: str
+        :param body: JSON request body
+        :type body: bytes | str | None
+
+        :returns: HTTP status and response data
+        :rtype: (int, dict | str | None)
+        """
+        scheme, netloc, path, query, _ = urlsplit(url)
+        self.base_url = '%s://%s%s' % (scheme, netloc, self.base_uri)
+        path = path[len(self.base_uri):].strip('/')
+        params = dict(parse_qsl(query, keep_blank_values=True))
+        if isinstance(body, binary_type):
+            body = body.decode('utf-8')
+        data = from_json(body) if body else {}
+        parts = path.split('/') if path else []
+        self.requests[method] += 1
+        try:
+            if method == 'GET' and not parts:
+                return 200, self._root()
+            if method == 'POST' and len(parts) == 1:
+                if parts[0] == 'fqname-to-id':
+                    return 200, {'uuid': self._resolve(data['type'], data['fq_name'])}
+                if parts[0] == 'id-to-fqname':
+                    resource = self._get(data['uuid'])
+                    return 200, {'type': self.types[data['uuid']],
+                                 'fq_name': resource['fq_name']}
+                if parts[0] == 'ref-update':
+                    return 200, self._ref_update(data)
+                if parts[0] == 'useragent-kv':
+                    return 200, self._kv(data)
+                type = parts[0][:-1]
+                if parts[0].endswith('s') and type in data:
+                    resource = self.create(type, data[type])
+                    return 200, {type: self.view(resource['uuid'],
+                                                 children=False, back_refs=False)}
+            if method == 'GET' and len(parts) == 1 and parts[0].endswith('s'):
+                return 200, self._list(parts[0][:-1], params)
+            if len(parts) == 2:
+                type, uuid = parts
+                if method == 'GET':
+                    self._get(uuid, type)
+                    return 200, {type: self.view(
+                        uuid,
+                        children=not is_true(params.get('exclude_children', False)),
+                        back_refs=not is_true(params.get('exclude_back_refs', False)))}
+                if method == 'PUT':
+                    self._get(uuid, type)
+                    self.update(uuid, data.get(type, {}))
+                    return 200, {type: {'uuid': uuid, 'href': self._href(type, uuid)}}
+                if method == 'DELETE':
+                    self._get(uuid, type)
+                    self.delete(uuid)
+                    return 200, None
+            raise FakeAPIError(404, 'Not found: %s /%s' % (method, path))
+        except FakeAPIError as e:
+            return e.status, e.message
+        except (KeyError, ValueError, TypeError) as e:
+            return 400, 'Bad request: %s' % e
+
+
+class FakeAPIAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter serving requests with a
+    :class:`FakeAPIServer`
+
+    :param server: fake API server
+    :type server: FakeAPIServer
+    :param latency: delay in seconds before each response
+                    or function returning the delay of a
+                    request
+    :type latency: float | callable(PreparedRequest)
+    """
+
+    def __init__(self, server, latency=0, **kwargs):
+        self.server = server
+        self.latency = latency
+        super(FakeAPIAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        latency = self.latency(request) if callable(self.latency) else self.latency
+        if latency > 0:
+            gevent.sleep(latency)
+        status, data = self.server.handle(request.method, request.url, request.body)
+        if data is None:
+            content, content_type = b'', 'text/plain'
+        elif isinstance(data, dict):
+            content, content_type = to_compact_json(data).encode('utf-8'), 'application/json'
+        else:
+            content, content_type = data.encode('utf-8'), 'text/plain'
+        raw = HTTPResponse(body=io.BytesIO(content),
+                           headers={'Content-Type': content_type,
+                                    'Content-Length': text_type(len(content))},
+                           status=status,
+                           reason=http_client.responses.get(status, ''),
+                           preload_content=False)
+        return self.build_response(request, raw)
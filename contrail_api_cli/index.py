@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Persistent index of resources paths and fq_names used
+for completion.
+
+The index is stored in a SQLite database so that completion
+works from the start of a new shell session:
+
+>>> index = CompletionIndex('/tmp/completion.db')
+>>> index.add('virtual-network', '3b8a5c22-...', 'default-domain:admin:net1')
+>>> index.search('/virtual-network/default-domain:')
+[('virtual-network', '3b8a5c22-...', 'default-domain:admin:net1')]
+"""
+from __future__ import unicode_literals
+
+import os
+import atexit
+import sqlite3
+import logging
+
+from six import text_type, unichr
+
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionIndex(object):
+    """Prefix index of resources keys
+
+    Each resource is indexed with ``/<type>/<uuid>`` and
+    ``/<type>/<fq_name>`` keys. The database is opened on
+    the first operation, added resources are written by
+    batches of `batch_size`, on search and at exit. If the
+    database cannot be opened the index stays empty.
+
+    :param path: database file
+    :type path: str
+    :param batch_size: number of pending writes before flushing
+    :type batch_size: int
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self._db = None
+        self._disabled = False
+        # key -> (type, uuid, fq_name) or None for deletions
+        self._pending = {}
+        atexit.register(self.close)
+
+    @property
+    def db(self):
+        """Connection to the database, None if it
+        cannot be opened
+        """
+        if self._db is None and not self._disabled:
+            db = None
+            try:
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.isdir(directory):
+                    try:
+                        os.makedirs(directory)
+                    except OSError:
+                        # created by another process
+                        if not os.path.isdir(directory):
+                            raise
+                db = sqlite3.connect(self.path)
+                # the index can be rebuilt, don't wait for the disk
+                db.execute('PRAGMA synchronous = OFF')
+                db.execute('CREATE TABLE IF NOT EXISTS resources ('
+                           'key TEXT PRIMARY KEY, type TEXT, uuid TEXT, fq_name TEXT)')
+            except (OSError, sqlite3.Error) as e:
+                logger.warning('Cannot open completion index %s: %s' % (self.path, e))
+                self._disabled = True
+                if db is not None:
+                    db.close()
+                return None
+            self._db = db
+        return self._db
+
+    def _keys(self, type, uuid, fq_name=None):
+        if fq_name:
+            yield '/%s/%s' % (type, fq_name)
+        yield '/%s/%s' % (type, uuid)
+
+    def add(self, type, uuid, fq_name=None):
+        """Add a resource to the index
+
+        :param type: resource type
+        :type type: str
+        :param uuid: resource uuid
+        :type uuid: v4UUID str
+        :param fq_name: resource fq_name
+        :type fq_name: str
+        """
+        fq_name = text_type(fq_name) if fq_name else None
+        for key in self._keys(type, uuid, fq_name):
+            self._pending[key] = (type, uuid, fq_name)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def remove(self, type, uuid, fq_name=None):
+        """Remove a resource from the index
+
+        Parameters are the same as :meth:`add`.
+        """
+        fq_name = text_type(fq_name) if fq_name else None
+        for key in self._keys(type, uuid, fq_name):
+            self._pending[key] = None
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write pending changes to the database
+        """
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        db = self.db
+        if db is None:
+            return
+        try:
+            with db:
+                db.executemany('INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?)',
+                               [(k, ) + v for k, v in pending.items() if v is not None])
+                db.executemany('DELETE FROM resources WHERE key = ?',
+                               [(k, ) for k, v in pending.items() if v is None])
+        except sqlite3.Error as e:
+            logger.warning('Cannot update completion index %s: %s' % (self.path, e))
+
+    def search(self, prefix, limit=None):
+        """Return resources with a key starting with prefix
+
+        :param prefix: key prefix (eg: /virtual-network/default-domain:)
+        :type prefix: str
+        :param limit: max number of results
+        :type limit: int
+
+        :rtype: [(type, uuid, fq_name)]
+        """
+        self.flush()
+        db = self.db
+        if db is None:
+            return []
+        query = 'SELECT type, uuid, fq_name FROM resources WHERE key >= ?'
+        params = [prefix]
+        if prefix:
+            # keys are ordered, stop at the next prefix
+            query += ' AND key < ?'
+            params.append(prefix[:-1] + unichr(ord(prefix[-1]) + 1))
+        query += ' ORDER BY key'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        try:
+            return [tuple(row) for row in db.execute(query, params)]
+        except sqlite3.Error as e:
+            logger.warning('Cannot search completion index %s: %s' % (self.path, e))
+            return []
+
+    def __len__(self):
+        self.flush()
+        db = self.db
+        if db is None:
+            return 0
+        try:
+            return db.execute('SELECT COUNT(DISTINCT uuid) FROM resources').fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning('Cannot count completion index %s: %s' % (self.path, e))
+            return 0
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,6 +1,6 @@
 from __future__ import unicode_literals
 
-from .utils import CONFIG_DIR, printo
+from .utils import CONFIG_DIR, JSON_BACKENDS, printo, set_json_backend
 
 import os
 import sys
@@ -16,6 +16,7 @@ from .manager import CommandManager
 from .exceptions import CommandError, NotFound, Exists
 from .schema import create_schema_from_version, list_available_schema_version, DummySchema, SchemaError
 from .context import Context
+from .resource import ResourceCache
 from . import client
 
 
@@ -59,6 +60,18 @@ def main():
     parser.add_argument('--config-dir',
                         help="path of configuration directory (default=%(default)s)",
                         default=os.environ.get('CONTRAIL_API_CLI_CONFIG_DIR', CONFIG_DIR))
+    parser.add_argument('--json-backend',
+                        default=os.environ.get('CONTRAIL_API_CLI_JSON_BACKEND', 'auto'),
+                        choices=['auto'] + list(JSON_BACKENDS.keys()),
+                        help="JSON encoder/decoder of API requests and responses, "
+                             "auto selects the fastest installed (default=%(default)s)")
+    parser.add_argument('--stats',
+                        action="store_true", default=False,
+                        help="print API requests statistics on stderr after the command")
+    parser.add_argument('--completion-cache-size', type=int,
+                        default=int(os.environ.get('CONTRAIL_API_CLI_COMPLETION_CACHE_SIZE',
+                                                   ResourceCache.max_items)),
+                        help="number of resources kept in memory for completion (default=%(default)s)")
 
     # contrail api session options
     client.register_argparse_arguments(parser)
@@ -72,7 +85,15 @@ def main():
     if not os.path.exists(options.config_dir):
         os.makedirs(options.config_dir)
 
+    try:
+        set_json_backend(options.json_backend)
+    except ValueError as e:
+        printo(text_type(e), std_type='stderr')
+        exit(1)
+
     Context().session = client.load_from_argparse_arguments(options)
+    # the cache is created by the shell completer
+    ResourceCache.max_items = options.completion_cache_size
 
     if options.schema_version:
         Context().schema = create_schema_from_version(options.schema_version)
@@ -93,6 +114,9 @@ def main():
     else:
         if result:
             printo(result)
+    finally:
+        if options.stats:
+            printo(Context().session.format_stats(), std_type='stderr')
 
 
 if __name__ == "__main__":
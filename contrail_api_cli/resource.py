@@ -2,26 +2,34 @@ from __future__ import unicode_literals
 import json
 import string
 import re
+import inspect
 from uuid import UUID
-from six import string_types, text_type
+from six import string_types, text_type, add_metaclass
 from functools import wraps
 from datetime import datetime
 import itertools
 import logging
+import weakref
+from collections import OrderedDict
 try:
-    from UserDict import UserDict
     from UserList import UserList
 except ImportError:
-    from collections import UserDict, UserList
+    from collections import UserList
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
 
 import datrie
+import gevent
+from pkg_resources import parse_version
 from keystoneauth1.exceptions.http import HttpError
 from prompt_toolkit.completion import Completion
 
-from .utils import FQName, Path, Observable, to_json
+from .utils import FQName, Path, Observable, Singleton, NGramIndex, to_json
 from .exceptions import ResourceNotFound, ResourceMissing, \
-    CollectionNotFound, ChildrenExists, BackRefsExists, IsSystemResource
-from .context import Context
+    CollectionNotFound, ChildrenExists, BackRefsExists, IsSystemResource, RefUpdateError
+from .context import Context, SchemaNotInitialized
 
 
 logger = logging.getLogger(__name__)
@@ -29,6 +37,9 @@ logger = logging.getLogger(__name__)
 
 def http_error_handler(f):
     """Handle 404 errors returned by the API server
+
+    Generator functions are wrapped so that errors raised
+    while iterating are handled as well.
     """
 
     def hrefs_to_resources(hrefs):
@@ -41,43 +52,56 @@ def http_error_handler(f):
             type, uuid = href.split('/')[-2:]
             yield Resource(type, uuid=uuid)
 
+    def handle(self, e):
+        if e.http_status == 404:
+            # remove previously created resource
+            # from the cache
+            self.emit('deleted', self)
+            if isinstance(self, Resource):
+                raise ResourceNotFound(resource=self)
+            elif isinstance(self, Collection):
+                raise CollectionNotFound(collection=self)
+        elif e.http_status == 409:
+            # contrail 3.2
+            matches = re.match(r'^Delete when children still present: (\[[^]]*\])($| \(HTTP 409\)$)', e.message)
+            if matches:
+                raise ChildrenExists(
+                    resources=list(hrefs_list_to_resources(matches.group(1))))
+            matches = re.match(r'^Delete when resource still referred: (\[[^]]*\])($| \(HTTP 409\)$)', e.message)
+            if matches:
+                raise BackRefsExists(
+                    resources=list(hrefs_list_to_resources(matches.group(1))))
+            # contrail 2.21
+            matches = re.match(r'^Children (.*) still exist($| \(HTTP 409\)$)', e.message)
+            if matches:
+                raise ChildrenExists(
+                    resources=list(hrefs_to_resources(matches.group(1))))
+            matches = re.match(r'^Back-References from (.*) still exist($| \(HTTP 409\)$)', e.message)
+            if matches:
+                raise BackRefsExists(
+                    resources=list(hrefs_to_resources(matches.group(1))))
+            # contrail 5.1
+            matches = re.match(r'^Cannot modify system resource (.*) .*\(([a-f0-9]{8}-?[a-f0-9]{4}-?4[a-f0-9]{3}-?[89ab][a-f0-9]{3}-?[a-f0-9]{12})\)($| \(HTTP 409\)$)', e.message)
+            if matches:
+                raise IsSystemResource(resources=[Resource(matches.group(1), uuid=matches.group(2))])
+        raise
+
+    if inspect.isgeneratorfunction(f):
+        @wraps(f)
+        def wrapper(self, *args, **kwargs):
+            try:
+                for item in f(self, *args, **kwargs):
+                    yield item
+            except HttpError as e:
+                handle(self, e)
+        return wrapper
+
     @wraps(f)
     def wrapper(self, *args, **kwargs):
         try:
             return f(self, *args, **kwargs)
         except HttpError as e:
-            if e.http_status == 404:
-                # remove previously created resource
-                # from the cache
-                self.emit('deleted', self)
-                if isinstance(self, Resource):
-                    raise ResourceNotFound(resource=self)
-                elif isinstance(self, Collection):
-                    raise CollectionNotFound(collection=self)
-            elif e.http_status == 409:
-                # contrail 3.2
-                matches = re.match(r'^Delete when children still present: (\[[^]]*\])($| \(HTTP 409\)$)', e.message)
-                if matches:
-                    raise ChildrenExists(
-                        resources=list(hrefs_list_to_resources(matches.group(1))))
-                matches = re.match(r'^Delete when resource still referred: (\[[^]]*\])($| \(HTTP 409\)$)', e.message)
-                if matches:
-                    raise BackRefsExists(
-                        resources=list(hrefs_list_to_resources(matches.group(1))))
-                # contrail 2.21
-                matches = re.match(r'^Children (.*) still exist($| \(HTTP 409\)$)', e.message)
-                if matches:
-                    raise ChildrenExists(
-                        resources=list(hrefs_to_resources(matches.group(1))))
-                matches = re.match(r'^Back-References from (.*) still exist($| \(HTTP 409\)$)', e.message)
-                if matches:
-                    raise BackRefsExists(
-                        resources=list(hrefs_to_resources(matches.group(1))))
-                # contrail 5.1
-                matches = re.match(r'^Cannot modify system resource (.*) .*\(([a-f0-9]{8}-?[a-f0-9]{4}-?4[a-f0-9]{3}-?[89ab][a-f0-9]{3}-?[a-f0-9]{12})\)($| \(HTTP 409\)$)', e.message)
-                if matches:
-                    raise IsSystemResource(resources=[Resource(matches.group(1), uuid=matches.group(2))])
-            raise
+            handle(self, e)
     return wrapper
 
 
@@ -142,21 +166,37 @@ class LinkedResources(object):
         return sorted(set(dir(type(self)) + list(self.__dict__) +
                       [t.replace('-', '_') for t in self.linked_types]))
 
+    def attrs(self, data):
+        """Return attributes of data holding linked resources
+
+        :rtype: [str]
+        """
+        return [attr for attr in data
+                if self._attr_to_type(attr) in self.linked_types]
+
+    def encode_attr(self, attr, value, recursive=1):
+        """Return linked resources from the list of dicts
+        of the attribute
+
+        :rtype: [Resource] or Collection
+        """
+        type = self._attr_to_type(attr)
+        resources = [Resource(type,
+                              fetch=recursive - 1 > 0,
+                              recursive=recursive - 1,
+                              **res)
+                     for res in value]
+        if self.link_type == LinkType.CHILDREN:
+            return Collection(type, parent_uuid=self.resource.uuid,
+                              data=resources)
+        elif self.link_type == LinkType.BACK_REF:
+            return Collection(type, back_refs_uuid=self.resource.uuid,
+                              data=resources)
+        return resources
+
     def encode(self, data, recursive=1):
-        for attr, _ in list(data.items()):
-            type = self._attr_to_type(attr)
-            if type in self.linked_types:
-                for idx, res in enumerate(data[attr]):
-                    data[attr][idx] = Resource(type,
-                                               fetch=recursive - 1 > 0,
-                                               recursive=recursive - 1,
-                                               **res)
-                if self.link_type == LinkType.CHILDREN:
-                    data[attr] = Collection(type, parent_uuid=self.resource.uuid,
-                                            data=data[attr])
-                elif self.link_type == LinkType.BACK_REF:
-                    data[attr] = Collection(type, back_refs_uuid=self.resource.uuid,
-                                            data=data[attr])
+        for attr in self.attrs(data):
+            data[attr] = self.encode_attr(attr, data[attr], recursive)
         return data
 
     def __repr__(self):
@@ -176,6 +216,7 @@ class ResourceEncoder(json.JSONEncoder):
 
 
 class ResourceBase(Observable):
+    __slots__ = ('_session', '__weakref__')
 
     def __init__(self, session=None):
         self._session = session
@@ -246,12 +287,17 @@ class Collection(ResourceBase, UserList):
     :type back_ref_uuid: v4UUID str or list of v4UUID str
     :param data: initial resources of the collection
     :type data: [Resource]
+    :param page_size: fetch the collection by pages of
+                      page_size resources, contrail 4.0 required
+    :type page_size: int
     """
+    # first schema version supporting paging
+    paging_version = '4.0'
 
     def __init__(self, type, fetch=False, recursive=1,
                  fields=None, detail=None, filters=None,
                  parent_uuid=None, back_refs_uuid=None,
-                 data=None, session=None):
+                 data=None, session=None, page_size=None):
         super(Collection, self).__init__(session=session)
         UserList.__init__(self, initlist=data)
         self.type = type
@@ -260,25 +306,62 @@ class Collection(ResourceBase, UserList):
         self.parent_uuid = list(self._sanitize_uuid(parent_uuid))
         self.back_refs_uuid = list(self._sanitize_uuid(back_refs_uuid))
         self.detail = detail
+        self.page_size = page_size
         if fetch:
             self.fetch(recursive=recursive)
         self.emit('created', self)
 
-    @http_error_handler
     def __len__(self):
         """Return the number of items of the collection
 
+        When the collection is not fetched the resources
+        are counted on the API server, see :meth:`count`.
+
         :rtype: int
         """
         if not self.data:
-            params = self._format_fetch_params()
-            res = self.session.get_json(self.href, count=True, **params)
-            try:
-                return res[self._contrail_name]['count']
-            except KeyError:
-                return 0
+            return self.count()
         return super(Collection, self).__len__()
 
+    def __bool__(self):
+        # only fetched resources, use len() to count
+        # the resources on the API server
+        return bool(self.data)
+    __nonzero__ = __bool__
+
+    @property
+    def _count_key(self):
+        return (self.type,
+                tuple(sorted((f, json.dumps(v)) for f, v in self.filters)),
+                tuple(sorted(self.parent_uuid)),
+                tuple(sorted(self.back_refs_uuid)))
+
+    @http_error_handler
+    def count(self, refresh=False):
+        """Return the number of resources of the collection
+        on the API server
+
+        Counts are cached for the session, see :class:`CountCache`.
+
+        :param refresh: don't use the cached count
+        :type refresh: bool
+
+        :rtype: int
+        """
+        cache = CountCache()
+        if not refresh:
+            count = cache.get(self._count_key)
+            if count is not None:
+                return count
+        params = self._format_fetch_params()
+        res = self.session.get_json(self.href, count=True, **params)
+        try:
+            count = res[self._contrail_name]['count']
+        except KeyError:
+            count = 0
+        cache.add(self._count_key, count)
+        return count
+
     def __hash__(self):
         return hash(self.type)
 
@@ -346,9 +429,71 @@ class Collection(ResourceBase, UserList):
     def _fetch_fields(self, fields=None):
         return self.fields + (fields or [])
 
+    @property
+    def paging_supported(self):
+        """Return True if the API server supports
+        paging, depending on the schema version
+
+        :rtype: bool
+        """
+        try:
+            version = Context().schema.version
+        except SchemaNotInitialized:
+            return False
+        try:
+            return parse_version(version) >= parse_version(self.paging_version)
+        except (ValueError, TypeError):
+            return False
+
+    def _iter_pages(self, params, page_size=None, limit=None):
+        """Yield resources dicts of the collection
+
+        When paging is used, the next page is requested
+        while the resources of the current page are consumed.
+        """
+        page_size = page_size or self.page_size
+        if not page_size or not self.paging_supported:
+            data = self.session.get_json(self.href, **params)
+            res_dicts = (res for res_list in data.values()
+                         if isinstance(res_list, list)
+                         for res in res_list)
+            for res in itertools.islice(res_dicts, limit):
+                yield res
+            return
+
+        def get_page(marker, remaining):
+            page_params = dict(params, page_limit=page_size)
+            if remaining is not None:
+                page_params['page_limit'] = min(page_size, remaining)
+            if marker is not None:
+                page_params['page_marker'] = marker
+            return self.session.get_json(self.href, **page_params)
+
+        count = 0
+        next_page = gevent.spawn(get_page, None, limit)
+        try:
+            while next_page is not None:
+                data = next_page.get()
+                page = data.get(self._contrail_name, [])
+                if limit is not None:
+                    page = page[:limit - count]
+                count += len(page)
+                marker = data.get('marker')
+                next_page = None
+                if marker is not None and page and (limit is None or count < limit):
+                    # prefetch
+                    next_page = gevent.spawn(get_page, marker,
+                                             None if limit is None else limit - count)
+                for res in page:
+                    yield res
+        finally:
+            if next_page is not None:
+                next_page.kill()
+
     @http_error_handler
     def fetch(self, recursive=1, fields=None, detail=None,
-              filters=None, parent_uuid=None, back_refs_uuid=None):
+              filters=None, parent_uuid=None, back_refs_uuid=None,
+              page_size=None, limit=None):
         """
         Fetch collection from API server
 
@@ -365,15 +510,21 @@ class Collection(ResourceBase, UserList):
         :type parent_uuid: v4UUID str or list of v4UUID str
         :param back_refs_uuid: filter by back_refs_uuid
         :type back_refs_uuid: v4UUID str or list of v4UUID str
+        :param page_size: fetch by pages of page_size resources,
+                          a single request is made when the server
+                          doesn't support paging
+        :type page_size: int
+        :param limit: stop fetching after limit resources
+        :type limit: int
 
         :rtype: Collection
         """
 
         params = self._format_fetch_params(fields=fields, detail=detail, filters=filters,
                                            parent_uuid=parent_uuid, back_refs_uuid=back_refs_uuid)
-        data = self.session.get_json(self.href, **params)
 
         if not self.type:
+            data = self.session.get_json(self.href, **params)
             self.data = [Collection(col["link"]["name"],
                                     fetch=recursive - 1 > 0,
                                     recursive=recursive - 1,
@@ -391,11 +542,86 @@ class Collection(ResourceBase, UserList):
                                   fetch=recursive - 1 > 0,
                                   recursive=recursive - 1,
                                   **res.get(self.type, res))
-                         for res_type, res_list in data.items()
-                         for res in res_list]
+                         for res in self._iter_pages(params, page_size=page_size,
+                                                     limit=limit)]
 
         return self
 
+    @http_error_handler
+    def iter_fetch(self, recursive=1, fields=None, detail=None,
+                   filters=None, parent_uuid=None, back_refs_uuid=None,
+                   page_size=None, limit=None):
+        """
+        Fetch collection from API server and yield resources
+        while the response is received
+
+        Unlike :meth:`fetch` the resources are not stored in the
+        collection so that memory usage doesn't grow with the size
+        of the collection. With paging, only the current and the
+        next pages are kept in memory.
+
+        >>> c = Collection('instance-ip', detail=True)
+        >>> for iip in c.iter_fetch():
+        >>>     print(iip['instance_ip_address'])
+
+        Parameters are the same as :meth:`fetch`.
+
+        :rtype: iterator of Resource
+        """
+        if not self.type:
+            for collection in self.fetch(recursive=recursive, fields=fields, detail=detail,
+                                         filters=filters, parent_uuid=parent_uuid,
+                                         back_refs_uuid=back_refs_uuid).data:
+                yield collection
+            return
+        for res in self.iter_fetch_data(fields=fields, detail=detail, filters=filters,
+                                        parent_uuid=parent_uuid,
+                                        back_refs_uuid=back_refs_uuid,
+                                        page_size=page_size, limit=limit):
+            yield Resource(self.type,
+                           fetch=recursive - 1 > 0,
+                           recursive=recursive - 1,
+                           **res)
+
+    @http_error_handler
+    def iter_fetch_data(self, fields=None, detail=None,
+                        filters=None, parent_uuid=None, back_refs_uuid=None,
+                        page_size=None, limit=None):
+        """
+        Fetch collection from API server and yield resources
+        data while the response is received
+
+        Like :meth:`iter_fetch` but no :class:`Resource` is
+        created, which is faster when many resources are
+        only read once.
+
+        >>> c = Collection('instance-ip')
+        >>> for data in c.iter_fetch_data(fields=['instance_ip_address']):
+        >>>     print(data['instance_ip_address'])
+
+        Parameters are the same as :meth:`fetch` except recursive.
+
+        :rtype: iterator of dict
+        """
+        params = self._format_fetch_params(fields=fields, detail=detail, filters=filters,
+                                           parent_uuid=parent_uuid, back_refs_uuid=back_refs_uuid)
+        page_size = page_size or self.page_size
+        if page_size and self.paging_supported:
+            stream = res_dicts = self._iter_pages(params, page_size=page_size, limit=limit)
+        else:
+            stream = self.session.get_json_stream(self.href, **params)
+            res_dicts = itertools.islice((res for res_type, res in stream), limit)
+        try:
+            # when detail=False, res == {resource_attrs}
+            # when detail=True, res == {'type': {resource_attrs}}
+            for res in res_dicts:
+                yield res.get(self.type, res)
+        finally:
+            # the response is not read until the end when
+            # the caller stops early, it must be closed so
+            # that the connection is not reused half-read
+            stream.close()
+
 
 class RootCollection(Collection):
 
@@ -403,7 +629,7 @@ class RootCollection(Collection):
         return super(RootCollection, self).__init__('', **kwargs)
 
 
-class Resource(ResourceBase, UserDict):
+class Resource(ResourceBase, MutableMapping):
     """Class for interacting with an API resource
 
     >>> from contrail_api_cli.resource import Resource
@@ -441,6 +667,10 @@ class Resource(ResourceBase, UserDict):
 
         Either fq_name or uuid must be provided.
     """
+    # a lot of resources can be loaded at the same time, avoid
+    # a __dict__ per instance. Properties of the resource type
+    # are stored in the schema.
+    __slots__ = ('type', 'data', '_lazy_links')
 
     def __init__(self, type, fetch=False, check=False,
                  parent=None, recursive=1, session=None, **kwargs):
@@ -448,8 +678,9 @@ class Resource(ResourceBase, UserDict):
         super(Resource, self).__init__(session=session)
         self.type = type
 
-        UserDict.__init__(self, kwargs)
-        self.from_dict(self.data)
+        # linked resources need the uuid of the resource
+        self.data = kwargs
+        self.from_dict(kwargs)
 
         if parent:
             self.parent = parent
@@ -460,18 +691,41 @@ class Resource(ResourceBase, UserDict):
         if fetch:
             self.fetch(recursive=recursive)
 
-        self.properties = {prop.key: prop for prop in self.schema.properties}
         self.emit('created', self)
 
     def __getattr__(self, attr):
-        if attr in self.properties:
-            return self.get(attr, self.properties[attr].default)
+        # don't look for properties of partially initialized resources
+        if attr not in self.__slots__:
+            properties = self.properties
+            if attr in properties:
+                return self.get(attr, properties[attr].default)
         msg = "'{0}' object has no attribute '{1}'"
         raise AttributeError(msg.format(type(self).__name__, attr))
 
     def __dir__(self):
-        return sorted(set(dir(type(self)) + list(self.__dict__) +
-                      self.properties.keys()))
+        return sorted(set(dir(type(self)) + list(self.properties.keys())))
+
+    def __getitem__(self, key):
+        if self._lazy_links is not None and key in self._lazy_links:
+            self._encode_link(key)
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self._discard_link(key)
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        self._discard_link(key)
+        del self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
 
     def __eq__(self, other):
         if not isinstance(other, Resource) or not self.type == other.type:
@@ -489,24 +743,36 @@ class Resource(ResourceBase, UserDict):
     def schema(self):
         return Context().schema.resource(self.type)
 
-    def check(self):
+    @property
+    def properties(self):
+        """Return properties of the resource type
+
+        :rtype: {str: ResourceProperty}
+        """
+        return self.schema.properties_by_key
+
+    def check(self, cache=False):
         """Check that the resource exists.
 
+        :param cache: use the session resolve cache, resources
+                      deleted by other clients may still be found
+        :type cache: bool
+
         :raises ResourceNotFound: if the resource doesn't exists
         """
         if self.fq_name:
-            self['uuid'] = self._check_fq_name(self.fq_name)
+            self['uuid'] = self._check_fq_name(self.fq_name, cache)
         elif self.uuid:
-            self['fq_name'] = self._check_uuid(self.uuid)
+            self['fq_name'] = self._check_uuid(self.uuid, cache)
         return True
 
     @http_error_handler
-    def _check_uuid(self, uuid):
-        return self.session.id_to_fqname(uuid, type=self.type)['fq_name']
+    def _check_uuid(self, uuid, cache=False):
+        return self.session.id_to_fqname(uuid, type=self.type, cache=cache)['fq_name']
 
     @http_error_handler
-    def _check_fq_name(self, fq_name):
-        return self.session.fqname_to_id(fq_name, self.type)
+    def _check_fq_name(self, fq_name, cache=False):
+        return self.session.fqname_to_id(fq_name, self.type, cache=cache)
 
     @property
     def exists(self):
@@ -592,6 +858,7 @@ class Resource(ResourceBase, UserDict):
             self.session.put_json(self.href,
                                   {self.type: dict(self.data)},
                                   cls=ResourceEncoder)
+        self.emit('saved', self)
         return self.fetch(exclude_children=True, exclude_back_refs=True)
 
     @http_error_handler
@@ -616,7 +883,8 @@ class Resource(ResourceBase, UserDict):
         :rtype: Resource
         """
         if not self.path.is_resource and not self.path.is_uuid:
-            self.check()
+            # the resource is fetched anyway
+            self.check(cache=True)
         params = {}
         # even if the param is False the API will exclude resources
         if exclude_children:
@@ -630,6 +898,10 @@ class Resource(ResourceBase, UserDict):
     def from_dict(self, data, recursive=1):
         """Populate the resource from a python dict
 
+        Linked resources (refs, back_refs and children) are
+        created when they are accessed for the first time,
+        unless they must be fetched (recursive > 1).
+
         :param recursive: level of recursion for fetching resources
         :type recursive: int
         """
@@ -641,11 +913,31 @@ class Resource(ResourceBase, UserDict):
         for attr in ('fq_name', 'to'):
             if attr in data:
                 data[attr] = FQName(data[attr])
-        data = self.refs.encode(data, recursive)
-        data = self.back_refs.encode(data, recursive)
-        data = self.children.encode(data, recursive)
+        self._lazy_links = None
+        links = (self.refs, self.back_refs, self.children)
+        if recursive > 1:
+            for link in links:
+                data = link.encode(data, recursive)
+            return data
+        # attr -> link type
+        lazy_links = {attr: link.link_type
+                      for link in links
+                      for attr in link.attrs(data)}
+        if lazy_links:
+            self._lazy_links = lazy_links
         return data
 
+    def _encode_link(self, attr):
+        link_type = self._lazy_links[attr]
+        self.data[attr] = LinkedResources(link_type, self).encode_attr(attr, self.data[attr])
+        self._discard_link(attr)
+
+    def _discard_link(self, attr):
+        if self._lazy_links is not None:
+            self._lazy_links.pop(attr, None)
+            if not self._lazy_links:
+                self._lazy_links = None
+
     @property
     def refs(self):
         """Return refs resources of the resource
@@ -670,7 +962,7 @@ class Resource(ResourceBase, UserDict):
         """
         return LinkedResources(LinkType.CHILDREN, self)
 
-    def remove_ref(self, ref):
+    def remove_ref(self, ref, fetch=True):
         """Remove reference from self to ref
 
         >>> iip = Resource('instance-ip',
@@ -683,22 +975,26 @@ class Resource(ResourceBase, UserDict):
 
         :param ref: reference to remove
         :type ref: Resource
+        :param fetch: fetch the resource after the update
+        :type fetch: bool
 
         :rtype: Resource
         """
         self.session.remove_ref(self, ref)
-        return self.fetch()
+        return self.fetch() if fetch else self
 
-    def remove_back_ref(self, back_ref):
+    def remove_back_ref(self, back_ref, fetch=True):
         """Remove reference from back_ref to self
 
         :param back_ref: back_ref to remove
         :type back_ref: Resource
+        :param fetch: fetch the resources after the update
+        :type fetch: bool
 
         :rtype: Resource
         """
-        back_ref.remove_ref(self)
-        return self.fetch()
+        back_ref.remove_ref(self, fetch=fetch)
+        return self.fetch() if fetch else self
 
     def set_ref(self, ref, attr=None):
         """Set reference to resource
@@ -722,27 +1018,99 @@ class Resource(ResourceBase, UserDict):
             self[ref_attr] = [ref]
         return self
 
-    def add_ref(self, ref, attr=None):
+    def add_ref(self, ref, attr=None, fetch=True):
         """Add reference to resource
 
         :param ref: reference to add
         :type ref: Resource
+        :param fetch: fetch the resource after the update
+        :type fetch: bool
 
         :rtype: Resource
         """
         self.session.add_ref(self, ref, attr)
-        return self.fetch()
+        return self.fetch() if fetch else self
 
-    def add_back_ref(self, back_ref, attr=None):
+    def add_back_ref(self, back_ref, attr=None, fetch=True):
         """Add reference from back_ref to self
 
         :param back_ref: back_ref to add
         :type back_ref: Resource
+        :param fetch: fetch the resources after the update
+        :type fetch: bool
+
+        :rtype: Resource
+        """
+        back_ref.add_ref(self, attr, fetch=fetch)
+        return self.fetch() if fetch else self
+
+    def _update_refs(self, operations, fetch=False, workers=50):
+        operations = list(operations)
+        errors = self.session.ref_updates(operations, workers=workers)
+        failed = [(r1, r2, e) for (r1, r2, _, _), e in zip(operations, errors)
+                  if e is not None]
+        if fetch:
+            self.fetch()
+        if failed:
+            raise RefUpdateError(failed)
+        return self
+
+    def add_refs(self, refs, attr=None, fetch=False, workers=50):
+        """Add references to several resources
+
+        Unlike :meth:`add_ref` the resource is not fetched
+        after the update by default.
+
+        >>> sg.add_back_refs(vmis)
+
+        :param refs: references to add
+        :type refs: [Resource]
+        :param attr: attributes of the references
+        :type attr: dict
+        :param fetch: fetch the resource after the update
+        :type fetch: bool
+        :param workers: max number of concurrent updates
+        :type workers: int
+
+        :rtype: Resource
+        :raises RefUpdateError: some references were not added,
+                                the others are still added
+        """
+        return self._update_refs([(self, ref, 'ADD', attr) for ref in refs],
+                                 fetch=fetch, workers=workers)
+
+    def remove_refs(self, refs, fetch=False, workers=50):
+        """Remove references to several resources
+
+        Parameters are the same as :meth:`add_refs`.
 
         :rtype: Resource
+        :raises RefUpdateError: some references were not removed
         """
-        back_ref.add_ref(self, attr)
-        return self.fetch()
+        return self._update_refs([(self, ref, 'DELETE', None) for ref in refs],
+                                 fetch=fetch, workers=workers)
+
+    def add_back_refs(self, back_refs, attr=None, fetch=False, workers=50):
+        """Add references from several resources to self
+
+        Parameters are the same as :meth:`add_refs`.
+
+        :rtype: Resource
+        :raises RefUpdateError: some references were not added
+        """
+        return self._update_refs([(back_ref, self, 'ADD', attr) for back_ref in back_refs],
+                                 fetch=fetch, workers=workers)
+
+    def remove_back_refs(self, back_refs, fetch=False, workers=50):
+        """Remove references from several resources to self
+
+        Parameters are the same as :meth:`add_refs`.
+
+        :rtype: Resource
+        :raises RefUpdateError: some references were not removed
+        """
+        return self._update_refs([(back_ref, self, 'DELETE', None) for back_ref in back_refs],
+                                 fetch=fetch, workers=workers)
 
     def json(self):
         """Return JSON representation of the resource
@@ -755,29 +1123,229 @@ class Actions:
     DELETE = 'DELETE'
 
 
-class ResourceCache(object):
-    """Resource cache of discovered resources.
+@add_metaclass(Singleton)
+class CountCache(object):
+    """Counts of collections made during the session
+
+    Counts are stored by collection type, filters, parent
+    and back_refs uuids. Counts of a type are discarded when
+    a resource of this type is saved or deleted, or when the
+    references of a resource of this type are updated. Changes
+    made by other API clients are not seen until the cache is
+    cleared.
     """
+
     def __init__(self):
+        # type -> {key: count}
+        self.counts = {}
+        self.hits = 0
+        self.misses = 0
+        Resource.register('saved', self._invalidate_item)
+        Resource.register('deleted', self._invalidate_item)
+        Resource.register('ref_updated', self._invalidate_ref)
+
+    def __len__(self):
+        return sum(len(counts) for counts in self.counts.values())
+
+    def get(self, key):
+        """Return the cached count of key or None
+
+        :param key: collection key
+        :type key: (type, filters, parent_uuids, back_refs_uuids)
+
+        :rtype: int
+        """
+        count = self.counts.get(key[0], {}).get(key)
+        if count is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return count
+
+    def add(self, key, count):
+        self.counts.setdefault(key[0], {})[key] = count
+
+    def invalidate(self, type):
+        """Remove counts of collections of type
+
+        :param type: collection type
+        :type type: str
+        """
+        self.counts.pop(type, None)
+
+    def _invalidate_item(self, item):
+        self.invalidate(item.type)
+
+    def _invalidate_ref(self, resources):
+        # both ends of the ref: refs of one are back_refs of the other
+        for resource in resources:
+            self.invalidate(resource.type)
+
+    def clear(self):
+        self.counts.clear()
+
+    @property
+    def stats(self):
+        """Return cache statistics
+
+        :rtype: dict
+        """
+        return {'size': len(self),
+                'hits': self.hits,
+                'misses': self.misses}
+
+    def reset_stats(self):
+        self.hits = self.misses = 0
+
+
+@add_metaclass(Singleton)
+class ResourceCache(object):
+    """Resource cache of discovered resources and collections
+    used for completion.
+
+    The last `max_items` resources and collections created or
+    returned by a search are kept in memory. Older items are
+    weakly referenced: they stay in the cache as long as they
+    are used elsewhere.
+
+    When an `index` is set, resources are also stored in this
+    persistent index and searched in it so that resources
+    discovered in previous sessions can be completed.
+
+    Besides prefix search on paths and fq_names, fq_names of
+    resources can be searched by substring or fuzzy matching.
+
+    :param max_items: number of items kept in memory
+    :type max_items: int
+    :param index: persistent index of resources
+    :type index: CompletionIndex
+    """
+    max_items = 10000
+    # max number of resources loaded from the index by search
+    index_limit = 500
+    # max number of completions returned by get_completions
+    completion_limit = 100
+
+    def __init__(self, max_items=None, index=None):
+        if max_items is not None:
+            self.max_items = max_items
+        self.index = index
+        self._loading = False
         self.cache = {
             'resources': datrie.Trie(string.printable),
             'collections': datrie.Trie(string.printable)
         }
+        # (trie name, path) -> item, least recently used first
+        self.lru = OrderedDict()
+        # resource type -> NGramIndex of fq_names by path
+        self.ngrams = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
         Resource.register('created', self._add_item)
         Resource.register('deleted', self._del_item)
         Collection.register('created', self._add_item)
         Collection.register('deleted', self._del_item)
 
+    def __len__(self):
+        return len(self.lru)
+
+    @property
+    def stats(self):
+        """Return cache statistics
+
+        :rtype: dict
+        """
+        return {'size': len(self),
+                'keys': sum(len(trie) for trie in self.cache.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def clear(self):
+        """Remove all items from the cache
+        """
+        self.lru.clear()
+        self.ngrams.clear()
+        for name in self.cache:
+            self.cache[name] = datrie.Trie(string.printable)
+
     def search_resources(self, strings, limit=None):
-        return self._search(self.cache['resources'], strings, limit=limit)
+        items = self._search(self.cache['resources'], strings, limit=limit)
+        if self.index is not None and (limit is None or len(items) < limit):
+            items += self._search_index(strings, items, limit=limit)
+        return self._found(items)
 
     def search_collections(self, strings, limit=None):
-        return self._search(self.cache['collections'], strings, limit=limit)
+        return self._found(self._search(self.cache['collections'], strings, limit=limit))
 
     def search(self, strings, limit=None):
         return self.search_collections(strings, limit=limit) + \
             self.search_resources(strings, limit=limit)
 
+    def search_substring(self, text, type=None, limit=None):
+        """Search resources with a fq_name containing text
+
+        :param text: string to search (case insensitive)
+        :type text: str
+        :param type: only search resources of this type
+        :type type: str
+        :param limit: limit search results
+        :type limit: int
+
+        :rtype: [Resource]
+        """
+        keys = (key
+                for index in self._ngram_indexes(type)
+                for key in index.substring(text))
+        return self._found(list(itertools.islice(self._resources(keys), limit)))
+
+    def search_fuzzy(self, text, type=None, limit=None, threshold=0.3):
+        """Search resources with a fq_name similar to text,
+        best matches first
+
+        Similarity is the ratio of the trigrams of text found
+        in the fq_name.
+
+        Parameters are the same as :meth:`search_substring`.
+
+        :rtype: [Resource]
+        """
+        matches = [match
+                   for index in self._ngram_indexes(type)
+                   for match in index.fuzzy(text, threshold=threshold, limit=limit)]
+        # merge results of all types
+        matches.sort(key=lambda m: -m[1])
+        keys = (key for key, _ in matches)
+        return self._found(list(itertools.islice(self._resources(keys), limit)))
+
+    def _ngram_indexes(self, type=None):
+        if type is not None:
+            return [self.ngrams[type]] if type in self.ngrams else []
+        return [self.ngrams[t] for t in sorted(self.ngrams)]
+
+    def _resources(self, keys):
+        trie = self.cache['resources']
+        for key in keys:
+            ref = trie.get(key)
+            item = ref() if ref is not None else None
+            if item is not None:
+                yield item
+
+    def _iter_prefix(self, trie, prefix):
+        # iterate without building the list of all matches
+        state = datrie.State(trie)
+        if not state.walk(prefix):
+            return
+        it = datrie.Iterator(state)
+        while it.next():
+            item = it.data()()
+            if item is not None:
+                yield item
+
     def _search(self, trie, strings, limit=None):
         """Search in cache
 
@@ -788,37 +1356,108 @@ class ResourceCache(object):
 
         :rtype: [Resource | Collection]
         """
-        results = [trie.has_keys_with_prefix(s) for s in strings]
-        if not any(results):
+        for s in strings:
+            items = list(itertools.islice(self._iter_prefix(trie, s), limit))
+            if items:
+                return items
+        return []
+
+    def _search_index(self, strings, found, limit=None):
+        """Search resources in the index that are not in found
+        """
+        seen = set(text_type(item.path) for item in found)
+        limit = self.index_limit if limit is None else limit - len(found)
+        for s in strings:
+            rows = self.index.search(s, limit=limit + len(found))
+            if rows:
+                break
+        else:
             return []
-        for result, s in zip(results, strings):
-            if result is True:
-                return trie.values(s)[:limit]
+        items = []
+        # resources are already in the index
+        self._loading = True
+        try:
+            for type, uuid, fq_name in rows:
+                path = '/%s/%s' % (type, uuid)
+                if path in seen:
+                    continue
+                seen.add(path)
+                if fq_name:
+                    items.append(Resource(type, uuid=uuid, fq_name=fq_name))
+                else:
+                    items.append(Resource(type, uuid=uuid))
+        finally:
+            self._loading = False
+        return items[:limit]
+
+    def _found(self, items):
+        if items:
+            self.hits += 1
+        else:
+            self.misses += 1
+        for item in items:
+            self._touch(item)
+        return items
 
     def _get_trie_for_item(self, item):
         if isinstance(item, Collection):
-            trie = self.cache['collections']
+            return 'collections'
         elif isinstance(item, Resource):
-            trie = self.cache['resources']
-        else:
-            raise RuntimeError('Invalid item')
-        return trie
+            return 'resources'
+        raise RuntimeError('Invalid item')
 
     def _get_keys(self, item):
         if item.fq_name:
             yield '/%s/%s' % (item.type, item.fq_name)
         yield text_type(item.path)
 
+    def _touch(self, item):
+        key = (self._get_trie_for_item(item), text_type(item.path))
+        self.lru.pop(key, None)
+        self.lru[key] = item
+        while len(self.lru) > self.max_items:
+            self.lru.popitem(last=False)
+            self.evictions += 1
+
     def _add_item(self, item):
-        trie = self._get_trie_for_item(item)
-        for key in self._get_keys(item):
-            trie[key] = item
+        trie_name = self._get_trie_for_item(item)
+        trie = self.cache[trie_name]
+        keys = list(self._get_keys(item))
+        type, path = item.type, text_type(item.path)
+
+        def remove(ref):
+            try:
+                if trie[path] is ref and type in self.ngrams:
+                    self.ngrams[type].remove(path)
+            except KeyError:
+                pass
+            self._del_keys(trie, keys, ref)
+
+        ref = weakref.ref(item, remove)
+        for key in keys:
+            trie[key] = ref
+        self._touch(item)
+        if trie_name == 'resources' and item.fq_name and item.uuid:
+            self.ngrams.setdefault(type, NGramIndex()).add(path, text_type(item.fq_name))
+        if self.index is not None and not self._loading and \
+                trie_name == 'resources' and item.uuid:
+            self.index.add(item.type, item.uuid, item.fq_name)
 
     def _del_item(self, item):
-        trie = self._get_trie_for_item(item)
-        for key in self._get_keys(item):
+        trie_name = self._get_trie_for_item(item)
+        self.lru.pop((trie_name, text_type(item.path)), None)
+        self._del_keys(self.cache[trie_name], self._get_keys(item))
+        if item.type in self.ngrams:
+            self.ngrams[item.type].remove(text_type(item.path))
+        if self.index is not None and trie_name == 'resources' and item.uuid:
+            self.index.remove(item.type, item.uuid, item.fq_name)
+
+    def _del_keys(self, trie, keys, ref=None):
+        for key in keys:
             try:
-                del trie[key]
+                # the key may be used by a more recent item
+                if ref is None or trie[key] is ref:
+                    del trie[key]
             except KeyError:
                 pass
 
@@ -836,7 +1475,14 @@ class ResourceCache(object):
             path = path / word_before_cursor
 
         logger.debug('Search for %s' % path)
-        results = getattr(self, 'search_' + cache_type)([text_type(path)])
+        results = getattr(self, 'search_' + cache_type)([text_type(path)],
+                                                        limit=self.completion_limit)
+        if not results and cache_type == 'resources' and path.is_resource and path.base:
+            # look for fq_names containing the word or similar to it
+            results = self.search_substring(path.name, type=path.base,
+                                            limit=self.completion_limit) or \
+                self.search_fuzzy(path.name, type=path.base,
+                                  limit=self.completion_limit)
         seen = set()
         for r in results:
             if (r.type, r.uuid) in seen:
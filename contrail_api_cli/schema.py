@@ -198,6 +198,21 @@ class ResourceSchema(object):
         self.refs = []
         self.back_refs = []
         self.properties = []
+        self._properties_by_key = None
+
+    @property
+    def properties_by_key(self):
+        """Return properties of the resource indexed by key
+
+        The dict is built once and shared by all resources
+        of this type.
+
+        :rtype: {str: ResourceProperty}
+        """
+        if self._properties_by_key is None or \
+                len(self._properties_by_key) != len(self.properties):
+            self._properties_by_key = {prop.key: prop for prop in self.properties}
+        return self._properties_by_key
 
     def json(self):
         data = {'children': self.children,
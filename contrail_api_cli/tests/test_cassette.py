@@ -0,0 +1,131 @@
+from __future__ import unicode_literals
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from requests.packages.urllib3.response import HTTPResponse
+from keystoneauth1.identity import v3
+
+from contrail_api_cli.client import ContrailAPISession
+from contrail_api_cli.cassette import request_key, redact
+
+
+def fake_send(adapter, request, **kwargs):
+    data = {'request': [request.method, request.url, request.body and json.loads(request.body)]}
+    raw = HTTPResponse(body=io.BytesIO(json.dumps(data).encode('utf-8')),
+                       headers={'Content-Type': 'application/json'},
+                       status=200, reason='OK', preload_content=False)
+    return adapter.build_response(request, raw)
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cassette.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_request_key(self):
+        self.assertEqual(request_key('get', 'http://localhost:8082/foos?b=1&a=2'),
+                         ('GET', 'http://localhost:8082/foos?a=2&b=1', ''))
+        self.assertEqual(request_key('POST', 'http://localhost:8082/fqname-to-id',
+                                     b'{"type": "foo", "fq_name": ["bar"]}'),
+                         request_key('POST', 'http://localhost:8082/fqname-to-id',
+                                     '{"fq_name":["bar"],"type":"foo"}'))
+
+    @mock.patch('contrail_api_cli.cassette.gevent.sleep')
+    def test_record_replay(self, mock_sleep):
+        with mock.patch('requests.adapters.HTTPAdapter.send', autospec=True, side_effect=fake_send):
+            session = ContrailAPISession(record=self.path)
+            foos = session.get_json(session.make_url('/foos'), detail=True)
+            uuid = session.post_json(session.make_url('/fqname-to-id'),
+                                     {'type': 'foo', 'fq_name': ['bar']})
+            streamed = list(session.get_json_stream(session.make_url('/foos')))
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        session = ContrailAPISession(replay=self.path, replay_latency_scale=2)
+        with mock.patch('requests.adapters.HTTPAdapter.send', autospec=True) as mock_send:
+            mock_send.side_effect = AssertionError('network access')
+            self.assertEqual(session.get_json(session.make_url('/foos'), detail=True), foos)
+            self.assertEqual(session.post_json(session.make_url('/fqname-to-id'),
+                                               {'fq_name': ['bar'], 'type': 'foo'}),
+                             uuid)
+            self.assertEqual(list(session.get_json_stream(session.make_url('/foos'))), streamed)
+        self.assertEqual(mock_sleep.call_count, 3)
+
+        # unknown requests fail
+        session.retries = 0
+        with self.assertRaises(Exception) as cm:
+            session.get_json(session.make_url('/bars'))
+        self.assertIn('No recorded response for GET', str(cm.exception))
+
+        # no delay
+        mock_sleep.reset_mock()
+        session = ContrailAPISession(replay=self.path, replay_latency_scale=0)
+        session.get_json(session.make_url('/foos'), detail=True)
+        self.assertFalse(mock_sleep.called)
+
+    def test_record_credentials(self):
+        def send(adapter, request, **kwargs):
+            if request.url.startswith('http://keystone:5000'):
+                body = {'token': {'methods': ['password'],
+                                  'expires_at': '2099-01-01T00:00:00.000000Z',
+                                  'catalog': []}}
+                headers = {'Content-Type': 'application/json',
+                           'X-Subject-Token': 'secret-token'}
+                status = 201
+            else:
+                self.assertEqual(request.headers.get('X-Auth-Token'), 'secret-token')
+                body = {'foos': []}
+                headers = {'Content-Type': 'application/json',
+                           'X-Auth-Token': request.headers.get('X-Auth-Token')}
+                status = 200
+            raw = HTTPResponse(body=io.BytesIO(json.dumps(body).encode('utf-8')),
+                               headers=headers, status=status, reason='OK',
+                               preload_content=False)
+            return adapter.build_response(request, raw)
+
+        def auth():
+            return v3.Password(auth_url='http://keystone:5000/v3', username='admin',
+                               password='secret-password', project_name='admin',
+                               user_domain_id='default', project_domain_id='default')
+        with mock.patch('requests.adapters.HTTPAdapter.send', autospec=True, side_effect=send):
+            session = ContrailAPISession(record=self.path, auth=auth())
+            self.assertEqual(session.get_json(session.make_url('/foos')),
+                             {'foos': []})
+            session.post_json(session.make_url('/foos'), {'foo': {'password': 'secret-password'}})
+        with open(self.path) as f:
+            cassette = f.read()
+        # only API requests are recorded
+        self.assertEqual(len(cassette.splitlines()), 2)
+        self.assertNotIn('keystone', cassette)
+        self.assertNotIn('secret-password', cassette)
+        self.assertNotIn('secret-token', cassette)
+        self.assertNotIn('X-Auth-Token', cassette)
+
+        # the auth server is not contacted when replaying
+        session = ContrailAPISession(replay=self.path, auth=auth())
+        with mock.patch('requests.adapters.HTTPAdapter.send', autospec=True) as mock_send:
+            mock_send.side_effect = AssertionError('network access')
+            self.assertEqual(session.get_json(session.make_url('/foos')),
+                             {'foos': []})
+
+    def test_redact(self):
+        self.assertEqual(redact({'auth': {'identity': {'password': {'user': {'password': 'x'}}}},
+                                 'foos': [{'Token': 'x', 'name': 'y'}]}),
+                         {'auth': {'identity': {'password': '<redacted>'}},
+                          'foos': [{'Token': '<redacted>', 'name': 'y'}]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,587 @@
+from __future__ import unicode_literals
+import gc
+import os
+import io
+import json
+import gzip
+import random
+import shutil
+import tempfile
+import unittest
+import weakref
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+import gevent
+import requests
+from requests.packages.urllib3.response import HTTPResponse
+from keystoneauth1.exceptions.http import HttpError
+
+from keystoneauth1.exceptions.connection import ConnectFailure
+
+from keystoneauth1.identity import v3
+
+from contrail_api_cli.client import ContrailAPISession, ResolveCache, ConcurrencyGovernor, \
+    RequestStats, APIServerPool, TokenCache, percentile
+from contrail_api_cli.auth import HTTPAuth
+from contrail_api_cli.resource import Resource
+from contrail_api_cli.utils import FQName, parallel_map
+
+from .utils import CLITest
+
+
+class TestResolveCache(unittest.TestCase):
+
+    def test_resolve_cache(self):
+        cache = ResolveCache(size=2)
+        cache.add('foo', FQName('domain:foo'), 'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        self.assertEqual(cache.get_uuid('foo', 'domain:foo'),
+                         'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        self.assertEqual(cache.get_fq_name('a5a1b67b-4246-4e2d-aa24-479d8d47435d'),
+                         ('foo', FQName('domain:foo')))
+        self.assertIsNone(cache.get_uuid('bar', 'domain:foo'))
+
+        # lru eviction
+        cache.add('foo', FQName('domain:bar'), '2caf30aa-d197-40be-82dc-3bac4ca91adb')
+        cache.get_uuid('foo', 'domain:foo')
+        cache.add('foo', FQName('domain:foobar'), '5d085b74-2dcc-4180-8284-10a56f9ed318')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get_uuid('foo', 'domain:bar'))
+        self.assertIsNotNone(cache.get_uuid('foo', 'domain:foo'))
+
+        cache.invalidate('a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        self.assertIsNone(cache.get_uuid('foo', 'domain:foo'))
+
+    @mock.patch('contrail_api_cli.client.time')
+    def test_resolve_cache_ttl(self, mock_time):
+        mock_time.time.return_value = 100
+        cache = ResolveCache(ttl=10)
+        cache.add('foo', FQName('domain:foo'), 'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        mock_time.time.return_value = 105
+        self.assertIsNotNone(cache.get_uuid('foo', 'domain:foo'))
+        mock_time.time.return_value = 111
+        self.assertIsNone(cache.get_uuid('foo', 'domain:foo'))
+        self.assertEqual(len(cache), 0)
+
+        cache = ResolveCache(ttl=0)
+        cache.add('foo', FQName('domain:foo'), 'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        self.assertIsNone(cache.get_uuid('foo', 'domain:foo'))
+
+    def test_resolve_cache_persist(self):
+        tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(tmp_dir, 'cache.json')
+        try:
+            cache = ResolveCache(path=path)
+            cache.add('foo', FQName('domain:foo'), 'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+            cache.save()
+            cache = ResolveCache(path=path)
+            self.assertEqual(cache.get_uuid('foo', 'domain:foo'),
+                             'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = os.path.join(tempfile.mkdtemp(), 'tokens')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.dir))
+
+    def test_token_cache(self):
+        plugin = v3.Password(auth_url='http://keystone:5000/v3', username='admin',
+                             password='secret', project_name='admin',
+                             user_domain_id='default', project_domain_id='default')
+        plugin.get_auth_state = mock.Mock(return_value=None)
+        plugin.set_auth_state = mock.Mock()
+        cache = TokenCache(plugin, self.dir)
+        self.assertEqual(os.path.dirname(cache.path), self.dir)
+        # no token yet
+        cache.load()
+        cache.save()
+        self.assertFalse(os.path.exists(self.dir))
+
+        plugin.get_auth_state.return_value = '{"auth_token": "foo"}'
+        cache.save()
+        self.assertEqual(os.stat(cache.path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.stat(self.dir).st_mode & 0o777, 0o700)
+
+        # tokens are shared by plugins with the same auth url, user and project
+        other = TokenCache(v3.Password(auth_url='http://keystone:5000/v3', username='admin',
+                                       password='secret', project_name='admin',
+                                       user_domain_id='default', project_domain_id='default'),
+                           self.dir)
+        self.assertEqual(other.path, cache.path)
+        other.plugin.set_auth_state = mock.Mock()
+        other.load()
+        other.plugin.set_auth_state.assert_called_once_with('{"auth_token": "foo"}')
+        other = TokenCache(v3.Password(auth_url='http://keystone:5000/v3', username='admin',
+                                       password='secret', project_name='demo',
+                                       user_domain_id='default', project_domain_id='default'),
+                           self.dir)
+        self.assertNotEqual(other.path, cache.path)
+
+        # basic auth is not cached
+        self.assertEqual(TokenCache(HTTPAuth('foo', 'bar'), self.dir).path, None)
+
+
+class TestConcurrencyGovernor(unittest.TestCase):
+
+    def test_aimd(self):
+        governor = ConcurrencyGovernor(initial=2, maximum=4)
+        for _ in range(3):
+            governor.success(0.1)
+        self.assertEqual(int(governor.limit), 3)
+        governor.failure('HTTP 503')
+        self.assertEqual(int(governor.limit), 1)
+        self.assertEqual(governor.throttled, 1)
+        # only one decrease per latency period
+        governor.failure('HTTP 503')
+        self.assertEqual(governor.throttled, 1)
+        for _ in range(20):
+            governor.success(0.1)
+        self.assertEqual(int(governor.limit), 4)
+        # sustained latency increase
+        governor._last_decrease = 0
+        for _ in range(governor.slow_samples - 1):
+            governor.success(10)
+        self.assertEqual(int(governor.limit), 4)
+        governor.success(10)
+        self.assertEqual(int(governor.limit), 2)
+
+    @mock.patch('contrail_api_cli.client.time')
+    def test_mixed_latencies(self, mock_time):
+        mock_time.time.return_value = 0
+        governor = ConcurrencyGovernor(maximum=50)
+        self.assertEqual(int(governor.limit), 50)
+        random.seed(0)
+        # fast resolutions followed by slower detail GETs
+        # with some jitter
+        for _ in range(10):
+            mock_time.time.return_value += 0.005
+            governor.success(0.005, 'POST /fqname-to-id')
+        for i in range(5000):
+            latency = random.uniform(0.02, 0.2)
+            mock_time.time.return_value += latency
+            governor.success(latency, 'GET /foo/{uuid}')
+            if i % 10 == 0:
+                governor.success(0.005, 'POST /fqname-to-id')
+        self.assertEqual(governor.throttled, 0)
+        self.assertEqual(int(governor.limit), 50)
+        # an overloaded server still lowers the limit
+        for _ in range(20):
+            mock_time.time.return_value += 5
+            governor.success(5, 'GET /foo/{uuid}')
+        self.assertGreater(governor.throttled, 0)
+        self.assertLess(int(governor.limit), 50)
+        # and the limit grows again when it recovers
+        limit = governor.limit
+        for _ in range(200):
+            mock_time.time.return_value += 0.05
+            governor.success(0.05, 'GET /foo/{uuid}')
+        self.assertGreater(governor.limit, limit)
+
+    def test_limit(self):
+        governor = ConcurrencyGovernor(initial=2, maximum=2)
+        running = []
+
+        def work(i):
+            governor.acquire()
+            running.append(governor.active)
+            gevent.sleep(0.01)
+            governor.release()
+
+        parallel_map(work, range(6))
+        self.assertEqual(max(running), 2)
+        self.assertEqual(governor.active, 0)
+
+
+class TestAPIServerPool(unittest.TestCase):
+
+    def test_least_outstanding(self):
+        pool = APIServerPool(['http://a:8082', 'http://b:8082'])
+        a, b = pool.servers
+        self.assertEqual(pool.path('http://b:8082/foos'), '/foos')
+        self.assertEqual(pool.path('http://c:5000/v3'), None)
+        self.assertIs(pool.acquire(), a)
+        self.assertIs(pool.acquire(), b)
+        self.assertIs(pool.acquire(), a)
+        pool.release(b)
+        self.assertIs(pool.acquire(), b)
+        pool.release(a)
+        pool.release(b)
+        pool.release(a)
+        # same outstanding requests, least used server
+        pool.acquire()
+        self.assertIs(pool.acquire(), b)
+
+    @mock.patch('contrail_api_cli.client.time.time')
+    def test_ejection(self, mock_time):
+        mock_time.return_value = 100
+        pool = APIServerPool(['http://a:8082', 'http://b:8082'], ejection_time=30)
+        a, b = pool.servers
+        for _ in range(APIServerPool.max_failures):
+            pool.release(pool.acquire(), failed=False)
+            pool.release(pool.acquire(), failed=True)
+        self.assertEqual((b.ejections, b.errors), (1, 2))
+        self.assertEqual([pool.acquire() for _ in range(3)], [a, a, a])
+        # all servers ejected, use the first one back
+        a.ejected_until = 140
+        self.assertIs(pool.acquire(), b)
+        mock_time.return_value = 131
+        self.assertIs(pool.acquire(), b)
+
+
+class TestRequestStats(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([1], 95), 1)
+        self.assertEqual(percentile([], 95), None)
+
+    def test_stats(self):
+        stats = RequestStats()
+        stats.record('GET /foos', 200, 0.1)
+        stats.record('GET /foos', 200, 0.3)
+        stats.record('GET /foos', 503, 0.2)
+        stats.record('GET /foo/{uuid}', 'ConnectFailure', 0.5)
+        stats.record_bytes('GET /foos', 100, 400)
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats['GET /foos'].errors, 1)
+        self.assertEqual(stats['GET /foos'].percentiles(50, 99), [0.2, 0.3])
+        self.assertEqual(stats['GET /foo/{uuid}'].errors, 1)
+        self.assertEqual((stats.bytes_received, stats.bytes_decoded), (100, 400))
+        lines = stats.format().splitlines()
+        self.assertEqual(lines[1].split(),
+                         ['GET', '/foos', '3', '1', '200.0', '300.0', '300.0',
+                          '100', '400', '200:2', '503:1'])
+        stats.reset()
+        self.assertEqual(stats.count, 0)
+
+
+class TestSession(CLITest):
+
+    def test_resolve_cache(self):
+        session = ContrailAPISession()
+        session.post = mock.MagicMock()
+        session.post.return_value.content = json.dumps({
+            'type': 'foo',
+            'fq_name': ['domain', 'foo'],
+            'uuid': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d'
+        })
+        self.assertEqual(session.fqname_to_id(FQName('domain:foo'), 'foo'),
+                         'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        self.assertEqual(session.fqname_to_id(FQName('domain:foo'), 'foo'),
+                         'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        self.assertEqual(session.post.call_count, 1)
+        self.assertEqual(session.id_to_fqname('a5a1b67b-4246-4e2d-aa24-479d8d47435d')['fq_name'],
+                         FQName('domain:foo'))
+        self.assertEqual(session.post.call_count, 1)
+
+        # deleted resources are removed from the cache
+        r = Resource('foo', uuid='a5a1b67b-4246-4e2d-aa24-479d8d47435d', session=session)
+        r.emit('deleted', r)
+        session.fqname_to_id(FQName('domain:foo'), 'foo')
+        self.assertEqual(session.post.call_count, 2)
+
+    def test_resolve_cache_check(self):
+        session = ContrailAPISession()
+        session.post = mock.MagicMock()
+        session.post.return_value.content = json.dumps({
+            'uuid': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d'
+        })
+        self.assertEqual(session.fqname_to_id(FQName('domain:foo'), 'foo'),
+                         'a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        self.assertEqual(session.post.call_count, 1)
+        r = Resource('foo', fq_name='domain:foo', session=session)
+        # path resolution uses the cache
+        r.check(cache=True)
+        self.assertEqual(session.post.call_count, 1)
+        # existence checks don't
+        self.assertTrue(r.exists)
+        self.assertEqual(session.post.call_count, 2)
+
+        # deleted by another client
+        session.post.side_effect = HttpError(http_status=404)
+        self.assertFalse(Resource('foo', fq_name='domain:foo', session=session).exists)
+        self.assertFalse(Resource('foo', uuid='a5a1b67b-4246-4e2d-aa24-479d8d47435d',
+                                  session=session).exists)
+        self.assertEqual(session.post.call_count, 4)
+        self.assertIsNone(session.resolve_cache.get_uuid('foo', FQName('domain:foo')))
+
+    def test_session_not_referenced(self):
+        session = ContrailAPISession()
+        ref = weakref.ref(session)
+        del session
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_bulk_resolve(self):
+        session = ContrailAPISession()
+        session.get = mock.MagicMock()
+        session.get.return_value.content = json.dumps({
+            'foos': [
+                {'uuid': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d',
+                 'fq_name': ['domain', 'foo']},
+                {'uuid': '2caf30aa-d197-40be-82dc-3bac4ca91adb',
+                 'fq_name': ['domain', 'bar']}
+            ]
+        })
+        result = session.ids_to_fqnames(['a5a1b67b-4246-4e2d-aa24-479d8d47435d',
+                                         '5d085b74-2dcc-4180-8284-10a56f9ed318'], 'foo')
+        self.assertEqual(result, {'a5a1b67b-4246-4e2d-aa24-479d8d47435d': FQName('domain:foo')})
+        session.get.assert_called_once_with(
+            session.make_url('/foos'),
+            params={'obj_uuids': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d,5d085b74-2dcc-4180-8284-10a56f9ed318'})
+
+        # resolutions are cached
+        session.post = mock.MagicMock()
+        session.post.side_effect = HttpError(http_status=404)
+        self.assertEqual(session.fqnames_to_ids(['domain:foo', 'domain:foobar'], 'foo'),
+                         {'domain:foo': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d'})
+        self.assertEqual(session.post.call_count, 1)
+
+    def test_resource_cache(self):
+        session = ContrailAPISession(resource_cache=True, resource_cache_max_age=0)
+        url = session.make_url('/foo/a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        params = {'exclude_back_refs': True, 'exclude_children': True}
+        body = {'foo': {'uuid': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d',
+                        'id_perms': {'last_modified': '2018-01-01T00:00:00.000000'}}}
+        list_body = {'foos': [{'uuid': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d',
+                               'id_perms': {'last_modified': '2018-01-01T00:00:00.000000'}}]}
+
+        def response(data):
+            return mock.Mock(content=json.dumps(data))
+
+        session.get = mock.MagicMock()
+        session.get.side_effect = [response(body), response(list_body)]
+        self.assertEqual(session.get_json(url, **params), body)
+        # resource not modified, only id_perms are fetched
+        self.assertEqual(session.get_json(url, **params), body)
+        session.get.assert_called_with(session.make_url('/foos'),
+                                       params={'obj_uuids': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d',
+                                               'fields': 'id_perms'})
+        self.assertEqual(session.resource_cache.hits, 1)
+
+        # resource modified, fetch it again
+        list_body['foos'][0]['id_perms']['last_modified'] = '2018-01-02T00:00:00.000000'
+        session.get.side_effect = [response(list_body), response(body)]
+        session.get_json(url, **params)
+        session.get.assert_called_with(url, params=params)
+        self.assertEqual(session.resource_cache.stale, 1)
+
+        # no revalidation before max_age
+        session.resource_cache.max_age = 60
+        session.get.reset_mock()
+        session.get_json(url, **params)
+        self.assertFalse(session.get.called)
+
+        # back_refs and children are not cached
+        session.get.side_effect = [response(body), response(body)]
+        session.get_json(url)
+        session.get_json(url)
+        self.assertEqual(session.get.call_count, 2)
+
+    def test_resource_cache_batch(self):
+        session = ContrailAPISession(resource_cache=True, resource_cache_max_age=0)
+        params = {'exclude_back_refs': True, 'exclude_children': True}
+        uuids = ['a5a1b67b-4246-4e2d-aa24-479d8d47435d',
+                 '2caf30aa-d197-40be-82dc-3bac4ca91adb',
+                 '5d085b74-2dcc-4180-8284-10a56f9ed318']
+        id_perms = {'last_modified': '2018-01-01T00:00:00.000000'}
+
+        def get(url, params=None):
+            if 'obj_uuids' in params:
+                data = {'foos': [{'uuid': u, 'id_perms': id_perms}
+                                 for u in params['obj_uuids'].split(',')]}
+            else:
+                data = {'foo': {'uuid': url.split('/')[-1], 'id_perms': id_perms}}
+            return mock.Mock(content=json.dumps(data))
+
+        session.get = mock.MagicMock(side_effect=get)
+        for uuid in uuids:
+            session.get_json(session.make_url('/foo/%s' % uuid), **params)
+        session.get.reset_mock()
+        # stale resources fetched concurrently are revalidated
+        # with one request
+        results = parallel_map(lambda u: session.get_json(session.make_url('/foo/%s' % u),
+                                                          **params),
+                               uuids)
+        self.assertEqual([r['foo']['uuid'] for r in results], uuids)
+        session.get.assert_called_once_with(session.make_url('/foos'),
+                                            params={'obj_uuids': ','.join(uuids),
+                                                    'fields': 'id_perms'})
+        self.assertEqual(session.resource_cache.hits, 3)
+
+    def test_coalesce_requests(self):
+        session = ContrailAPISession()
+        url = session.make_url('/foo/a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+
+        def get(url, params=None):
+            gevent.sleep(0.01)
+            return mock.Mock(content=json.dumps({'foo': {'params': params}}))
+
+        session.get = mock.MagicMock(side_effect=get)
+        results = parallel_map(lambda p: session.get_json(url, **p),
+                               [{}, {}, {'exclude_back_refs': True}, {}])
+        self.assertEqual(session.get.call_count, 2)
+        self.assertEqual(session.coalesced, 2)
+        self.assertEqual(results[0], results[1])
+        self.assertIsNot(results[0], results[1])
+        self.assertEqual(results[2], {'foo': {'params': {'exclude_back_refs': True}}})
+
+        # errors are propagated to all callers
+        session.get.side_effect = HttpError(http_status=503)
+        with self.assertRaises(HttpError):
+            parallel_map(lambda p: session.get_json(url), [1, 2])
+
+    def test_coalesce_errors(self):
+        session = ContrailAPISession()
+        url = session.make_url('/foo/a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+
+        def get(url, params=None):
+            gevent.sleep(0.01)
+            raise HttpError(message='Not Found', details='foo not found', http_status=404)
+
+        session.get = mock.MagicMock(side_effect=get)
+
+        def get_json(_):
+            try:
+                session.get_json(url)
+            except HttpError as e:
+                return (str(e), e.details)
+        errors = parallel_map(get_json, [1, 2, 3])
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual(session.coalesced, 2)
+        self.assertEqual(errors, [('foo not found (HTTP 404)', 'Not Found (HTTP 404)')] * 3)
+
+    @mock.patch('contrail_api_cli.client.gevent.sleep')
+    @mock.patch('keystoneauth1.session.Session.request')
+    def test_retry(self, mock_request, mock_sleep):
+        session = ContrailAPISession()
+        session.retries = 2
+        url = session.make_url('/foo/a5a1b67b-4246-4e2d-aa24-479d8d47435d')
+        ok = mock.Mock(content=b'{}', status_code=200)
+
+        mock_request.side_effect = [HttpError(http_status=503), ok]
+        response = session.request(url, 'GET')
+        self.assertEqual(response.retries, 1)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+        # give up after max retries
+        mock_request.side_effect = HttpError(http_status=503)
+        with self.assertRaises(HttpError) as cm:
+            session.request(url, 'GET')
+        self.assertEqual(cm.exception.retries, 2)
+        self.assertEqual(session.retried, 3)
+        self.assertEqual(session.stats['GET /foo/{uuid}'].status, {503: 4, 200: 1})
+        self.assertIn('requests: 5, retried: 3', session.format_stats())
+        session.reset_stats()
+        self.assertEqual(session.retried, 0)
+
+        # client errors are not retried
+        mock_request.reset_mock()
+        mock_request.side_effect = HttpError(http_status=404)
+        with self.assertRaises(HttpError):
+            session.request(url, 'GET')
+        self.assertEqual(mock_request.call_count, 1)
+
+        # read only POST are retried, others only on demand
+        mock_request.reset_mock()
+        mock_request.side_effect = [HttpError(http_status=502), ok]
+        self.assertEqual(session.request(session.make_url('/fqname-to-id'), 'POST').retries, 1)
+        mock_request.side_effect = HttpError(http_status=502)
+        with self.assertRaises(HttpError) as cm:
+            session.request(session.make_url('/ref-update'), 'POST')
+        self.assertEqual(cm.exception.retries, 0)
+        session.retry_posts = True
+        mock_request.side_effect = [HttpError(http_status=502), ok]
+        self.assertEqual(session.request(session.make_url('/ref-update'), 'POST').retries, 1)
+
+    @mock.patch('keystoneauth1.session.Session.request')
+    def test_compression(self, mock_request):
+        session = ContrailAPISession()
+        self.assertEqual(session.session.headers['Accept-Encoding'], 'gzip, deflate')
+        self.assertEqual(ContrailAPISession(compression=False).session.headers['Accept-Encoding'],
+                         'identity')
+
+        data = {'foos': [{'uuid': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d'}] * 100}
+        body = json.dumps(data).encode('utf-8')
+        compressed = io.BytesIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as f:
+            f.write(body)
+
+        def response(*args, **kwargs):
+            r = requests.Response()
+            r.status_code = 200
+            r.raw = HTTPResponse(body=io.BytesIO(compressed.getvalue()),
+                                 headers={'Content-Encoding': 'gzip'},
+                                 preload_content=False, decode_content=True)
+            return r
+
+        mock_request.side_effect = response
+        self.assertEqual(session.get_json(session.make_url('/foos')), data)
+        self.assertEqual(session.stats['GET /foos'].status, {200: 1})
+        self.assertEqual(session.stats.bytes_decoded, len(body))
+        self.assertEqual(session.stats.bytes_received, len(compressed.getvalue()))
+
+        self.assertEqual(list(session.get_json_stream(session.make_url('/foos'))),
+                         [('foos', f) for f in data['foos']])
+        self.assertEqual(session.stats.bytes_decoded, 2 * len(body))
+        self.assertEqual(session.stats.bytes_received, 2 * len(compressed.getvalue()))
+
+    @mock.patch('keystoneauth1.session.Session.request')
+    def test_json_stream_close(self, mock_request):
+        session = ContrailAPISession()
+        session.stream_chunk_size = 100
+        data = {'foos': [{'uuid': 'a5a1b67b-4246-4e2d-aa24-479d8d47435d'}] * 100}
+        responses = []
+
+        def response(*args, **kwargs):
+            r = requests.Response()
+            r.status_code = 200
+            r.raw = HTTPResponse(body=io.BytesIO(json.dumps(data).encode('utf-8')),
+                                 preload_content=False)
+            r.close = mock.Mock(side_effect=r.close)
+            responses.append(r)
+            return r
+
+        mock_request.side_effect = response
+        self.assertEqual(len(list(session.get_json_stream(session.make_url('/foos')))), 100)
+        responses[0].close.assert_called_once_with()
+        self.assertTrue(responses[0]._content_consumed)
+
+        stream = session.get_json_stream(session.make_url('/foos'))
+        self.assertEqual(next(stream), ('foos', data['foos'][0]))
+        stream.close()
+        responses[1].close.assert_called_once_with()
+        self.assertFalse(responses[1]._content_consumed)
+        self.assertTrue(responses[1].raw.closed)
+
+    @mock.patch('contrail_api_cli.client.gevent.sleep')
+    @mock.patch('keystoneauth1.session.Session.request')
+    def test_multiple_hosts(self, mock_request, mock_sleep):
+        session = ContrailAPISession(host='a,b')
+        self.assertEqual(session.host, 'a')
+        self.assertEqual(session.base_url, 'http://a:8082')
+
+        def request(url, method, **kwargs):
+            if url.startswith('http://b:8082'):
+                raise ConnectFailure()
+            return mock.Mock(content=('{"url": "%s"}' % url).encode('utf-8'), status_code=200)
+
+        mock_request.side_effect = request
+        # requests failing on b are retried on a
+        for _ in range(4):
+            self.assertEqual(session.get_json('http://b:8082/foos'), {'url': 'http://a:8082/foos'})
+        self.assertEqual(session.retried, 2)
+        b = session.servers.servers[1]
+        self.assertEqual((b.requests, b.ejections), (2, 1))
+        self.assertIn('http://b:8082: 2 requests, 2 errors, ejected 1 times',
+                      session.format_stats())
+        self.assertEqual(session.stats['GET /foos'].count, 6)
@@ -1,13 +1,17 @@
 from __future__ import unicode_literals
+import re
 import sys
 import unittest
 import uuid
 import io
+from collections import OrderedDict
 try:
     import mock
 except ImportError:
     import unittest.mock as mock
 
+from six import text_type
+
 import contrail_api_cli.command as cmds
 from contrail_api_cli import client
 from contrail_api_cli.utils import Path, FQName
@@ -20,6 +24,70 @@ from contrail_api_cli.manager import CommandManager
 from .utils import CLITest
 
 
+def mock_resources(session, base, resources):
+    """Make the session list resources like the API server
+
+    :param resources: resources dicts by type
+    :type resources: OrderedDict {type: [dict]}
+    """
+    def get_json(url, **params):
+        if url.rstrip('/') == base:
+            return {'href': base,
+                    'links': [{'link': {'href': '%s/%ss' % (base, type),
+                                        'name': type,
+                                        'rel': 'collection'}}
+                              for type in resources]}
+        type = url.split('/')[-1][:-1]
+        result = list(resources[type])
+        if 'obj_uuids' in params:
+            uuids = params['obj_uuids'].split(',')
+            result = [r for r in result if r['uuid'] in uuids]
+        if 'parent_id' in params:
+            uuids = params['parent_id'].split(',')
+            result = [r for r in result if r.get('parent_uuid') in uuids]
+        if 'back_ref_id' in params:
+            uuids = params['back_ref_id'].split(',')
+            result = [r for r in result
+                      if any(ref['uuid'] in uuids
+                             for k, refs in r.items() if k.endswith('_refs')
+                             for ref in refs)]
+        if params.get('count'):
+            return {'%ss' % type: {'count': len(result)}}
+        data = {}
+        if 'page_limit' in params:
+            uuids = [r['uuid'] for r in result]
+            marker = params.get('page_marker')
+            start = uuids.index(marker) + 1 if marker in uuids else 0
+            end = start + params['page_limit']
+            data['marker'] = uuids[end - 1] if end < len(uuids) else None
+            result = result[start:end]
+        data['%ss' % type] = result
+        return data
+
+    def get_json_stream(url, **params):
+        return ((key, res)
+                for key, value in get_json(url, **params).items()
+                if isinstance(value, list)
+                for res in value)
+
+    session.configure_mock(base_url=base)
+    session.make_url.side_effect = lambda uri: base + uri
+    session.get_json.side_effect = get_json
+    session.get_json_stream.side_effect = get_json_stream
+
+
+def resource(type, fq_name, parent=None, **kwargs):
+    data = dict(kwargs, uuid=text_type(uuid.uuid4()), fq_name=fq_name.split(':'))
+    if parent is not None:
+        data['parent_type'] = parent[0]
+        data['parent_uuid'] = parent[1]['uuid']
+    return data
+
+
+def ref(r):
+    return {'uuid': r['uuid'], 'to': r['fq_name']}
+
+
 class Cmd(cmds.Command):
     description = "Not a real command"
 
@@ -194,6 +262,7 @@ bar/ffe8de43-a141-4336-8d70-bf970813bbf7"""
     def test_resource_cat(self, mock_session, mock_highlight_json):
         # bind original method to mock_session
         mock_session.id_to_fqname = client.ContrailAPISession.id_to_fqname.__get__(mock_session)
+        mock_session.resolve_cache = client.ResolveCache()
         mock_session.make_url = client.ContrailAPISession.make_url.__get__(mock_session)
 
         # called by id_to_fqname
@@ -275,6 +344,10 @@ bar/ffe8de43-a141-4336-8d70-bf970813bbf7"""
         Context().shell.current_path = Path('/')
         result = self.mgr.get('du')(paths=['foo'])
         self.assertEqual(result, '3')
+        # count is cached
+        self.assertEqual(mock_session.get_json.call_count, 1)
+        result = self.mgr.get('du')(paths=['foo'], refresh=True)
+        self.assertEqual(mock_session.get_json.call_count, 2)
 
         Context().shell.current_path = Path('/foo/%s' % uuid.uuid4())
         with self.assertRaises(CommandError):
@@ -299,8 +372,14 @@ bar/ffe8de43-a141-4336-8d70-bf970813bbf7"""
         Context().shell.current_path = Path('/foo')
         ts = ['6b6a7f47-807e-4c39-8ac6-3adcf2f5498f',
               '22916187-5b6f-40f1-b7b6-fc6fe9f23bce']
+        mock_session.ids_to_fqnames.return_value = {
+            '6b6a7f47-807e-4c39-8ac6-3adcf2f5498f': FQName('foo:1'),
+            '22916187-5b6f-40f1-b7b6-fc6fe9f23bce': FQName('foo:2')
+        }
         mock_session.delete.return_value = True
         self.mgr.get('rm')(paths=ts, force=True)
+        mock_session.ids_to_fqnames.assert_called_once_with(ts, 'foo')
+        self.assertFalse(mock_session.id_to_fqname.called)
         mock_session.delete.assert_has_calls([
             mock.call(self.BASE + '/foo/22916187-5b6f-40f1-b7b6-fc6fe9f23bce'),
             mock.call(self.BASE + '/foo/6b6a7f47-807e-4c39-8ac6-3adcf2f5498f')
@@ -423,8 +502,9 @@ bar/ffe8de43-a141-4336-8d70-bf970813bbf7"""
         mock_session.delete.assert_has_calls(expected_calls)
 
     @mock.patch('contrail_api_cli.resource.Context.session')
+    @mock.patch('contrail_api_cli.commands.shell.CompletionIndex')
     @mock.patch('contrail_api_cli.commands.shell.prompt')
-    def test_pipes(self, mock_prompt, mock_session):
+    def test_pipes(self, mock_prompt, mock_index, mock_session):
         old_stdout = sys.stdout
         out = io.BytesIO()
         sys.stdout = out
@@ -439,8 +519,9 @@ bar/ffe8de43-a141-4336-8d70-bf970813bbf7"""
         self.assertEqual(result, b'piped\nnot piped\n')
 
     @mock.patch('contrail_api_cli.resource.Context.session')
+    @mock.patch('contrail_api_cli.commands.shell.CompletionIndex')
     @mock.patch('contrail_api_cli.commands.shell.prompt')
-    def test_shell_args(self, mock_prompt, mock_session):
+    def test_shell_args(self, mock_prompt, mock_index, mock_session):
         old_stdout = sys.stdout
         out = io.BytesIO()
         sys.stdout = out
@@ -470,6 +551,153 @@ bar/ffe8de43-a141-4336-8d70-bf970813bbf7"""
             self.mgr.get('ln')(resources=['foo/9174e7d3-865b-4faf-ab0f-c083e43fee6d', r1.path])
         Context().schema = DummySchema()
 
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_du_collections(self, mock_session):
+        foo = resource('foo', 'foo')
+        resources = OrderedDict([
+            ('foo', [foo]),
+            ('bar', [resource('bar', 'foo:bar%d' % i, parent=('foo', foo)) for i in range(3)]),
+            ('foobar', []),
+        ])
+        mock_resources(mock_session, self.BASE, resources)
+        Context().shell.current_path = Path('/')
+
+        self.assertEqual(self.mgr.get('du')(paths=['/']), '1 foo\n3 bar\n0 foobar')
+        # list collections, count each of them
+        self.assertEqual(mock_session.get_json.call_count, 4)
+        self.assertEqual(self.mgr.get('du')(paths=['*']), '1 foo\n3 bar\n0 foobar')
+        # counts are cached
+        self.assertEqual(mock_session.get_json.call_count, 5)
+        self.assertEqual(len(Collection('bar', parent_uuid=foo['uuid'])), 3)
+        self.assertEqual(mock_session.get_json.call_count, 6)
+
+        self.assertFalse(Collection('bar'))
+        self.assertTrue(Collection('bar', fetch=True))
+        self.assertEqual(mock_session.get_json.call_count, 7)
+
+        # saved through the session
+        bar = resource('bar', 'foo:bar3', parent=('foo', foo))
+        resources['bar'].append(bar)
+        Resource.emit('saved', Resource('bar', **bar))
+        self.assertEqual(self.mgr.get('du')(paths=['bar', 'foo']), '4 bar\n1 foo')
+        # deleted by another client
+        resources['bar'].remove(bar)
+        self.assertEqual(self.mgr.get('du')(paths=['bar']), '4')
+        self.assertEqual(self.mgr.get('du')(paths=['bar'], refresh=True), '3')
+
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_du_paging(self, mock_session):
+        foo = resource('foo', 'foo')
+        resources = OrderedDict([
+            ('foo', [foo]),
+            ('bar', [resource('bar', 'foo:bar%d' % i, parent=('foo', foo)) for i in range(10)]),
+        ])
+        mock_resources(mock_session, self.BASE, resources)
+        Context().shell.current_path = Path('/')
+        with mock.patch.object(DummySchema, 'version', new_callable=mock.PropertyMock) as version:
+            version.return_value = '4.1'
+            self.assertEqual(self.mgr.get('du')(paths=['bar'], page_size=4), '10')
+            self.assertEqual(mock_session.get_json.call_count, 3)
+            self.assertEqual(self.mgr.get('du')(paths=['bar'], limit=4), '4')
+            self.assertEqual(len(self.mgr.get('ls')(paths=['bar'], page_size=4, limit=5).split('\n')), 5)
+
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_du_group_by(self, mock_session):
+        foos = [resource('foo', 'foo%d' % i) for i in range(3)]
+        bars = []
+        for i in range(6):
+            bar = resource('bar', 'foo%d:bar%d' % (i % 2, i), parent=('foo', foos[i % 2]),
+                           bar_prop={'value': i % 3})
+            if i:
+                bar['foo_refs'] = [ref(foos[i % 3])]
+            bars.append(bar)
+        resources = OrderedDict([('foo', foos), ('bar', bars)])
+        mock_resources(mock_session, self.BASE, resources)
+        Context().shell.current_path = Path('/')
+
+        self.assertEqual(self.mgr.get('du')(paths=['bar'], group_by='parent'),
+                         '3  foo0\n3  foo1')
+        self.assertEqual(self.mgr.get('du')(paths=['bar'], group_by='foo_refs.to'),
+                         '2  foo1\n2  foo2\n1  _\n1  foo0')
+        self.assertEqual(self.mgr.get('du')(paths=['bar'], group_by='bar_prop.value', top=2),
+                         '2  0\n2  1')
+        self.assertEqual(self.mgr.get('du')(paths=['foo', 'bar'], group_by='parent'),
+                         '3  foo  _\n3  bar  foo0\n3  bar  foo1')
+
+    def _tree_nodes(self, tree, resources):
+        names = dict((r['uuid'], ':'.join(r['fq_name']))
+                     for rs in resources.values() for r in rs)
+        return [names[u] for u in re.findall(r'/([0-9a-f-]{36})', tree)]
+
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_tree(self, mock_session):
+        foo = resource('foo', 'foo')
+        bar1 = resource('bar', 'foo:bar1', parent=('foo', foo))
+        bar2 = resource('bar', 'foo:bar2', parent=('foo', foo), bar_refs=[ref(bar1)])
+        foobar = resource('foobar', 'foobar', foo_refs=[ref(foo)], bar_refs=[ref(bar2)])
+        resources = OrderedDict([('foo', [foo]), ('bar', [bar1, bar2]), ('foobar', [foobar])])
+        mock_resources(mock_session, self.BASE, resources)
+        Context().shell.current_path = Path('/')
+
+        tree = self.mgr.get('tree')(paths=['foo/%s' % foo['uuid']])
+        # back_refs then children, bar2 is expanded under bar1 and foo
+        self.assertEqual(self._tree_nodes(tree, resources),
+                         ['foo', 'foobar', 'foo:bar1', 'foo:bar2', 'foobar', 'foo:bar2', 'foobar'])
+        # 3 types of back_refs and children for 2 levels
+        self.assertEqual(mock_session.get_json.call_count, 12)
+
+        tree = self.mgr.get('tree')(paths=['foobar/%s' % foobar['uuid']], reverse=True)
+        self.assertEqual(self._tree_nodes(tree, resources),
+                         ['foobar', 'foo', 'foo:bar2', 'foo:bar1', 'foo', 'foo'])
+        tree = self.mgr.get('tree')(paths=['foobar/%s' % foobar['uuid']], reverse=True, depth=1)
+        self.assertEqual(self._tree_nodes(tree, resources), ['foobar', 'foo', 'foo:bar2'])
+        tree = self.mgr.get('tree')(paths=['foo/%s' % foo['uuid']], depth=0)
+        self.assertEqual(self._tree_nodes(tree, resources), ['foo'])
+
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_tree_shared_child(self, mock_session):
+        foo = resource('foo', 'foo')
+        bar1 = resource('bar', 'foo:bar1', parent=('foo', foo))
+        bar2 = resource('bar', 'foo:bar2', parent=('foo', foo))
+        # foobar refs bar1 and bar2 and has a child
+        foobar = resource('foobar', 'foobar', bar_refs=[ref(bar1), ref(bar2)])
+        bar3 = resource('bar', 'foobar:bar3', parent=('foobar', foobar))
+        resources = OrderedDict([('foo', [foo]), ('bar', [bar1, bar2, bar3]), ('foobar', [foobar])])
+        mock_resources(mock_session, self.BASE, resources)
+        Context().shell.current_path = Path('/')
+
+        tree = self.mgr.get('tree')(paths=['foo/%s' % foo['uuid']])
+        # foobar is shown with its child under bar1 and bar2
+        self.assertEqual(self._tree_nodes(tree, resources),
+                         ['foo', 'foo:bar1', 'foobar', 'foobar:bar3',
+                          'foo:bar2', 'foobar', 'foobar:bar3'])
+        # 3 types of back_refs and children for 4 levels
+        self.assertEqual(mock_session.get_json.call_count, 24)
+
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_tree_several_roots(self, mock_session):
+        foo = resource('foo', 'x')
+        bar = resource('bar', 'x')
+        bar1 = resource('bar', 'x:bar1', parent=('foo', foo))
+        bar2 = resource('bar', 'x:bar1:bar2', parent=('bar', bar1))
+        bar3 = resource('bar', 'x:bar1:bar2:bar3', parent=('bar', bar2))
+        resources = OrderedDict([('foo', [foo]), ('bar', [bar, bar1, bar2, bar3]), ('foobar', [])])
+        mock_resources(mock_session, self.BASE, resources)
+        Context().shell.current_path = Path('/')
+
+        # children are matched with their parent by uuid,
+        # bar1 is not a child of bar which has the same fq_name as foo
+        tree = self.mgr.get('tree')(paths=['foo/%s' % foo['uuid'], 'bar/%s' % bar['uuid']],
+                                    depth=1)
+        self.assertEqual(self._tree_nodes(tree, resources), ['x', 'x:bar1', 'x'])
+        # bar2 is at the depth limit in the tree of foo but
+        # is expanded in the tree of bar1
+        tree = self.mgr.get('tree')(paths=['foo/%s' % foo['uuid'], 'bar/%s' % bar1['uuid']],
+                                    depth=2)
+        self.assertEqual(self._tree_nodes(tree, resources),
+                         ['x', 'x:bar1', 'x:bar1:bar2',
+                          'x:bar1', 'x:bar1:bar2', 'x:bar1:bar2:bar3'])
+
     def test_schema(self):
         self.mgr.get('schema')(schema_version='2.21')
         self.mgr.get('schema')(schema_version='2.21', resource_name='virtual-network')
@@ -11,7 +11,7 @@ from prompt_toolkit.document import Document
 
 from contrail_api_cli.context import Context
 from contrail_api_cli.completer import ShellCompleter
-from contrail_api_cli.resource import Resource
+from contrail_api_cli.resource import Resource, ResourceCache
 from contrail_api_cli.exceptions import ResourceNotFound
 
 from .utils import CLITest
@@ -19,6 +19,10 @@ from .utils import CLITest
 
 class TestCompleter(CLITest):
 
+    def setUp(self):
+        super(TestCompleter, self).setUp()
+        ResourceCache().clear()
+
     @mock.patch('contrail_api_cli.resource.Context.session')
     def test_add_del_resource(self, mock_session):
         mock_document = Document(text='cat bar')
@@ -106,6 +110,56 @@ class TestCompleter(CLITest):
         completions = list(comp.get_completions(mock_document, None))
         self.assertEqual(len(completions), 0)
 
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_cache_eviction(self, mock_session):
+        cache = ResourceCache()
+        self.assertIs(cache, ResourceCache())
+        self.addCleanup(setattr, cache, 'max_items', cache.max_items)
+        cache.max_items = 2
+        cache.reset_stats()
+
+        r1 = Resource('foo', uuid='d8eb36b4-9c57-49c5-9eac-95bedc90eb9a')
+        r2 = Resource('foo', uuid='7413a49b-4f17-4340-b93f-7e03b29b5a9d')
+        Resource('foo', uuid='4c6d3711-61f1-4505-b8df-189d32b52872')
+        self.assertEqual(len(cache), 2)
+        # r1 is evicted but still referenced, searched
+        # items are moved at the end of the LRU
+        self.assertEqual(cache.search_resources(['/foo/d8eb']), [r1])
+        self.assertEqual(cache.search_resources(['/foo/7413']), [r2])
+        # the third resource is evicted and garbage collected
+        self.assertEqual(cache.search_resources(['/foo/4c6d']), [])
+        self.assertEqual(cache.search_resources(['/foo/']), [r2, r1])
+        self.assertEqual(cache.stats, {'size': 2, 'keys': 2, 'hits': 3,
+                                       'misses': 1, 'evictions': 3})
+
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_substring_completion(self, mock_session):
+        comp = ShellCompleter()
+        cache = ResourceCache()
+        r1 = Resource('bar', uuid='d8eb36b4-9c57-49c5-9eac-95bedc90eb9a',
+                      fq_name='default-domain:admin:net1')
+        r2 = Resource('bar', uuid='7413a49b-4f17-4340-b93f-7e03b29b5a9d',
+                      fq_name='default-domain:demo:net2')
+        Resource('foo', uuid='4c6d3711-61f1-4505-b8df-189d32b52872',
+                 fq_name='default-domain:admin:net3')
+
+        self.assertEqual(cache.search_substring('admin:', type='bar'), [r1])
+        # ordered by path
+        self.assertEqual(cache.search_substring('net', limit=2), [r2, r1])
+        self.assertEqual(cache.search_fuzzy('deom:net2', type='bar'), [r2, r1])
+        self.assertEqual(cache.search_fuzzy('deom:net2', type='bar', limit=1), [r2])
+
+        completions = list(comp.get_completions(Document(text='cat bar/demo'), None))
+        self.assertEqual([c.text for c in completions], [str(r2.path.relative_to(Context().shell.current_path))])
+        completions = list(comp.get_completions(Document(text='cat bar/dmin:net1'), None))
+        self.assertEqual([c.text for c in completions], [str(r1.path.relative_to(Context().shell.current_path))])
+        # fuzzy
+        completions = list(comp.get_completions(Document(text='cat bar/admn:net'), None))
+        self.assertEqual([c.display_meta for c in completions], ['default-domain:admin:net1',
+                                                                 'default-domain:demo:net2'])
+        r1.delete()
+        self.assertEqual(cache.search_substring('net1'), [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,218 @@
+from __future__ import unicode_literals
+import unittest
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from keystoneauth1.exceptions.connection import ConnectFailure
+from keystoneauth1.exceptions.http import HttpError
+
+from contrail_api_cli.client import ContrailAPISession
+from contrail_api_cli.context import Context
+from contrail_api_cli.exceptions import ChildrenExists, BackRefsExists, ResourceNotFound, \
+    RefUpdateError, CollectionNotFound
+from contrail_api_cli.fakeserver import FakeAPIServer, FakeAPIAdapter
+from contrail_api_cli.resource import Resource, Collection
+from contrail_api_cli.schema import DummySchema
+from contrail_api_cli.utils import FQName
+
+from .utils import CLITest
+
+
+class TestFakeAPIServer(CLITest):
+
+    def setUp(self):
+        super(TestFakeAPIServer, self).setUp()
+        self.server = FakeAPIServer(types=['foo', 'bar', 'foobar'])
+        self.session = ContrailAPISession(adapter=FakeAPIAdapter(self.server))
+        self.session.retries = 0
+        patcher = mock.patch.object(Context, 'session', self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_root(self):
+        self.assertEqual([c.type for c in Collection('', fetch=True)],
+                         ['foo', 'bar', 'foobar'])
+
+    def test_resources(self):
+        foo = Resource('foo', fq_name='foo', display_name='Foo')
+        foo.save()
+        self.assertEqual(foo['display_name'], 'Foo')
+        self.assertIn('created', foo['id_perms'])
+        bar = Resource('bar', fq_name='foo:bar', parent=foo)
+        bar['bar_prop'] = 1
+        bar.set_ref(foo)
+        bar.save()
+        self.assertEqual(bar['parent_uuid'], foo.uuid)
+        self.assertEqual(bar.refs.foo, [foo])
+
+        foo.fetch()
+        self.assertEqual(foo.children.bar, [bar])
+        self.assertEqual(foo.back_refs.bar, [bar])
+        self.assertEqual(Resource('bar', fq_name='foo:bar', check=True).uuid, bar.uuid)
+        self.assertEqual(self.session.id_to_fqname(bar.uuid),
+                         {'type': 'bar', 'fq_name': FQName('foo:bar')})
+
+        foo['display_name'] = 'Foo2'
+        foo.save()
+        self.assertEqual(Resource('foo', uuid=foo.uuid, fetch=True)['display_name'], 'Foo2')
+
+        bar.remove_ref(foo)
+        self.assertEqual(bar.refs.foo, [])
+        bar.add_ref(foo, attr={'a': 1})
+        self.assertEqual(foo.fetch().back_refs.bar[0]['attr'], {'a': 1})
+
+        with self.assertRaises(ChildrenExists):
+            foo.delete()
+        foobar = Resource('foobar', fq_name='foobar')
+        foobar.save()
+        bar.add_ref(foobar)
+        with self.assertRaises(BackRefsExists):
+            foobar.delete()
+        bar.remove_ref(foobar)
+        foobar.delete()
+        bar.remove_ref(foo)
+        bar.delete()
+        foo.delete()
+        self.assertEqual(len(self.server), 0)
+        with self.assertRaises(ResourceNotFound):
+            Resource('foo', uuid=foo.uuid, fetch=True)
+
+    def test_collections(self):
+        foo = self.server.create('foo', {'fq_name': ['foo']})
+        bars = [self.server.create('bar', {'fq_name': ['foo', 'bar%d' % i],
+                                           'bar_prop': i % 2,
+                                           'foo_refs': [{'to': ['foo']}] if i < 3 else []})
+                for i in range(10)]
+        self.assertEqual(len(Collection('bar')), 10)
+        self.assertEqual(len(Collection('bar', fetch=True, filters=[('bar_prop', 1)])), 5)
+        self.assertEqual(len(Collection('bar', fetch=True, back_refs_uuid=foo['uuid'])), 3)
+        self.assertEqual(len(Collection('bar', fetch=True, parent_uuid=foo['uuid'])), 10)
+        c = Collection('bar', fetch=True, fields=['bar_prop'],
+                       filters=[('bar_prop', 0)], back_refs_uuid=foo['uuid'])
+        self.assertEqual([(r.uuid, r['bar_prop']) for r in c],
+                         [(bars[0]['uuid'], 0), (bars[2]['uuid'], 0)])
+        c = Collection('bar', fetch=True, detail=True)
+        self.assertEqual(c[1]['bar_prop'], 1)
+        data = self.session.get_json(self.session.make_url('/bars'),
+                                     obj_uuids=bars[4]['uuid'], fields='id_perms')
+        self.assertEqual(len(data['bars']), 1)
+        self.assertIn('last_modified', data['bars'][0]['id_perms'])
+        self.assertEqual(len(list(Collection('foo').iter_fetch())), 1)
+
+    def test_paging(self):
+        foo = self.server.create('foo', {'fq_name': ['foo']})
+        bars = [self.server.create('bar', {'fq_name': ['foo', 'bar%d' % i]})['uuid']
+                for i in range(10)]
+
+        version = mock.PropertyMock(return_value='3.2')
+        patcher = mock.patch.object(DummySchema, 'version', version)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.assertFalse(Collection('bar').paging_supported)
+        self.server.requests.clear()
+        self.assertEqual([r.uuid for r in Collection('bar', fetch=True, page_size=3)], bars)
+        self.assertEqual(self.server.requests['GET'], 1)
+
+        version.return_value = '4.1'
+        self.assertTrue(Collection('bar').paging_supported)
+        self.server.requests.clear()
+        self.assertEqual([r.uuid for r in Collection('bar', fetch=True, page_size=3)], bars)
+        self.assertEqual(self.server.requests['GET'], 4)
+        self.server.requests.clear()
+        self.assertEqual([r.uuid for r in Collection('bar', page_size=3).iter_fetch(limit=5)],
+                         bars[:5])
+        self.assertEqual(self.server.requests['GET'], 2)
+        c = Collection('bar', parent_uuid=foo['uuid'], page_size=4).fetch(limit=6)
+        self.assertEqual([r.uuid for r in c], bars[:6])
+        # no paging
+        self.assertEqual(len(Collection('bar').fetch(limit=2)), 2)
+
+        # collection removed while pages are fetched
+        get_json = self.session.get_json
+
+        def not_found(url, **kwargs):
+            if 'page_marker' in kwargs:
+                raise HttpError(http_status=404)
+            return get_json(url, **kwargs)
+
+        with mock.patch.object(self.session, 'get_json', side_effect=not_found):
+            for method in ('iter_fetch', 'iter_fetch_data'):
+                uuids = []
+                with self.assertRaises(CollectionNotFound):
+                    for r in getattr(Collection('bar', page_size=3), method)():
+                        uuids.append(r['uuid'])
+                self.assertEqual(uuids, bars[:3])
+
+    def test_bulk_refs(self):
+        foo = Resource('foo', fq_name='foo')
+        foo.save()
+        bars = []
+        for i in range(5):
+            bar = Resource('bar', fq_name='foo:bar%d' % i, parent=foo)
+            bar.save()
+            bars.append(bar)
+
+        foo.add_back_refs(bars)
+        self.assertEqual(foo.back_refs.bar, [])
+        foo.fetch()
+        self.assertEqual(sorted(foo.back_refs.bar, key=lambda r: r.uuid),
+                         sorted(bars, key=lambda r: r.uuid))
+
+        missing = Resource('bar', uuid='ab0f0a6c-9e61-4d5f-9d24-6f1a3d7a1b2c', fq_name='foo:missing')
+        with self.assertRaises(RefUpdateError) as cm:
+            foo.remove_back_refs(bars + [missing], fetch=True)
+        [(r1, r2, e)] = cm.exception.errors
+        self.assertEqual((r1, r2, e.http_status), (missing, foo, 404))
+        self.assertEqual(foo.back_refs.bar, [])
+
+        bars[0].add_refs([foo])
+        self.assertEqual(Resource('bar', uuid=bars[0].uuid, fetch=True).refs.foo, [foo])
+
+    def test_bulk_refs_connection_error(self):
+        foo = Resource('foo', fq_name='foo')
+        foo.save()
+        bars = []
+        for i in range(3):
+            bar = Resource('bar', fq_name='foo:bar%d' % i, parent=foo)
+            bar.save()
+            bars.append(bar)
+
+        post_json = self.session.post_json
+
+        def fail_bar1(url, data, **kwargs):
+            if data.get('uuid') == bars[1].uuid:
+                raise ConnectFailure('Unable to establish connection')
+            return post_json(url, data, **kwargs)
+
+        with mock.patch.object(self.session, 'post_json', side_effect=fail_bar1):
+            with self.assertRaises(RefUpdateError) as cm:
+                foo.add_back_refs(bars)
+        [(r1, r2, e)] = cm.exception.errors
+        self.assertEqual((r1, r2), (bars[1], foo))
+        self.assertIsInstance(e, ConnectFailure)
+        # other operations of the batch are applied
+        foo.fetch()
+        self.assertEqual(sorted(r.uuid for r in foo.back_refs.bar),
+                         sorted([bars[0].uuid, bars[2].uuid]))
+
+    def test_kv(self):
+        self.session.add_kv_store('foo', 'bar')
+        self.assertEqual(self.session.search_kv_store('foo'), 'bar')
+        self.assertEqual(self.session.get_kv_store(), [{'key': 'foo', 'value': 'bar'}])
+        self.session.remove_kv_store('foo')
+        with self.assertRaises(HttpError) as cm:
+            self.session.search_kv_store('foo')
+        self.assertEqual(cm.exception.http_status, 404)
+
+    @mock.patch('contrail_api_cli.fakeserver.gevent.sleep')
+    def test_latency(self, mock_sleep):
+        self.session.adapters['http://'].latency = lambda request: 0.1 if request.method == 'GET' else 0
+        self.session.get_json(self.session.make_url('/'))
+        self.session.post_json(self.session.make_url('/foos'), {'foo': {'fq_name': ['foo']}})
+        mock_sleep.assert_called_once_with(0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
+
+from contrail_api_cli.index import CompletionIndex
+from contrail_api_cli.resource import Resource, ResourceCache
+from contrail_api_cli.utils import FQName
+
+from .utils import CLITest
+
+
+class TestCompletionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'index', 'completion.db')
+
+    def test_index(self):
+        index = CompletionIndex(self.path, batch_size=3)
+        index.add('virtual-network', '3b8a5c22-7d5e-4cc4-a6fc-8fa8f2fd9e04',
+                  FQName('default-domain:admin:net1'))
+        self.assertFalse(os.path.exists(self.path))
+        index.add('virtual-network', '0ad5ee0b-1bd5-4a4f-8b40-2b6cc41c0e31',
+                  'default-domain:admin:net2')
+        # flushed after 3 keys
+        self.assertTrue(os.path.exists(self.path))
+        index.add('network-ipam', '1e2c8c3a-ef5d-4a40-bd63-3f3fa8b7e7f1')
+        self.assertEqual(index.search('/virtual-network/default-domain:admin:'), [
+            ('virtual-network', '3b8a5c22-7d5e-4cc4-a6fc-8fa8f2fd9e04', 'default-domain:admin:net1'),
+            ('virtual-network', '0ad5ee0b-1bd5-4a4f-8b40-2b6cc41c0e31', 'default-domain:admin:net2'),
+        ])
+        self.assertEqual(index.search('/virtual-network/0'), [
+            ('virtual-network', '0ad5ee0b-1bd5-4a4f-8b40-2b6cc41c0e31', 'default-domain:admin:net2'),
+        ])
+        self.assertEqual(len(index.search('/virtual-network/', limit=3)), 3)
+        self.assertEqual(index.search('/network-ipam/1'), [
+            ('network-ipam', '1e2c8c3a-ef5d-4a40-bd63-3f3fa8b7e7f1', None),
+        ])
+        self.assertEqual(len(index), 3)
+        index.remove('virtual-network', '3b8a5c22-7d5e-4cc4-a6fc-8fa8f2fd9e04',
+                     'default-domain:admin:net1')
+        index.close()
+
+        index = CompletionIndex(self.path)
+        self.assertEqual(index.search('/virtual-network/default-domain:admin:'), [
+            ('virtual-network', '0ad5ee0b-1bd5-4a4f-8b40-2b6cc41c0e31', 'default-domain:admin:net2'),
+        ])
+        self.assertEqual(index.search('/foo'), [])
+        index.close()
+
+    def test_index_unavailable(self):
+        # config dir can't be created
+        open(os.path.join(self.dir, 'index'), 'w').close()
+        # database can't be opened
+        os.makedirs(os.path.join(self.dir, 'db', 'completion.db'))
+        for path in (self.path, os.path.join(self.dir, 'db', 'completion.db')):
+            index = CompletionIndex(path, batch_size=1)
+            with mock.patch('contrail_api_cli.index.logger') as logger:
+                index.add('virtual-network', '3b8a5c22-7d5e-4cc4-a6fc-8fa8f2fd9e04')
+                self.assertEqual(index.search('/virtual-network/'), [])
+                self.assertEqual(len(index), 0)
+                index.close()
+            # the database is only opened once
+            self.assertEqual(logger.warning.call_count, 1)
+
+    def test_makedirs_race(self):
+        index = CompletionIndex(self.path)
+        makedirs = os.makedirs
+
+        def race(path):
+            makedirs(path)
+            raise OSError(17, 'File exists')
+
+        with mock.patch('contrail_api_cli.index.os.makedirs', side_effect=race):
+            index.add('network-ipam', '1e2c8c3a-ef5d-4a40-bd63-3f3fa8b7e7f1')
+            self.assertEqual(len(index), 1)
+        index.close()
+
+
+class TestIndexedResourceCache(CLITest):
+
+    def setUp(self):
+        super(TestIndexedResourceCache, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.cache = ResourceCache()
+        self.cache.clear()
+        self.addCleanup(setattr, self.cache, 'index', None)
+
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_search_index(self, mock_session):
+        path = os.path.join(self.dir, 'completion.db')
+        self.cache.index = CompletionIndex(path)
+        r1 = Resource('foo', uuid='d8eb36b4-9c57-49c5-9eac-95bedc90eb9a', fq_name='foo:r1')
+        Resource('foo', uuid='7413a49b-4f17-4340-b93f-7e03b29b5a9d', fq_name='foo:r2')
+        r1.delete()
+        self.cache.index.close()
+
+        # new session
+        self.cache.clear()
+        index = self.cache.index = CompletionIndex(path)
+        self.assertEqual(self.cache.search_resources(['/foo/d8eb']), [])
+        [r2] = self.cache.search_resources(['/foo/foo:'])
+        self.assertEqual((r2.uuid, r2.fq_name), ('7413a49b-4f17-4340-b93f-7e03b29b5a9d',
+                                                 FQName('foo:r2')))
+        # the resource is loaded in memory, not written again
+        with mock.patch.object(index, 'search') as mock_search:
+            self.assertEqual(self.cache.search_resources(['/foo/foo:'], limit=1), [r2])
+            self.assertFalse(mock_search.called)
+        self.assertEqual(index._pending, {})
+        index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,13 +6,17 @@ try:
 except ImportError:
     import unittest.mock as mock
 
+from six import PY2
 from keystoneauth1.exceptions.http import HttpError
 
 from contrail_api_cli.utils import Path, FQName
 from contrail_api_cli.resource import RootCollection, Collection, Resource, ResourceEncoder
-from contrail_api_cli.client import ContrailAPISession
+from contrail_api_cli.client import ContrailAPISession, ResolveCache
 from contrail_api_cli.exceptions import ResourceNotFound, ResourceMissing, CollectionNotFound, ChildrenExists, BackRefsExists, IsSystemResource
 
+from contrail_api_cli.context import Context
+from contrail_api_cli.schema import create_schema_from_version
+
 from .utils import CLITest
 
 
@@ -164,6 +168,7 @@ class TestResource(CLITest):
     def test_resource_fqname_validation(self, mock_session):
         # bind original method to mock_session
         mock_session.fqname_to_id = ContrailAPISession.fqname_to_id.__get__(mock_session)
+        mock_session.resolve_cache = ResolveCache()
         mock_session.post_json = ContrailAPISession.post_json.__get__(mock_session)
         mock_session.make_url = ContrailAPISession.make_url.__get__(mock_session)
 
@@ -172,9 +177,9 @@ class TestResource(CLITest):
             data = json.loads(data)
             result = mock.Mock()
             if data['type'] == "foo":
-                result.json.return_value = {
+                result.content = json.dumps({
                     "uuid": "ec1afeaa-8930-43b0-a60a-939f23a50724"
-                }
+                })
                 return result
             if data['type'] == "bar":
                 raise HttpError(http_status=404)
@@ -192,6 +197,7 @@ class TestResource(CLITest):
     def test_resource_uuid_validation(self, mock_session):
         # bind original method to mock_session
         mock_session.id_to_fqname = ContrailAPISession.id_to_fqname.__get__(mock_session)
+        mock_session.resolve_cache = ResolveCache()
         mock_session.make_url = ContrailAPISession.make_url.__get__(mock_session)
 
         # called by id_to_fqname
@@ -396,6 +402,53 @@ class TestResource(CLITest):
         Resource('foo', uuid="fake_uuid", session=mock_session, fetch=True)
         mock_session.get_json.assert_called_with(self.BASE + '/foo/fake_uuid')
 
+    def test_resource_properties(self):
+        Context().schema = create_schema_from_version('2.21')
+        iip1 = Resource('instance-ip', uuid='b86f3f3c-7fc6-4a39-9f8f-bd1f3e3cbe55',
+                        instance_ip_address='10.0.0.1')
+        iip2 = Resource('instance-ip', uuid='1ad0bad6-1a8e-4bf3-8a84-3c4fa7ed2ab4')
+        self.assertEqual(iip1.instance_ip_address, '10.0.0.1')
+        self.assertEqual(iip2.instance_ip_address, None)
+        self.assertIn('instance_ip_address', dir(iip1))
+        with self.assertRaises(AttributeError):
+            iip1.foo
+        # properties are shared between resources of the same type
+        self.assertIs(iip1.properties, iip2.properties)
+        if not PY2:
+            # python 2 ABCs don't define __slots__
+            self.assertFalse(hasattr(iip1, '__dict__'))
+        self.assertEqual(dict(iip1), {'uuid': iip1.uuid, 'instance_ip_address': '10.0.0.1'})
+        del iip1['instance_ip_address']
+        self.assertEqual(list(iip1), ['uuid'])
+
+    def test_resource_lazy_links(self):
+        created = []
+        Resource.register('created', created.append)
+        self.addCleanup(Resource.unregister, 'created', created.append)
+        data = {
+            'uuid': 'dd2f4111-abda-405f-bce9-c6c24181dd14',
+            'bar_refs': [{'to': ['bar'], 'uuid': '29128d4e-1e97-4e1e-a0b2-e4d8f4b0b1a5'}],
+            'bar_back_refs': [{'to': ['bar2'], 'uuid': '4bd40a94-a6ff-4b32-a57f-aa89d3e1d0f1'}],
+            'bars': [{'to': ['foo', 'bar3'], 'uuid': 'a1a2e1ef-4bf6-4f7f-a6e0-0d1f1fd1b2c4'}],
+        }
+        r = Resource('foo', **data)
+        self.assertEqual(created, [r])
+        self.assertEqual(json.loads(r.json()), data)
+        refs = r.refs.bar
+        # the ref resource
+        self.assertEqual(len(created), 2)
+        self.assertEqual(refs, [Resource('bar', uuid='29128d4e-1e97-4e1e-a0b2-e4d8f4b0b1a5',
+                                         fq_name='bar')])
+        self.assertIsInstance(r['bar_back_refs'], Collection)
+        self.assertEqual(r['bar_back_refs'].back_refs_uuid, [r.uuid])
+        self.assertEqual(r.children.bar[0].fq_name, FQName('foo:bar3'))
+        self.assertEqual(r.children.bar.parent_uuid, [r.uuid])
+        # + the compared resource, the back_ref and the child
+        self.assertEqual(len(created), 5)
+        self.assertEqual(json.loads(r.json()), data)
+        r['bars'] = []
+        self.assertEqual(r.children.bar, [])
+
 
 class TestCollection(CLITest):
 
@@ -479,6 +532,35 @@ class TestCollection(CLITest):
         expected_parent_id = '0d7d4197-891b-4767-b599-54667370cab1,3a0e179e-fbe6-4390-8e5d-00a630de0b68,a9420bd1-59dc-4576-a548-b28cedbf3e5c'
         mock_session.get_json.assert_called_with(self.BASE + '/foos', parent_id=expected_parent_id)
 
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_collection_count_ref_updates(self, mock_session):
+        mock_session.configure_mock(base_url=self.BASE)
+        mock_session.make_url = ContrailAPISession.make_url.__get__(mock_session)
+        mock_session.ref_updates = ContrailAPISession.ref_updates.__get__(mock_session)
+        mock_session._ref_update = ContrailAPISession._ref_update.__get__(mock_session)
+        mock_session.get_json.return_value = {"foos": {"count": 0}}
+
+        r1 = Resource('bar', uuid='2caf30aa-d197-40be-82dc-3bac4ca91adb',
+                      fq_name='domain:bar')
+        r2 = Resource('foo', uuid='5d085b74-2dcc-4180-8284-10a56f9ed318',
+                      fq_name='domain:foo')
+        foos = Collection('foo', back_refs_uuid=[r1.uuid])
+        self.assertEqual(len(foos), 0)
+        self.assertEqual(len(foos), 0)
+        self.assertEqual(mock_session.get_json.call_count, 1)
+
+        # counts of both types are discarded after ref updates
+        r1.add_refs([r2])
+        mock_session.get_json.return_value = {"foos": {"count": 1}}
+        self.assertEqual(len(foos), 1)
+        self.assertEqual(mock_session.get_json.call_count, 2)
+        mock_session.get_json.return_value = {"bars": {"count": 1}}
+        self.assertEqual(len(Collection('bar', back_refs_uuid=[r2.uuid])), 1)
+        r2.remove_back_refs([r1])
+        mock_session.get_json.return_value = {"bars": {"count": 0}}
+        self.assertEqual(len(Collection('bar', back_refs_uuid=[r2.uuid])), 0)
+        self.assertEqual(mock_session.get_json.call_count, 4)
+
     @mock.patch('contrail_api_cli.resource.Context.session')
     def test_collection_count(self, mock_session):
         mock_session.configure_mock(base_url=self.BASE)
@@ -510,6 +592,34 @@ class TestCollection(CLITest):
         )
         self.assertEqual(mock_session.get_json.mock_calls, expected_calls)
 
+    @mock.patch('contrail_api_cli.resource.Context.session')
+    def test_collection_iter_fetch(self, mock_session):
+        mock_session.configure_mock(base_url=self.BASE)
+        data = [
+            ('foos', {'foo': {'uuid': 'ec1afeaa-8930-43b0-a60a-939f23a50724',
+                              'fq_name': ['domain', 'foo']}}),
+            ('foos', {'foo': {'uuid': 'c2588045-d6fb-4f37-9f46-9451f653fb6a',
+                              'fq_name': ['domain', 'bar']}})
+        ]
+        stream = mock.MagicMock()
+        stream.__iter__.return_value = iter(data)
+        mock_session.get_json_stream.return_value = stream
+        c = Collection('foo', detail=True)
+        resources = c.iter_fetch()
+        r = next(resources)
+        self.assertEqual(r.uuid, 'ec1afeaa-8930-43b0-a60a-939f23a50724')
+        self.assertEqual(r.fq_name, FQName('domain:foo'))
+        self.assertEqual(len(list(resources)), 1)
+        self.assertEqual(c.data, [])
+        mock_session.get_json_stream.assert_called_with(self.BASE + '/foos', detail=True)
+        stream.close.assert_called_once_with()
+
+        # the stream is closed when the caller stops early
+        stream.reset_mock()
+        stream.__iter__.return_value = iter(data)
+        self.assertEqual(len(list(c.iter_fetch_data(limit=1))), 1)
+        stream.close.assert_called_once_with()
+
     @mock.patch('contrail_api_cli.resource.Context.session')
     def test_collection_contrail_name(self, mock_session):
         c = Collection('')
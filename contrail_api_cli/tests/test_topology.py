@@ -0,0 +1,77 @@
+from __future__ import unicode_literals
+import io
+import unittest
+from collections import Counter
+
+from contrail_api_cli.commands.topology import Topology
+from contrail_api_cli.fakeserver import FakeAPIServer
+from contrail_api_cli.schema import create_schema_from_version, SchemaError
+from contrail_api_cli.topology import Level, generate, default_topology, \
+    write_ndjson, read_ndjson, load
+
+
+class TestTopology(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.schema = create_schema_from_version('3.2')
+
+    def test_generate(self):
+        levels = default_topology(projects=2, networks=2, interfaces=3, security_groups=2)
+        resources = list(generate(self.schema, levels))
+        self.assertEqual(Counter(t for t, _ in resources), {
+            'domain': 1,
+            'project': 2,
+            'network-ipam': 2,
+            'security-group': 4,
+            'virtual-network': 4,
+            'virtual-machine-interface': 12,
+            'instance-ip': 12,
+        })
+        by_uuid = dict((r['uuid'], (t, r)) for t, r in resources)
+        vmi = [r for t, r in resources if t == 'virtual-machine-interface'][-1]
+        self.assertEqual(vmi['fq_name'], ['domain-0', 'project-1', 'virtual-machine-interface-5'])
+        self.assertEqual(vmi['parent_type'], 'project')
+        # refs are in the same project
+        for attr in ('virtual_network_refs', 'security_group_refs'):
+            ref = by_uuid[vmi[attr][0]['uuid']][1]
+            self.assertEqual(ref['parent_uuid'], vmi['parent_uuid'])
+        iip = [r for t, r in resources if t == 'instance-ip'][-1]
+        self.assertEqual(iip['virtual_machine_interface_refs'][0]['uuid'], vmi['uuid'])
+        self.assertEqual(iip['virtual_network_refs'], vmi['virtual_network_refs'])
+        self.assertEqual(iip['instance_ip_address'], '10.0.0.11')
+        # generation is reproducible
+        self.assertEqual(resources, list(generate(self.schema, levels)))
+
+    def test_count(self):
+        def expected(projects, networks, interfaces, security_groups):
+            return 1 + projects * (2 + security_groups + networks * (1 + 2 * interfaces))
+
+        for options in [(1, 1, 1, 1), (3, 2, 4, 0), (2, 5, 10, 2)]:
+            levels = default_topology(*options)
+            self.assertEqual(write_ndjson(generate(self.schema, levels), io.StringIO()),
+                             expected(*options))
+        # number given in the topology command documentation
+        self.assertIn('%d resources generated' % expected(1000, 5, 10, 2),
+                      Topology.__doc__)
+
+    def test_bad_levels(self):
+        with self.assertRaises(SchemaError):
+            list(generate(self.schema, [Level('project', per='domain')]))
+        with self.assertRaises(SchemaError):
+            list(generate(self.schema, [Level('domain'),
+                                        Level('project', per='domain', refs=['domain'])]))
+
+    def test_load(self):
+        f = io.StringIO()
+        count = write_ndjson(generate(self.schema, default_topology(projects=2)), f)
+        f.seek(0)
+        server = FakeAPIServer()
+        self.assertEqual(load(server, read_ndjson(f)), count)
+        self.assertEqual(len(server), count)
+        self.assertEqual(server._list('instance-ip', {'count': 'true'}),
+                         {'instance-ips': {'count': 100}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,11 @@ from __future__ import unicode_literals
 import unittest
 import sys
 import io
+import json
+try:
+    import mock
+except ImportError:
+    import unittest.mock as mock
 
 from contrail_api_cli import utils
 
@@ -70,6 +75,101 @@ class TestUtils(unittest.TestCase):
         expected = list(map(lambda x: x * 2, lst))
         self.assertEqual(res, expected)
 
+    def test_json_stream_decoder(self):
+        data = {
+            'foos': [
+                {'uuid': 'ec1afeaa-8930-43b0-a60a-939f23a50724',
+                 'fq_name': ['domain', 'fôo'],
+                 'count': 12},
+                {'uuid': 'c2588045-d6fb-4f37-9f46-9451f653fb6a',
+                 'fq_name': ['domain', 'bar']},
+                42
+            ],
+            'href': 'http://localhost:8082/foos',
+            'bars': []
+        }
+        raw = json.dumps(data, indent=2).encode('utf-8')
+        expected = [('foos', e) for e in data['foos']]
+        for size in (1, 3, 4096):
+            chunks = [raw[i:i + size] for i in range(0, len(raw), size)]
+            self.assertEqual(list(utils.JSONStreamDecoder(chunks)), expected)
+        self.assertEqual(list(utils.JSONStreamDecoder([b'{}'])), [])
+        with self.assertRaises(ValueError):
+            list(utils.JSONStreamDecoder([b'{"foos": [{"a": 1}']))
+
+    def test_json_stream_decoder_large_element(self):
+        big = {'uuid': 'ec1afeaa-8930-43b0-a60a-939f23a50724',
+               'rules': [{'id': i} for i in range(5000)]}
+        raw = json.dumps({'foos': [big, {'uuid': 'foo'}]}).encode('utf-8')
+        chunks = [raw[i:i + 100] for i in range(0, len(raw), 100)]
+        decoder = utils.JSONStreamDecoder(chunks)
+        raw_decode = decoder.decoder.raw_decode
+        with mock.patch.object(decoder.decoder, 'raw_decode',
+                               side_effect=raw_decode) as mock_decode:
+            self.assertEqual(list(decoder), [('foos', big), ('foos', {'uuid': 'foo'})])
+        # the large element is not decoded again for each chunk
+        self.assertLess(mock_decode.call_count, 30)
+        self.assertGreater(len(chunks), 500)
+
+    def test_json_backends(self):
+
+        class Encoder(json.JSONEncoder):
+
+            def default(self, obj):
+                if isinstance(obj, utils.FQName):
+                    return obj._data
+                return super(Encoder, self).default(obj)
+
+        data = {'fq_name': utils.FQName('domain:foo'), 'href': '/foo', 'count': 1}
+        for backend in utils.JSON_BACKENDS.values():
+            if not backend.available:
+                continue
+            compact = backend.dumps(data, cls=Encoder)
+            self.assertFalse('\n' in compact)
+            self.assertEqual(backend.loads(compact.encode('utf-8')),
+                             {'fq_name': ['domain', 'foo'], 'href': '/foo', 'count': 1})
+            pretty = backend.dumps(data, cls=Encoder, pretty=True)
+            self.assertEqual(json.loads(pretty), json.loads(compact))
+            self.assertTrue(pretty.startswith('{\n  "count": 1,'))
+
+        self.assertEqual(utils.set_json_backend('json').name, 'json')
+        self.assertEqual(utils.to_compact_json({'a': [1, 2]}),
+                         '{"a":[1,2]}')
+        self.assertTrue(utils.set_json_backend('auto').available)
+        with self.assertRaises(ValueError):
+            utils.set_json_backend('foo')
+        utils.set_json_backend('json')
+
+    def test_json_human_output(self):
+        backend = mock.Mock()
+        with mock.patch.object(utils, 'json_backend', backend):
+            # human output doesn't depend on the selected backend
+            self.assertEqual(utils.to_json({'name': 'fôo', 'count': 1}),
+                             '{\n  "count": 1,\n  "name": "f\\u00f4o"\n}')
+            self.assertFalse(backend.dumps.called)
+            utils.to_compact_json({'name': 'foo'})
+            self.assertTrue(backend.dumps.called)
+
+    def test_ngram_index(self):
+        index = utils.NGramIndex()
+        index.add('a', 'default-domain:admin:net1')
+        index.add('b', 'default-domain:admin:Net2')
+        index.add('c', 'default-domain:demo:web')
+        self.assertEqual(len(index), 3)
+        self.assertEqual(list(index.substring('admin:net')), ['a', 'b'])
+        self.assertEqual(list(index.substring('NET2')), ['b'])
+        self.assertEqual(list(index.substring('we')), ['c'])
+        self.assertEqual(list(index.substring('foo')), [])
+        self.assertEqual([k for k, _ in index.fuzzy('net3')], ['a', 'b'])
+        self.assertEqual([k for k, _ in index.fuzzy('net3', limit=1)], ['a'])
+        self.assertEqual([k for k, _ in index.fuzzy('dmeo:web')], ['c'])
+        self.assertEqual(index.fuzzy('foo'), [])
+        index.add('a', 'default-domain:admin:web')
+        index.remove('c')
+        self.assertEqual(list(index.substring('web')), ['a'])
+        self.assertEqual(list(index.substring('net')), ['b'])
+        index.remove('c')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -7,6 +7,7 @@ except ImportError:
 
 from contrail_api_cli.context import Context
 from contrail_api_cli.schema import DummySchema, DummyResourceSchema
+from contrail_api_cli.resource import CountCache
 
 
 class CLITest(unittest.TestCase):
@@ -32,6 +33,7 @@ class CLITest(unittest.TestCase):
         }
         DummyResourceSchema()
         Context().schema = DummySchema()
+        CountCache().clear()
 
     def tearDown(self):
         Context().schema = None
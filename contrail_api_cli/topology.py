@@ -0,0 +1,249 @@
+"""This module generates synthetic configurations made of
+resources consistent with a schema, for scale tests.
+
+>>> schema = create_schema_from_version("3.2")
+>>> resources = generate(schema, default_topology(projects=100))
+>>> with open('topology.json', 'w') as f:
+...     write_ndjson(resources, f)
+
+>>> server = FakeAPIServer()
+>>> with open('topology.json') as f:
+...     load(server, read_ndjson(f))
+"""
+from __future__ import unicode_literals
+
+import json
+import uuid
+import random
+from collections import OrderedDict
+
+from six import text_type
+
+from .schema import SchemaError
+
+
+class Level(object):
+    """Description of a set of generated resources
+
+    `count` resources of type `type` are created for each
+    resource of type `per`. When `per` is a parent type of
+    `type` it becomes the parent of the created resources.
+    Otherwise the created resources get the closest parent
+    of the `per` resource allowed by the schema.
+
+    Each type listed in `refs` is referenced by the created
+    resources. The referenced resource is the `per` resource
+    itself, a resource of this type referenced by the `per`
+    resource or a resource of this type found under the
+    closest parent.
+
+    :param type: resource type
+    :type type: str
+    :param per: type of the resources to multiply
+    :type per: str
+    :param count: number of resources per `per` resource
+    :type count: int
+    :param refs: types referenced by the resources
+    :type refs: [str]
+    :param properties: function returning properties of the
+                       n-th resource of the level
+    :type properties: callable(int) -> dict
+    """
+
+    def __init__(self, type, per=None, count=1, refs=None, properties=None):
+        self.type = type
+        self.per = per
+        self.count = count
+        self.refs = refs or []
+        self.properties = properties
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.type)
+
+
+def _instance_ip_properties(index):
+    return {'instance_ip_address': '10.%d.%d.%d' % ((index >> 16) & 255,
+                                                    (index >> 8) & 255,
+                                                    index & 255)}
+
+
+def default_topology(projects=10, networks=5, interfaces=10, security_groups=2):
+    """Return levels of a topology made of projects with
+    networks, ports with an instance-ip and security groups
+
+    :param projects: number of projects
+    :type projects: int
+    :param networks: number of virtual-networks per project
+    :type networks: int
+    :param interfaces: number of virtual-machine-interfaces
+                       per virtual-network
+    :type interfaces: int
+    :param security_groups: number of security-groups per project
+    :type security_groups: int
+
+    :rtype: [Level]
+    """
+    return [
+        Level('domain'),
+        Level('project', per='domain', count=projects),
+        Level('network-ipam', per='project'),
+        Level('security-group', per='project', count=security_groups),
+        Level('virtual-network', per='project', count=networks,
+              refs=['network-ipam']),
+        Level('virtual-machine-interface', per='virtual-network', count=interfaces,
+              refs=['virtual-network', 'security-group']),
+        Level('instance-ip', per='virtual-machine-interface',
+              refs=['virtual-machine-interface', 'virtual-network'],
+              properties=_instance_ip_properties),
+    ]
+
+
+def _parents(schema, type):
+    # config-root is implicit
+    return [p for p in schema.resource(type).parents if p != 'config-root']
+
+
+def _check_levels(schema, levels):
+    types = set()
+    for level in levels:
+        resource = schema.resource(level.type)
+        if level.per is not None and level.per not in types:
+            raise SchemaError('%s resources must be generated before %s resources' %
+                              (level.per, level.type))
+        for ref in level.refs:
+            if ref not in resource.refs:
+                raise SchemaError("%s can't reference %s" % (level.type, ref))
+            if ref not in types:
+                raise SchemaError('%s resources must be generated before %s resources' %
+                                  (ref, level.type))
+        types.add(level.type)
+
+
+def generate(schema, levels, seed=0):
+    """Generate resources described by `levels`
+
+    Resources are yielded in creation order: parents and
+    referenced resources come first.
+
+    :param schema: schema of the resources
+    :type schema: Schema
+    :param levels: resources to generate
+    :type levels: [Level]
+    :param seed: seed of the random generator
+    :type seed: int
+
+    :rtype: iterator of (type, dict)
+    :raises SchemaError: levels are not consistent with the schema
+    """
+    _check_levels(schema, levels)
+    rand = random.Random(seed)
+    # uuid -> resource
+    resources = {}
+    # type -> [uuid]
+    by_type = OrderedDict()
+    # (parent uuid, type) -> [uuid]
+    children = {}
+    for level in levels:
+        parent_types = _parents(schema, level.type)
+        anchors = by_type.get(level.per, [None]) if level.per is not None else [None]
+        by_type.setdefault(level.type, [])
+        index = 0
+        for anchor_uuid in anchors:
+            anchor = resources.get(anchor_uuid)
+            # find parent in the anchor ancestors
+            parent = anchor
+            while parent is not None and parent['_type'] not in parent_types:
+                parent = resources.get(parent.get('parent_uuid'))
+            if parent is None and parent_types:
+                raise SchemaError('No parent found for %s resources' % level.type)
+            for _ in range(level.count):
+                fq_name = list(parent['fq_name']) if parent is not None else []
+                siblings = children.setdefault((parent and parent['uuid'], level.type), [])
+                fq_name.append('%s-%d' % (level.type, len(siblings)))
+                data = OrderedDict([
+                    ('_type', level.type),
+                    ('uuid', text_type(uuid.UUID(int=rand.getrandbits(128), version=4))),
+                    ('fq_name', fq_name),
+                ])
+                if parent is not None:
+                    data['parent_type'] = parent['_type']
+                    data['parent_uuid'] = parent['uuid']
+                for ref_type in level.refs:
+                    ref = _find_ref(ref_type, anchor, parent, resources, children, rand)
+                    if ref is not None:
+                        data['%s_refs' % ref_type.replace('-', '_')] = [
+                            {'to': ref['fq_name'], 'uuid': ref['uuid']}]
+                if level.properties is not None:
+                    data.update(level.properties(index))
+                resources[data['uuid']] = data
+                siblings.append(data['uuid'])
+                by_type[level.type].append(data['uuid'])
+                index += 1
+                resource = OrderedDict((k, v) for k, v in data.items() if k != '_type')
+                yield (level.type, resource)
+
+
+def _find_ref(type, anchor, parent, resources, children, rand):
+    if anchor is None:
+        return None
+    if anchor['_type'] == type:
+        return anchor
+    refs = anchor.get('%s_refs' % type.replace('-', '_'))
+    if refs:
+        return resources[refs[0]['uuid']]
+    # look for resources of this type under the closest parent
+    while parent is not None:
+        candidates = children.get((parent['uuid'], type))
+        if candidates:
+            return resources[rand.choice(candidates)]
+        parent = resources.get(parent.get('parent_uuid'))
+    return None
+
+
+def write_ndjson(resources, f):
+    """Write resources in a file with one JSON
+    document per line: ``{"<type>": {...}}``
+
+    :param resources: resources to write
+    :type resources: iterator of (type, dict)
+    :param f: file opened for writing
+
+    :rtype: int
+    :returns: number of resources written
+    """
+    count = 0
+    for type, data in resources:
+        f.write(text_type(json.dumps({type: data})) + '\n')
+        count += 1
+    return count
+
+
+def read_ndjson(f):
+    """Read resources written by :func:`write_ndjson`
+
+    :param f: file opened for reading
+
+    :rtype: iterator of (type, dict)
+    """
+    for line in f:
+        if line.strip():
+            [(type, data)] = json.loads(line).items()
+            yield (type, data)
+
+
+def load(server, resources):
+    """Create resources in a fake API server
+
+    :param server: fake API server
+    :type server: FakeAPIServer
+    :param resources: resources to create
+    :type resources: iterator of (type, dict)
+
+    :rtype: int
+    :returns: number of resources created
+    """
+    count = 0
+    for type, data in resources:
+        server.create(type, data)
+        count += 1
+    return count
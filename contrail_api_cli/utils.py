@@ -9,12 +9,16 @@ gevent.monkey.patch_ssl()
 from gevent.pool import Group, Pool
 import sys
 import json
+import codecs
 import os.path
+import heapq
 import hashlib
+import math
 from uuid import UUID
 from pathlib import PurePosixPath, _PosixFlavour
 from six import string_types, text_type, b
 import collections
+from collections import OrderedDict
 import logging
 
 from pygments import highlight
@@ -25,6 +29,15 @@ from prompt_toolkit.shortcuts import prompt, create_eventloop
 
 from .exceptions import AbsPathRequired
 
+try:
+    import ujson
+except ImportError:
+    ujson = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 logger = logging.getLogger(__name__)
 CONFIG_DIR = os.path.expanduser('~/.config/contrail-api-cli')
@@ -75,6 +88,7 @@ class FQName(collections.Sequence):
 
 
 class Observable(object):
+    __slots__ = ()
 
     def __new__(cls, *args, **kwargs):
         return super(Observable, cls).__new__(cls)
@@ -118,6 +132,130 @@ class Singleton(type):
         return cls.instance
 
 
+class NGramIndex(object):
+    """Index of texts by trigrams for substring and fuzzy search
+
+    Texts are fq_names, trigrams are computed on each
+    component of the fq_name padded with spaces so that
+    the start and the end of the components are matched.
+
+    >>> index = NGramIndex()
+    >>> index.add('/virtual-network/4c6d...', 'default-domain:admin:net1')
+    >>> list(index.substring('admin:net'))
+    ['/virtual-network/4c6d...']
+    >>> index.fuzzy('admn:net')
+    [('/virtual-network/4c6d...', 0.6666666666666666)]
+    """
+    n = 3
+
+    def __init__(self):
+        # trigram -> set of keys
+        self.postings = {}
+        # key -> text
+        self.texts = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _ngrams(self, text, pad=True):
+        grams = set()
+        for part in text.lower().split(':'):
+            if pad:
+                part = ' ' * (self.n - 1) + part + ' '
+            grams.update(part[i:i + self.n] for i in range(len(part) - self.n + 1))
+        return grams
+
+    def add(self, key, text):
+        """Add or replace the text of key
+
+        :type key: str
+        :type text: str
+        """
+        self.remove(key)
+        self.texts[key] = text
+        for gram in self._ngrams(text):
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self._ngrams(text):
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def substring(self, text):
+        """Yield keys of texts containing text (case insensitive)
+
+        :rtype: iterator of str
+        """
+        text = text.lower()
+        grams = self._ngrams(text, pad=False)
+        if grams:
+            postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+            candidates = (k for k in sorted(postings[0])
+                          if all(k in keys for keys in postings[1:]))
+        else:
+            # text is too short to use the index
+            candidates = iter(sorted(self.texts))
+        for key in candidates:
+            if text in self.texts[key].lower():
+                yield key
+
+    def fuzzy(self, text, threshold=0.3, limit=None):
+        """Return keys of texts sharing at least `threshold`
+        of the trigrams of text, best matches first
+
+        :param limit: only return the `limit` best matches
+        :type limit: int
+
+        :rtype: [(str, float)]
+        :returns: keys with their ratio of shared trigrams
+        """
+        grams = self._ngrams(text)
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        needed = max(int(math.ceil(threshold * len(grams))), 1)
+
+        def score(key, count, rest):
+            return count + sum(1 for keys in rest if key in keys)
+
+        # count keys from the rarest trigrams, a matching key
+        # shares at least one of the first len - needed + 1
+        counts = collections.Counter()
+        rest = postings
+        while len(rest) > needed - 1:
+            counts.update(rest[0])
+            rest = rest[1:]
+            if limit is not None and len(counts) >= limit:
+                lowest = min(score(key, count, rest)
+                             for key, count in counts.most_common(limit))
+                if lowest > len(rest):
+                    # keys not found yet can't be in the best matches
+                    break
+
+        scores = []
+        # lowest counts of the `limit` best matches
+        best = []
+        for key, count in counts.most_common():
+            if limit is not None and len(best) == limit and count + len(rest) < best[0]:
+                # the remaining keys can't score better
+                break
+            count = score(key, count, rest)
+            if count < needed:
+                continue
+            scores.append((key, float(count) / len(grams)))
+            if limit is None:
+                continue
+            if len(best) < limit:
+                heapq.heappush(best, count)
+            elif count > best[0]:
+                heapq.heapreplace(best, count)
+        return sorted(scores, key=lambda s: (-s[1], s[0]))[:limit]
+
+
 class APIFlavour(_PosixFlavour):
 
     def parse_parts(self, parts):
@@ -243,12 +381,235 @@ def all_subclasses(cls):
                                    for g in all_subclasses(s)]
 
 
+class JSONBackend(object):
+    """JSON encoder/decoder using the stdlib json module
+    """
+    name = 'json'
+
+    @property
+    def available(self):
+        return True
+
+    def dumps(self, data, cls=None, pretty=False):
+        if pretty:
+            return json.dumps(data,
+                              indent=2,
+                              sort_keys=True,
+                              skipkeys=True,
+                              cls=cls)
+        return json.dumps(data,
+                          separators=(',', ':'),
+                          skipkeys=True,
+                          cls=cls)
+
+    def loads(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+
+
+class UJSONBackend(JSONBackend):
+    """JSON encoder/decoder using ujson
+    """
+    name = 'ujson'
+
+    @property
+    def available(self):
+        return ujson is not None
+
+    def dumps(self, data, cls=None, pretty=False):
+        kwargs = {'escape_forward_slashes': False}
+        if cls is not None:
+            kwargs['default'] = cls().default
+        if pretty:
+            kwargs.update(indent=2, sort_keys=True)
+        return ujson.dumps(data, **kwargs)
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+class ORJSONBackend(JSONBackend):
+    """JSON encoder/decoder using orjson
+    """
+    name = 'orjson'
+
+    @property
+    def available(self):
+        return orjson is not None
+
+    def dumps(self, data, cls=None, pretty=False):
+        option = 0
+        if pretty:
+            option = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        default = None
+        if cls is not None:
+            default = cls().default
+        return orjson.dumps(data, default=default, option=option).decode('utf-8')
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+JSON_BACKENDS = OrderedDict((b.name, b) for b in (ORJSONBackend(), UJSONBackend(), JSONBackend()))
+json_backend = JSONBackend()
+
+
+def set_json_backend(name='auto'):
+    """Select the JSON encoder/decoder used for API traffic.
+
+    Human output always uses the stdlib json module so that
+    it doesn't depend on the installed packages.
+
+    :param name: json, ujson, orjson or auto to use the
+                 fastest installed backend
+    :type name: str
+
+    :raises ValueError: backend not available
+    """
+    global json_backend
+    if name == 'auto':
+        json_backend = next(b for b in JSON_BACKENDS.values() if b.available)
+    elif name in JSON_BACKENDS and JSON_BACKENDS[name].available:
+        json_backend = JSON_BACKENDS[name]
+    else:
+        raise ValueError('JSON backend %s is not available' % name)
+    logger.debug('Using %s JSON backend' % json_backend.name)
+    return json_backend
+
+
 def to_json(resource_dict, cls=None):
-    return json.dumps(resource_dict,
-                      indent=2,
-                      sort_keys=True,
-                      skipkeys=True,
-                      cls=cls)
+    """Return an indented JSON representation for human output
+    """
+    return JSON_BACKENDS['json'].dumps(resource_dict, cls=cls, pretty=True)
+
+
+def to_compact_json(resource_dict, cls=None):
+    """Return a compact JSON representation for API requests
+    """
+    return json_backend.dumps(resource_dict, cls=cls)
+
+
+def from_json(data):
+    """Decode JSON str or bytes
+    """
+    return json_backend.loads(data)
+
+
+class JSONStreamDecoder(object):
+    """Incremental decoder for JSON documents made of lists
+    like API collections::
+
+        {"virtual-networks": [{...}, {...}]}
+
+    Iterating over the decoder yields (key, element) tuples
+    as soon as each element of the lists is received. Values
+    that are not lists are skipped. The chunks iterator is
+    closed when the iteration is stopped.
+
+    :param chunks: JSON document chunks
+    :type chunks: iterable of bytes
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+
+    def _fill(self, size=0):
+        """Read chunks until at least size characters are
+        buffered after pos
+
+        :rtype: bool
+        :returns: False when there is no more data
+        """
+        parts = [self.buf[self.pos:]]
+        length = len(parts[0])
+        for chunk in self.chunks:
+            if not chunk:
+                continue
+            parts.append(self.utf8.decode(chunk))
+            length += len(parts[-1])
+            if length >= size:
+                break
+        if len(parts) == 1:
+            return False
+        self.buf = ''.join(parts)
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError('Unexpected end of JSON data')
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError('Expecting %s at char %d, got %s' %
+                             (' or '.join(chars), self.pos, char))
+        self.pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                # decoding of an incomplete value is retried once the
+                # buffer has doubled so that large values spanning many
+                # chunks are not decoded again for each chunk
+                if not self._fill(2 * (len(self.buf) - self.pos)):
+                    raise
+                continue
+            # numbers and literals at the end of the
+            # buffer may continue in the next chunk
+            if end == len(self.buf) and \
+                    not isinstance(value, (dict, list, string_types)) and \
+                    self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def close(self):
+        close = getattr(self.chunks, 'close', None)
+        if close is not None:
+            close()
+
+    def __iter__(self):
+        try:
+            self._expect('{')
+            end = self._peek() == '}'
+            if end:
+                self.pos += 1
+            while not end:
+                key = self._value()
+                self._expect(':')
+                if self._peek() == '[':
+                    self.pos += 1
+                    if self._peek() == ']':
+                        self.pos += 1
+                    else:
+                        while True:
+                            yield (key, self._value())
+                            if self._expect(',]') == ']':
+                                break
+                else:
+                    self._value()
+                end = self._expect(',}') == '}'
+            # read the input until the end so that the
+            # underlying connection can be reused
+            for _ in self.chunks:
+                pass
+        finally:
+            self.close()
 
 
 def highlight_json(json_data):
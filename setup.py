@@ -55,6 +55,8 @@ setup(
             'batch = contrail_api_cli.commands.batch:Batch',
             'kv = contrail_api_cli.commands.kv:Kv',
             'man = contrail_api_cli.commands.man:Man',
+            'stats = contrail_api_cli.commands.stats:Stats',
+            'topology = contrail_api_cli.commands.topology:Topology',
         ],
         'contrail_api_cli.shell_command': [
             'cd = contrail_api_cli.commands.shell:Cd',